@@ -164,19 +164,21 @@ class rollingState(state):
     forbidden = [walkState]
 
     def enter(self, cmd):
-        self.original = self.entity.avatar.animations['roll'].image
         self.entity.avatar.play('roll')
         self.angle = 0.0
 
+    def exit(self, cmd=None):
+        self.entity.avatar.angle = 0
+
     def update(self, time):
-        self.angle -= 2.0
+        self.angle = (self.angle - 2.0) % 360
         body = self.entity.parent.getBody(self.entity)
         body.velocity.x *= ROLLING_FRICTION
-        colorkey = self.original.get_at((0,0))
-        rotated = pygame.transform.rotate(self.original, self.angle)
-        self.entity.avatar.animations['roll'].image = rotated
+
+        # the avatar caches the rotated frames
+        self.entity.avatar.angle = self.angle
         if abs(body.velocity.x) < INITIAL_WALK_SPEED:
-            self.entity.avatar.animations['roll'].image = self.original
+            self.entity.avatar.angle = 0
             self.abort()
 
 
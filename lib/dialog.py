@@ -24,6 +24,7 @@ from lib2d.cmenu import cMenu
 from lib2d.gamestate import GameState
 from lib2d.statedriver import driver as sd
 from lib2d import res, gui
+from lib2d.text import getFont, drawText
 
 from pygame.locals import *
 from pygame.surface import Surface
@@ -72,16 +73,15 @@ class TextDialog(GameState):
             w, h = 0.9375 * sw, 0.2917 * sh
             self.border.draw(surface, (x, y, w, h))
            
-            fullpath = res.fontPath("dpcomic.ttf")
-            font = pygame.font.Font(fullpath, fontSize)
+            font = getFont(self.font, fontSize)
 
             # adjust the margins of text if there is a title
             if self.title:
                 x = 0.0625 * sw
                 y = 0.7 * sh
 
-            gui.drawText(surface, self.text, (0,0,0), (x+10,y+8,w-18,h-12),
-                         font, aa=1, bkg=self.border.background)
+            drawText(surface, self.text, (0,0,0), (x+10,y+8,w-18,h-12),
+                     font, aa=1, bkg=self.border.background)
             
             # print the title
             if self.title != None:
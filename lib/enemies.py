@@ -32,9 +32,8 @@ class HoverBot(Entity):
         """
         do some cool hackery here
         
-        we assume the lbrary is updating the physics 5x to one draw and the
-        fps is locked at 40, so we can easily simulate thrusters levitating
-        the robot.
+        we assume the library is updating the physics at a fixed tick rate, so
+        we can easily simulate thrusters levitating the robot.
         """
 
         body = self.parent.getBody(self)
@@ -2,7 +2,8 @@ from renderer import LevelCamera
 
 from lib2d.buttons import *
 from lib2d.signals import *
-from lib2d import res, ui, gfx, context
+from lib2d import res, ui, gfx, context, profiler
+from lib2d.journal import AreaProxy
 
 from lib.controllers import HeroController
 
@@ -69,11 +70,22 @@ class LevelState(context.Context):
     interacting with npcs, other players, objects, etc.
 
     much of the work done here is in the Standard UI class.
+
+    if a journal is given, the game is saved to it every autosaveTime ms.
     """
 
-    def __init__(self, parent, area):
+    autosaveTime = 30000
+
+    def __init__(self, parent, area, journal=None):
         super(LevelState, self).__init__(parent)
+
+        # an area that wasn't read from the save game yet
+        if isinstance(area, AreaProxy):
+            area = area.materialize()
+
         self.area = area
+        self.journal = journal
+        self.saveTimer = 0
         self.hero = area.getChildByGUID(1)
         self.hero_body = self.area.getBody(self.hero)
 
@@ -108,11 +120,22 @@ class LevelState(context.Context):
     def update(self, time):
         self.area.update(time)
         [ c.update(time) for c in self.controllers ]
+        self.camera.update(time)
+
+        if self.journal:
+            self.saveTimer += time
+            if self.saveTimer >= self.autosaveTime:
+                self.saveTimer = 0
+                with profiler.scope("autosave"):
+                    self.journal.save(self.area.getRoot())
 
 
     def draw(self, surface):
-        self.camera.center(self.hero_body.position)
-        self.ui.draw(surface)
+        # draw the bodies between the last physics step and the next one
+        self.camera.alpha = self.parent.alpha
+        self.camera.center(self.area.getPosition(self.hero_body,
+                                                 self.parent.alpha))
+        return self.ui.draw(surface)
 
 
     def handle_commandlist(self, cmdlist):
@@ -1,7 +1,9 @@
-from lib2d.tilemap import BufferedTilemapRenderer
+from lib2d.tilemap import BufferedTilemapRenderer, ChunkedTilemapRenderer
+from lib2d.parallax import ParallaxLayer, ParallaxRenderer
 from lib2d.objects import AvatarObject, GameObject
 from lib2d.bbox import BBox
 from lib2d.ui import Element
+from lib2d.profiler import profiled
 from lib2d import vec
 
 from pygame import Rect, draw, Surface
@@ -15,6 +17,9 @@ DEBUG = 0
 
 parallax = True
 
+# draw the map from cached chunks of tiles instead of single tiles
+chunked = True
+
 
 def screenSorter(a):
     return a[-1].x
@@ -42,22 +47,30 @@ class LevelCamera(Element):
         w, h = self.extent.size
 
         # create a renderer for the map
-        self.maprender = BufferedTilemapRenderer(area.tmxdata, (w, h))
+        if chunked:
+            self.maprender = ChunkedTilemapRenderer(area.tmxdata, (w, h))
+        else:
+            self.maprender = BufferedTilemapRenderer(area.tmxdata, (w, h))
         self.map_width = area.tmxdata.tilewidth * area.tmxdata.width
         self.map_height = area.tmxdata.tileheight * area.tmxdata.height
         self.blank = True
 
+        # how far between the last two physics steps the bodies are drawn
+        self.alpha = 1.0
+
         if parallax:
-            import pytmx, lib2d.res
+            import lib2d.res
 
             # EPIC HACK GO
             i = lib2d.res.loadImage("../tilesets/level0.png")
             colorkey = i.get_at((0,0))[:3]
             self.maprender.buffer.set_colorkey(colorkey)
             #self.maprender.buffer = self.maprender.buffer.convert_alpha()
-            par_tmx = pytmx.tmxloader.load_pygame(
-            lib2d.res.mapPath('parallax0.tmx'), force_colorkey=(128,128,0))
-            self.parallaxrender = BufferedTilemapRenderer(par_tmx, (w, h))
+            par_tmx = lib2d.res.loadMap(lib2d.res.mapPath('parallax0.tmx'),
+                                        force_colorkey=(128,128,0))
+            self.parallaxrender = ParallaxRenderer([
+                ParallaxLayer.fromMap(par_tmx, (.5, .5), name="parallax0",
+                                      background=(0,0,0))])
  
 
     # HACK
@@ -116,13 +129,25 @@ class LevelCamera(Element):
         self.maprender.center((x, y))
 
         if parallax:
-            self.parallaxrender.center((x/2.0, y/2.0))
+            self.parallaxrender.center((x, y))
+
+
+    def update(self, time):
+        """
+        let the renderers draw tiles to their buffers between frames
+        """
+
+        self.maprender.update(time)
+
+        if parallax:
+            self.parallaxrender.update(time)
 
 
     def clear(self, surface):
         raise NotImplementedError
 
 
+    @profiled("camera.draw")
     def draw(self, surface, rect):
         onScreen = []
 
@@ -132,7 +157,7 @@ class LevelCamera(Element):
 
         # quadtree collision testing would be good here
         for entity, body in self.area.bodies.items():
-            x, y = body.position
+            x, y = self.area.getPosition(body, self.alpha)
             x, y = self.area.worldToPixel((x, y))
             x -= self.extent.left
             y -= self.extent.top
@@ -142,10 +167,13 @@ class LevelCamera(Element):
         # should not be sorted every frame
         #onScreen.sort(key=screenSorter)
 
+        # the parallax layers only need to be drawn where the map is clear
+        dirty = []
         if parallax:
-            self.parallaxrender.draw(surface, rect, [])
+            holes = self.maprender.transparentRects(rect)
+            dirty.extend(self.parallaxrender.draw(surface, rect, holes))
 
-        dirty = self.maprender.draw(surface, rect, onScreen)
+        dirty.extend(self.maprender.draw(surface, rect, onScreen))
 
         if DEBUG:
             for bbox in self.area.rawGeometry:
@@ -157,6 +185,8 @@ class LevelCamera(Element):
             for i in onScreen:
                 draw.rect(surface, (100,255,100), i[1])
 
+            dirty = [ rect ]
+
         return dirty
 
 
@@ -3,18 +3,22 @@ from lib import world
 
 from lib2d.ui import Menu
 from lib2d.image import Image
-from lib2d.objects import loadObject
-from lib2d import res, draw, context
+from lib2d.journal import Journal
+from lib2d.preload import Manifest, Preloader
+from lib2d import res, draw, context, text
 
 import pygame, os
 
 
+savePath = os.path.join("resources", "saves", "save")
+
+
 class InstructionScreen(context.Context):
     def activate(self):
         self.foreground = (0,0,0)
         self.background = (109, 109, 109)
         self.border = draw.GraphicBox("border0.png", hollow=True)
-        self.msgFont = pygame.font.Font((res.fontPath("volter.ttf")), 9)
+        self.msgFont = text.getFont("volter.ttf", 9)
         self.activated = True
         self.redraw = True
 
@@ -43,6 +47,8 @@ class TitleScreen(context.Context):
         self.border = draw.GraphicBox(self.borderImage)
         self.counter = 0
         self.game = None
+        self.journal = None
+        self.loader = None
         self.activated = True
         #self.reactivate()
 
@@ -50,6 +56,9 @@ class TitleScreen(context.Context):
 
 
     def deactivate(self):
+        if self.loader:
+            self.loader.stop()
+            self.loader = None
         context.Context.deactivate(self)
 
 
@@ -77,47 +86,99 @@ class TitleScreen(context.Context):
 
 
     def handle_event(self, event):
-        self.menu.handle_event(event)
+        if not self.loader:
+            self.menu.handle_event(event)
 
 
     def draw(self, surface):
+        redraw = self.redraw
         if self.redraw:
             self.redraw = False
             #if self.game:
             self.border.draw(surface, surface.get_rect())
 
-        self.menu.draw(surface)
+        if self.loader:
+            dirty = [ self.drawProgress(surface) ]
+        else:
+            # the menu only draws options that changed, unless told to
+            if redraw:
+                self.menu.update_buttons = True
+            dirty = self.menu.draw(surface)
+
+        # all of the screen changed if the border was drawn
+        if not redraw:
+            return dirty
+
+
+    def drawProgress(self, surface):
+        sw, sh = surface.get_size()
+        rect = pygame.Rect(0, 0, sw / 2, 8)
+        rect.center = (sw / 2, sh / 2)
+        surface.fill((0, 0, 0), rect.inflate(4, 4))
+        surface.fill(self.background, rect)
+        bar = rect.copy()
+        bar.width = int(rect.width * self.loader.progress)
+        surface.fill((200, 200, 200), bar)
+        return rect.inflate(4, 4)
+
+
+    def update(self, time):
+        if self.loader:
+            self.loader.update()
+            if self.loader.done:
+                self.loader.stop()
+                self.loader = None
+                level = self.game.getChildByGUID(5001)
+                self.parent.start(LevelState(self.parent, level,
+                                             self.journal))
 
 
     def new_game(self):
         res.fadeoutMusic(1000)
-        self.game = world.build()
+
+        # build the world and read the files for the level in the background
+        # while the progress bar is drawn
+        self.loader = Preloader()
+        self.loader.queue(self.build_world, self.preload_level)
+        self.loader.start()
+        self.redraw = True
+
+
+    def build_world(self):
+        # the world as it is built is the baseline of the save game
+        game = world.build()
+        self.journal = game.save(savePath)
+        self.parent.journal = self.journal
+        return game
+
+
+    def preload_level(self, game):
+        self.game = game
         level = self.game.getChildByGUID(5001)
-        self.parent.start(LevelState(self.parent, level))
+        self.loader.add(Manifest.fromArea(level))
 
 
     def save_game(self):
-        path = os.path.join("resources", "saves", "save")
-        [ i.unload() for i in self.game.getChildren() ]
-        self.game.save(path)
+        self.journal.save(self.game)
         self.continue_game()
 
 
     def load_game(self):
         try:
-            path = os.path.join("resources", "saves", "save")
-            self.game = loadObject(path)
-        except IOError:
+            self.journal = Journal(savePath)
+            self.game = self.journal.load(lazy=True)
+            self.parent.journal = self.journal
+        except (IOError, KeyError):
             return self.new_game()
 
         level = self.game.getChildByGUID(5001)
-        self.parent.start(LevelState(level))
+        self.parent.start(LevelState(self.parent, level, self.journal))
 
 
     def continue_game(self):
         res.fadeoutMusic(1000)
         level = self.game.getChildByGUID(5001)
-        self.parent.start(LevelState(level))
+        self.parent.start(LevelState(self.parent, level, self.journal))
 
 
     def show_intro(self):
@@ -126,9 +187,7 @@ class TitleScreen(context.Context):
 
     def savequit_game(self):
         if self.game:
-            path = os.path.join("resources", "saves", "save")
-            [ i.unload() for i in self.game.getChildren() ]
-            self.game.save(path)
+            self.journal.save(self.game)
         self.quit_game()
 
 
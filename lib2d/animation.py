@@ -3,13 +3,21 @@ from image import Image
 import res
 
 from collections import namedtuple
-import math, itertools
+from pygame.transform import flip, rotate
+import pygame
+import math, itertools, weakref
 
 
 pi2 = math.pi * 2
 
 box = namedtuple('Box', 'width height')
 
+# rotated frames are made for angles that are a multiple of 360 / steps
+rotation_steps = 180
+
+# frames of loaded images, shared by the animations that use the same image
+frameSets = weakref.WeakValueDictionary()
+
 
 """
 animations may be used by a class that does not need the images, but may need
@@ -25,6 +33,67 @@ def calcFrameSize(filename, frames, directions):
     return (width / frames, height / directions)
 
 
+class FrameSet(object):
+    """
+    The frames of an image, and the flipped and rotated copies of them.
+
+    Animations that use the same image share a FrameSet, so each frame is
+    only flipped or rotated once, no matter how many avatars are showing it.
+    The copies are made the first time they are asked for.
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.transformed = {}
+
+
+    def get(self, index, flipx=False, flipy=False, angle=0):
+        """
+        return a frame, rotated counterclockwise by the angle in degrees, then
+        flipped.  the angle is rounded to the nearest rotation step.
+        """
+
+        step = int(round(angle * rotation_steps / 360.0)) % rotation_steps
+        flipx, flipy = bool(flipx), bool(flipy)
+
+        if not (step or flipx or flipy):
+            return self.frames[index]
+
+        key = (index, flipx, flipy, step)
+        try:
+            return self.transformed[key]
+        except KeyError:
+            pass
+
+        image = self.frames[index]
+        if step:
+            image = rotate(image, step * 360.0 / rotation_steps)
+        if flipx or flipy:
+            image = flip(image, flipx, flipy)
+
+        self.transformed[key] = image
+        return image
+
+
+
+def getFrameSet(key, make, force=False):
+    """
+    return the FrameSet for a key.  if there isn't one, make() is called to
+    get a list of the frames.
+    """
+
+    if not force:
+        try:
+            return frameSets[key]
+        except KeyError:
+            pass
+
+    frameSet = FrameSet(make())
+    frameSets[key] = frameSet
+    return frameSet
+
+
+
 class Animation(GameObject):
     """
     Animation is a collection of frames with a few control variables and useful
@@ -54,6 +123,7 @@ class Animation(GameObject):
         self.name = name
         self.image = image
         self.images = None
+        self.frameSet = None
         self.directions = directions
         self.frames = frames
         self.timing = timing
@@ -89,12 +159,24 @@ class Animation(GameObject):
         if (self.images is not None) and (not force):
             return
 
+        # the image is kept in the cache while the animation is loaded
         image = self.image.load()
 
+        key = (self.image.key(), self.real_frames, self.directions)
+        make = lambda: self.loadFrames(image)
+        self.frameSet = getFrameSet(key, make, force)
+        self.images = self.frameSet.frames
+
+
+    def loadFrames(self, image):
+        """
+        return a list of the frames of the image
+        """
+
         iw, ih = image.get_size()
         tw = iw / self.real_frames
         th = ih / self.directions
-        self.images = [None] * (self.directions * self.real_frames)
+        images = [None] * (self.directions * self.real_frames)
      
         d = 0
         for y in range(0, ih, th):
@@ -105,33 +187,43 @@ class Animation(GameObject):
                 except ValueError as e:
                     msg = "Invalid tiles selected for image {}"
                     raise ValueError, msg.format(self.image.filename)
-                self.images[(x/tw)+d*self.real_frames] = frame
+                images[(x/tw)+d*self.real_frames] = frame
             d += 1
 
+        return images
+
 
     def unload(self):
-        self.images = []
+        self.images = None
+        self.frameSet = None
+        self.image.unload()
 
 
-    def getImage(self, number, direction=0):
+    def getImage(self, number, direction=0, flipx=False, flipy=False,
+                 angle=0):
         """
         return the frame by number with the correct image for the direction
         direction should be expressed in radians
+
+        the frame can also be flipped, and rotated by an angle in degrees.
+        these are cached and shared with other animations of the same image.
         """
 
-        if self.images == []:
+        if not self.images:
             raise Exception, "Avatar hasn't loaded images yet"
 
         if direction < 0:
-            direction = pi + (pi - abs(direction))
+            direction = math.pi + (math.pi - abs(direction))
         d = int(math.ceil(direction / pi2 * (self.directions - 1)))
 
-        try:
-            return self.images[number+d*self.real_frames]
-        except IndexError:
+        index = number + d * self.real_frames
+        if index >= len(self.images):
             msg="{} cannot find image for animation ({}/{})"
-            raise IndexError, msg.format(self, number+d*self.real_frames,
-                                         len(self.images))
+            raise IndexError, msg.format(self, index, len(self.images))
+
+        if flipx or flipy or angle:
+            return self.frameSet.get(index, flipx, flipy, angle)
+        return self.images[index]
 
 
     def __repr__(self):
@@ -151,6 +243,7 @@ class StaticAnimation(Animation):
         self.name = name
         self.tile = tile
         self.size = size
+        self.frameSet = None
 
         self.frames = [0]
         self.timing = [-1]
@@ -161,19 +254,29 @@ class StaticAnimation(Animation):
         load the images for use with pygame
         """
 
+        if self.frameSet is not None:
+            return
+
         image = self.image.load()
-      
+
+        key = (self.image.key(), self.tile, self.size)
+        self.frameSet = getFrameSet(key, lambda: self.loadFrames(image))
+
+
+    def loadFrames(self, image):
         if self.tile:
             x, y = self.tile
             x *= self.size[0]
             y *= self.size[1]
             ck = image.get_colorkey()
-            self.image = pygame.Surface(self.size)
-            self.image.blit(image,(0,0),area=(x,y, self.size[0], self.size[1]))
-            image.set_colorkey(ck, pygame.RELACCEL) 
+            frame = pygame.Surface(self.size)
+            frame.blit(image,(0,0),area=(x,y, self.size[0], self.size[1]))
+            frame.set_colorkey(ck, pygame.RLEACCEL)
 
         else:
-            self.image = image
+            frame = image
+
+        return [frame]
 
 
     def returnNew(self):
@@ -181,18 +284,22 @@ class StaticAnimation(Animation):
 
 
     def unload(self):
-        self.image = None
+        self.frameSet = None
+        self.image.unload()
 
 
-    def getImage(self, number, direction=0):
+    def getImage(self, number, direction=0, flipx=False, flipy=False,
+                 angle=0):
         """
         return the frame by number with the correct image for the direction
         direction should be expressed in radians
         """
 
-        return self.image
+        if flipx or flipy or angle:
+            return self.frameSet.get(0, flipx, flipy, angle)
+        return self.frameSet.frames[0]
 
 
     def __repr__(self):
-        return "<StaticAnimation %s: \"%s\">" % (id(self), self.filename)
+        return "<StaticAnimation %s: \"%s\">" % (id(self), self.name)
 
@@ -1,8 +1,9 @@
 import res
-from pathfinding.astar import Node
 from objects import GameObject
+from profiler import profiled
 from pygame import Rect
-from pathfinding import astar
+from pathfinding.grid import GridPathfinder, costGrid, tileCost
+from pathfinding.hpa import ClusterPathfinder
 from lib2d.signals import *
 import math
 
@@ -196,8 +197,15 @@ class PlatformArea(AbstractArea, PlatformMixin):
     NOTE: some of the code is specific for maps from the tmxloader
     """
 
+    # options passed to the map loader
+    mapOptions = {"force_colorkey": (128,128,0)}
+
     gravity = (0, 50)
 
+    # the physics runs this many times faster than the clock.  the game was
+    # made with five 1/60 second steps for each frame, at 60 frames a second.
+    timeScale = 5.0
+
 
     def defaultSize(self):
         # TODO: this cannot be hardcoded!
@@ -230,24 +238,52 @@ class PlatformArea(AbstractArea, PlatformMixin):
         # internal physics stuff
         self.geometry = {}
         self.bodies = {}
+        self.lastPositions = {}     # body: position before the last step
         self.physicsgroup = None
         self.extent = None          # absolute boundaries of the area
         self.scaling = 1.0          # MUST BE FLOAT 
+        self.pathfinder = None      # made from the map when it is needed
+
+
+    def __getstate__(self):
+        # bodies are saved as their position and velocity.  the space and
+        # the map are made again by load().
+        state = AbstractArea.__getstate__(self)
+        state["bodies"] = dict((entity, (tuple(body.position),
+                                         tuple(body.velocity)))
+                               for entity, body in self.bodies.items())
+        for key in ("space", "tmxdata", "subscribers", "lastPositions",
+                    "pathfinder"):
+            state.pop(key, None)
+        return state
+
+
+    def __setstate__(self, state):
+        bodies = state.pop("bodies")
+        AbstractArea.__setstate__(self, state)
+        self.tmxdata = None
+        self.pathfinder = None
+        self.subscribers = []
+        self.lastPositions = {}
+        self.bodies = {}
+        for entity, (position, velocity) in bodies.items():
+            body = pymunk.Body(5, pymunk.inf)
+            body.position = position
+            body.velocity = velocity
+            self.bodies[entity] = body
 
 
     def load(self):
-        import pytmx
+        from preload import mapSounds
 
-        self.tmxdata = pytmx.tmxloader.load_pygame(
-                       self.mappath, force_colorkey=(128,128,0))
+        self.tmxdata = res.loadMap(self.mappath, **self.mapOptions)
+
+        # the clusters of the map are searched now, not on the first path
+        self.pathfinder = None
+        self.getPathfinder()
 
         # get sounds from tiles
-        for i, layer in enumerate(self.tmxdata.tilelayers):
-            props = self.tmxdata.getTilePropertiesByLayer(i)
-            for gid, tileProp in props:
-                for key, value in tileProp.items():
-                    if key[4:].lower() == "sound":
-                        self.soundFiles.append(value)
+        self.soundFiles.extend(mapSounds(self.tmxdata))
 
         # get sounds from objects
         for i in [ i for i in self.getChildren() if i.sounds ]:
@@ -296,7 +332,8 @@ class PlatformArea(AbstractArea, PlatformMixin):
             return
 
         AbstractArea.remove(self, entity)
-        del self.bodies[entity]
+        body = self.bodies.pop(entity)
+        self.lastPositions.pop(body, None)
         self.changedAvatars = True
 
         # hack
@@ -318,29 +355,38 @@ class PlatformArea(AbstractArea, PlatformMixin):
         self.geometry[layer] = rects
 
 
+    def getPathfinder(self):
+        if self.pathfinder is None:
+            grid = GridPathfinder(costGrid(self.tmxdata))
+            self.pathfinder = ClusterPathfinder(grid)
+        return self.pathfinder
+
+
+    @profiled("area.pathfind")
     def pathfind(self, start, destination):
         """Pathfinding for the world.  Destinations are 'snapped' to tiles.
+
+        returns a list of tiles from the destination back to the start.
+        the solid tiles of the control layer can't be passed.  paths that
+        leave the cluster of the start are only tiles for the first few
+        steps; after that they are the entrances between clusters.
         """
 
-        def NodeFactory(pos):
-            x, y = pos[:2]
-            l = 0
-            return Node((x, y))
-
-            try:
-                if self.tmxdata.getTileGID(x, y, l) == 0:
-                    node = Node((x, y))
-                else:
-                    return None
-            except:
-                return None
-            else:
-                return node
+        start = self.worldToTile(start)[:2]
+        destination = self.worldToTile(destination)[:2]
+        return self.getPathfinder().findPath(start, destination)
+
+
+    def setTileGID(self, (x, y, l), gid):
+        """
+        change a tile of the map.  renderers of the map must be told, too.
+        paths that were found are forgotten if the control layer changed.
+        """
 
-        start = self.worldToTile(start)
-        destination = self.worldToTile(destination)
-        path = astar.search(start, destination, NodeFactory)
-        return path
+        self.tmxdata.setTileGID(x, y, l, gid)
+        layer = self.tmxdata.tilelayers[l]
+        if self.pathfinder is not None and layer.name == "Control":
+            self.pathfinder.setCost((x, y), tileCost(self.tmxdata, gid))
 
 
     def emitText(self, text, pos=None, entity=None):
@@ -366,6 +412,7 @@ class PlatformArea(AbstractArea, PlatformMixin):
                 sub.emitSound(filename, pos)
 
 
+    @profiled("area.update")
     def update(self, time):
         self.inUpdate = True
         self.time += time
@@ -403,7 +450,13 @@ class PlatformArea(AbstractArea, PlatformMixin):
             if entity.time_update:
                 entity.update(time)
 
-        self.space.step(1.0/60)
+        # remember where the bodies were, so they can be drawn between steps.
+        # the positions of pymunk bodies change with them, so they are copied.
+        lastPositions = self.lastPositions
+        for body in self.bodies.itervalues():
+            lastPositions[body] = tuple(body.position)
+        self.space.step(time / 1000.0 * self.timeScale)
+        self.setDirty()
 
         # awkward looping allowing objects to be added/removed during update
         self.inUpdate = False
@@ -425,6 +478,20 @@ class PlatformArea(AbstractArea, PlatformMixin):
         self.subscribers.append(subscriber)
 
 
+    def getPosition(self, body, alpha=1.0):
+        """
+        return the position of a body, alpha of the way from where it was
+        before the last step to where it is now
+        """
+
+        x, y = body.position
+        try:
+            lx, ly = self.lastPositions[body]
+        except KeyError:
+            return x, y
+        return lx + (x - lx) * alpha, ly + (y - ly) * alpha
+
+
     def getSize(self, entity):
         """ Return 3d size of the object """
         return self.bodies[entity].bbox.size
@@ -21,7 +21,6 @@ along with lib2d.  If not, see <http://www.gnu.org/licenses/>.
 
 from objects import GameObject
 import res, animation
-from pygame.transform import flip
 import itertools
 
 
@@ -46,7 +45,9 @@ class Avatar(GameObject):
         self.timer      = 0.0
         self.ttl = 0
         self.flip = 0
+        self.angle = 0          # in degrees, counterclockwise
         self._prevAngle = None
+        self._cacheKey = None
 
         for animation in animations:
             self.add(animation)
@@ -59,12 +60,18 @@ class Avatar(GameObject):
     def _updateCache(self):
         #angle = self.getOrientation()
         angle = 0
-        self.curImage = self.curAnimation.getImage(self.curFrame, angle) 
-        if self.flip: self.curImage = flip(self.curImage, 1, 0)
+        self.curImage = self.curAnimation.getImage(self.curFrame, angle,
+                                                   flipx=self.flip,
+                                                   angle=self.angle)
 
     @property
     def image(self):
-        self._updateCache()
+        # the transformed frames are cached by the animation, so the image
+        # only has to be looked up when the frame or orientation changes
+        key = (self.curAnimation, self.curFrame, self.flip, self.angle)
+        if key != self._cacheKey:
+            self._updateCache()
+            self._cacheKey = key
         return self.curImage
 
 
@@ -75,6 +82,18 @@ class Avatar(GameObject):
 
     def unload(self):
         self.curImage = None
+        self._cacheKey = None
+
+
+    def __getstate__(self):
+        # the iterator can't be pickled, so the animation is played again
+        # from the start the next time the avatar is updated
+        state = GameObject.__getstate__(self)
+        state["iterator"] = None
+        state["callback"] = (None, [], {})
+        state["curImage"] = None
+        state["_cacheKey"] = None
+        return state
 
 
     def update(self, time):
@@ -83,6 +102,10 @@ class Avatar(GameObject):
         animation files must match the units provided here.  ie: milliseconds.
         """
 
+        if self.iterator is None:
+            current, self.curAnimation = self.curAnimation, None
+            self.play(current, self.loop)
+
         if self.ttl < 0:
             return
 
@@ -18,6 +18,7 @@ along with lib2d.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import res
+import text
 import pygame
 
 
@@ -30,14 +31,8 @@ simple functions wrap pygame's font module
 
 
 def loadFont(font, size):
-    if font is None:
-        return pygame.font.Font(res.defaultFont(), size)
-            
-    elif isinstance(font, str):
-        return pygame.font.Font(res.fontPath(font), size)
-
-    elif isinstance(font, pygame.font.Font):
-        return font
+    if font is None or isinstance(font, str):
+        return text.getFont(font, size)
 
     else:
         return font
@@ -19,11 +19,13 @@ along with lib2d.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import gfx
+import profiler
 import pygame
 from lib2d.objects import GameObject
 from playerinput import KeyboardPlayerInput, MousePlayerInput
 from collections import deque
 from itertools import cycle, islice
+from timeit import default_timer
 from pygame.locals import *
 
 
@@ -103,6 +105,15 @@ class Context(object):
         pass
 
 
+    def update(self, time):
+        """
+        Called tick_rate times a second of game time, with the length of a
+        tick in ms.  It may be called a few times in one frame, or not at all.
+        """
+
+        pass
+
+
     def handle_event(self, event):
         """
         Called when there is an pygame event to process
@@ -164,11 +175,19 @@ class ContextDriver(object):
     etc.
     """
 
-    def __init__(self, parent, inputs, target_fps=30):
+    def __init__(self, parent, inputs, target_fps=30, tick_rate=300,
+                 max_ticks=15):
         self.parent = parent
         self._stack = deque()
         self.target_fps = target_fps
+        self.tick_rate = tick_rate      # updates each second of game time
+        self.max_ticks = max_ticks      # most updates in one frame
+        self.alpha = 1.0
+        self.ticks = 0                  # ticks run since the driver started
         self.inputs = inputs
+        self.graph = None
+        self.recorder = None            # a headless.Recording, if recording
+        self.journal = None             # save game that areas are read from
 
         self.inputs.append(KeyboardPlayerInput())
         #self.inputs.append(MousePlayerInput())
@@ -270,6 +289,27 @@ class ContextDriver(object):
         self._stack.pop()
         self._stack.append(StatePlaceholder(prev.__class__))
         self.start(state)
+        self.evictAreas()
+
+
+    def areas(self):
+        """
+        return the areas of the states on the stack
+        """
+
+        return [ state.area for state in self._stack
+                 if getattr(state, "area", None) is not None ]
+
+
+    def evictAreas(self, limit=0):
+        """
+        put the areas that no state on the stack uses back in the save game,
+        except for the limit of them that were read last
+        """
+
+        if self.journal is not None:
+            return self.journal.evictUnused(self.areas(), limit)
+        return 0
 
 
     def push(self, state):
@@ -295,9 +335,34 @@ class ContextDriver(object):
                 nexts = cycle(islice(nexts, pending))
 
 
+    def toggleGraph(self):
+        """
+        show or hide the graph of frame times.  profiling is started if it
+        isn't already.
+        """
+
+        if self.graph is None:
+            profiler.enable()
+            self.graph = profiler.ProfilerGraph(
+                         budget=1000.0 / self.target_fps)
+        else:
+            rect = self.graph.restore(self._screen)
+            self.graph = None
+            if rect:
+                gfx.update_display([rect])
+
+
     def run(self):
         """
         run the state driver.
+
+        the state is updated tick_rate times a second with the same time each
+        tick, then drawn once.  the time left over, as a fraction of a tick,
+        is kept in alpha while the state is drawn.
+
+        if profiling is enabled, the time of each part of the frame is
+        recorded: "events", "update" for all of the ticks, "draw", "display"
+        and the whole "frame".
         """
 
         # deref for speed
@@ -305,6 +370,9 @@ class ContextDriver(object):
         event_pump = pygame.event.pump
         current_state = self.getCurrentState
         clock = pygame.time.Clock()
+        timer = default_timer
+        step = 1000.0 / self.tick_rate
+        lag = 0.0
 
         # streamline event processing by filtering out stuff we won't use
         allowed = [QUIT, KEYDOWN, KEYUP, \
@@ -333,6 +401,12 @@ class ContextDriver(object):
         while currentState:
             time = clock.tick(self.target_fps)
 
+            # the profiler can be started by the graph, so check every frame
+            frame = profiler.current
+            if frame:
+                frame.newFrame()
+                frameStart = timer()
+
             event = event_poll()
             while event:
 
@@ -350,6 +424,8 @@ class ContextDriver(object):
 
                 # do we flush input now?
                 elif event.type == event_flush:
+                    if self.recorder is not None:
+                        self.recordCommands(currentState, cmdlist)
                     currentState.handle_commandlist(cmdlist)
                     [ currentState.handle_commandlist(i.getHeld())
                     for i in self.inputs ]
@@ -367,6 +443,8 @@ class ContextDriver(object):
                     if event.key == K_ESCAPE:
                         self.done()
                         break
+                    elif event.key == K_F3:
+                        self.toggleGraph()
                     else:
                         currentState.handle_event(event)
                 else:
@@ -378,27 +456,118 @@ class ContextDriver(object):
             if currentState: currentState = originalState
 
             if currentState:
+                if frame:
+                    start = timer()
+                    frame.add("events", start - frameStart)
+
+                # the game is updated in ticks of the same length, so it runs
+                # at the same speed at any frame rate.  if it falls too far
+                # behind, it is slowed down instead of running more ticks.
+                # a state's recording starts on its first tick
+                if self.recorder is not None:
+                    self.recorder.record(currentState, self.ticks, [])
+
+                lag += time
+                ticks = 0
+                while lag >= step:
+                    if ticks == self.max_ticks:
+                        lag %= step
+                        break
+
+                    currentState.update(step)
+                    lag -= step
+                    ticks += 1
+                    self.ticks += 1
+                    currentState = current_state()
+                    if not currentState == originalState: break
+
+                if frame:
+                    now = timer()
+                    frame.add("update", now - start)
+                    start = now
+
+                if not currentState == originalState:
+                    lag = 0.0
+                    continue
+
+                # the state can draw things between the last tick and the next
+                self.alpha = lag / step
+
+                # the graph is shown from the first frame that is recorded
+                graph = self.graph if frame else None
+                if graph:
+                    restored = graph.restore(self._screen)
+
                 dirty = currentState.draw(self._screen)
+                if graph:
+                    drawn = graph.draw(self._screen, frame)
+                    if isinstance(dirty, pygame.Rect):
+                        dirty = [ dirty ]
+                    if dirty is not None:
+                        dirty = [ r for r in dirty if r ] + [ drawn ]
+                        if restored:
+                            dirty.append(restored)
+
+                if frame:
+                    now = timer()
+                    frame.add("draw", now - start)
+                    start = now
+
                 gfx.update_display(dirty)
-                #gfx.update_display()
-
-                # looks awkward?  because it is.  forcibly give small updates
-                # to each object so we don't draw too often.
-
-                time = time / 5.0
-                #print time, self.target_fps / 10.0
-
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
-                currentState.update(time)
-                currentState = current_state()
-                if not currentState == originalState: continue
-                currentState.update(time)
-                currentState = current_state()
+
+                if frame:
+                    now = timer()
+                    frame.add("display", now - start)
+                    frame.add("frame", now - frameStart)
+
+
+    def recordCommands(self, state, cmdlist):
+        """
+        give the commands that the state is about to handle to the recorder
+        """
+
+        self.recorder.record(state, self.ticks, cmdlist)
+        for i in self.inputs:
+            self.recorder.record(state, self.ticks, i.getHeld())
+
+
+    def simulate(self, ticks, drawEvery=0, replay=None):
+        """
+        run the current state for a number of ticks as fast as possible,
+        without waiting for the clock or reading any events.  for benchmarks
+        and soak tests.  if drawEvery is given, the state is drawn onto the
+        screen after that many ticks, but the display is not updated.
+
+        if a headless.Replay is given, its commands are given to the state
+        before the ticks that they were recorded on.
+
+        returns the number of ticks that were run, which is less than ticks
+        if the state finished.
+        """
+
+        step = 1000.0 / self.tick_rate
+        state = self.getCurrentState()
+        self.alpha = 1.0
+
+        for i in xrange(ticks):
+            frame = profiler.current
+            if frame:
+                frame.newFrame()
+                start = default_timer()
+
+            if replay:
+                for cmdlist in replay.commandsAt(i):
+                    state.handle_commandlist(cmdlist)
+
+            state.update(step)
+            self.ticks += 1
+            if drawEvery and (i + 1) % drawEvery == 0:
+                state.draw(self._screen)
+
+            if frame:
+                frame.add("frame", default_timer() - start)
+
+            if self.getCurrentState() is not state:
+                return i + 1
+
+        return ticks
@@ -73,60 +73,7 @@ class GraphicBox(object):
 # automatically wraps words
 # returns any text that didn't get blitted
 # passing None as the surface is ok
-def drawText(surface, text, color, rect, font=None, aa=False, bkg=None):
-    rect = Rect(rect)
-    y = rect.top
-    lineSpacing = -2
-    maxWidth = 0
-    maxHeight = 0
-
-    if font is None:
-        fullpath = pygame.font.get_default_font()
-        font = pygame.font.Font(fullpath, 12)
-
-    # get the height of the font
-    fontHeight = font.size("Tg")[1]
-
-    # for very small fonts, turn off antialiasing
-    if fontHeight < 16:
-        aa=0
-        bkg=None
-
-
-    while text:
-        i = 1
-
-        # determine if the row of text will be outside our area
-        if y + fontHeight > rect.bottom:
-            break
-
-        # determine maximum width of line
-        while font.size(text[:i])[0] < rect.width and i < len(text):
-            if text[i] == "\n":
-                text = text[:i] + text[i+1:]
-                break
-            i += 1
-        else:
-            # if we've wrapped the text, then adjust the wrap to the last word
-            if i < len(text):
-                i = text.rfind(" ", 0, i) + 1
-
-        if surface:
-            # render the line and blit it to the surface
-            if bkg:
-                image = font.render(text[:i], 1, color, bkg)
-                image.set_colorkey(bkg)
-            else:
-                image = font.render(text[:i], aa, color)
-
-            surface.blit(image, (rect.left, y))
-
-        y += fontHeight + lineSpacing
-
-        # remove the text we just blitted
-        text = text[i:]
-
-    return text
+from text import drawText
 
 
 def renderOutlineText(text, color, border, fontFilename, size,
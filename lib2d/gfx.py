@@ -24,14 +24,32 @@ from pygame.transform import scale, scale2x
 from pygame.display import flip
 import pygame, os.path, pprint
 
+try:
+    import numpy
+    from pygame import surfarray
+except ImportError:
+    surfarray = None
+
 """
 a few utilities for making retro looking games by scaling the screen
 and providing a few functions for handling screen changes
 
 """
 
+# scale the screen in another thread, while the next frame is drawn
 threaded = 0
 
+# with numpy, "scale" copies each pixel into a block of pixels with numpy
+# instead of using pygame.transform.scale.  the result is the same.
+fast_scale = True
+
+# when true, only the parts of the screen that changed are scaled and updated
+dirty_rects = True
+
+# if the dirty rects cover more than this much of the screen, all of it is
+# updated instead
+dirty_limit = .6
+
 DEBUG = False
 
 def debug(text):
@@ -44,7 +62,10 @@ screen_dim = None
 buffer_dim = None
 screen = None
 screen_surface = None
+scaled_surface = None
 update_display = None
+present = None
+thread = None
 double_buffer = False
 hwsurface = False
 #surface_flags = pygame.FULLSCREEN
@@ -53,20 +74,74 @@ surface_flags = 0
 
 
 import threading
-import Queue
+
+
 class ScalingThread(threading.Thread):
-    def __init__(self, func, arg):
+    """
+    scales frames onto the display while the next one is drawn.
+
+    present() copies the parts of the screen that changed into a buffer of
+    the thread's own, so the screen can be drawn on again while the buffer
+    is scaled.  if the last frame is not on the display yet, present() waits
+    for it.
+    """
+
+    def __init__(self, func, size):
         super(ScalingThread, self).__init__()
+        self.daemon = True
         self.func = func
-        self.arg = arg
-        self.trigger = False
+        self.buffer = pygame.Surface(size, surface_flags)
+        self.rects = None
+        self.pending = False
         self.running = True
+        self.cond = threading.Condition()
+
+    def present(self, source, rects):
+        with self.cond:
+            while self.pending:
+                self.cond.wait()
+
+            if rects is None:
+                self.buffer.blit(source, (0, 0))
+            elif not rects:
+                return
+            else:
+                for rect in rects:
+                    self.buffer.blit(source, rect, rect)
+
+            self.rects = rects
+            self.pending = True
+            self.cond.notify_all()
+
+    def wait(self):
+        """
+        wait until the last frame is on the display
+        """
+
+        with self.cond:
+            while self.pending:
+                self.cond.wait()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
 
     def run(self):
-        while self.running:
-            while not self.trigger:
-                pass
-            self.func(self.arg)
+        while 1:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+
+                if not self.running:
+                    break
+
+            # present() doesn't touch the buffer until pending is cleared
+            self.func(self.buffer, self.rects)
+
+            with self.cond:
+                self.pending = False
+                self.cond.notify_all()
 
 
 def hardware_checks():
@@ -82,23 +157,176 @@ def init():
     # determine if we can use hardware accelerated surfaces or not
     pygame.display.set_caption("robots!")
 
+def merge_rects(rects, bounds, limit=None):
+    """
+    return a short list of rects that covers the rects, clipped to the bounds.
+
+    rects that overlap, or are close enough that joining them doesn't cover
+    much more area, are joined.  if the result covers more than limit of the
+    bounds, dirty_limit if it isn't given, None is returned, meaning that
+    everything should be updated.
+    """
+
+    if limit is None:
+        limit = dirty_limit
+
+    rects = [ r for r in (bounds.clip(r) for r in rects) if r ]
+
+    merged = True
+    while merged:
+        merged = False
+        i = 0
+        while i < len(rects):
+            a = rects[i]
+            area = a.w * a.h
+            j = i + 1
+            while j < len(rects):
+                b = rects[j]
+                u = a.union(b)
+                if u.w * u.h <= area + b.w * b.h:
+                    a = u
+                    area = u.w * u.h
+                    del rects[j]
+                    merged = True
+                else:
+                    j += 1
+            rects[i] = a
+            i += 1
+
+    if sum(r.w * r.h for r in rects) > bounds.w * bounds.h * limit:
+        return None
+
+    return rects
+
+
+def dirty_regions(dirty):
+    """
+    return the merged dirty rects of the screen, or None if all of it needs
+    to be updated
+    """
+
+    if dirty is None or not dirty_rects:
+        return None
+
+    if isinstance(dirty, pygame.Rect):
+        dirty = [dirty]
+
+    return merge_rects(dirty, screen.get_rect())
+
+
 # is it redundant to have a pygame buffer, and one for pixalization?  maybe...
 
-def update_display_scaled2x(dirty):
-    scale2x(screen, screen_surface)
-    flip()
+def update_display_unscaled(dirty):
+    rects = dirty_regions(dirty)
+    if rects is None:
+        pygame.display.update()
+    elif rects:
+        pygame.display.update(rects)
+
+def present_scale2x(source, rects):
+    if rects is None:
+        scale2x(source, scaled_surface)
+        flip()
+        return
+
+    # scale2x looks at the neighbors of each pixel, so a changed pixel
+    # changes how its neighbors are scaled too.  scale a border around the
+    # neighbors, then keep only the middle.
+    bounds = source.get_rect()
+    updates = []
+    for rect in rects:
+        rect = rect.inflate(2, 2).clip(bounds)
+        outer = rect.inflate(2, 2).clip(bounds)
+        temp = scale2x(source.subsurface(outer))
+        dest = pygame.Rect(rect.x * 2, rect.y * 2, rect.w * 2, rect.h * 2)
+        area = dest.move(-outer.x * 2, -outer.y * 2)
+        scaled_surface.blit(temp, dest, area)
+        updates.append(dest)
+
+    pygame.display.update(updates)
+
+def present_scale(source, rects):
+    if rects is None:
+        scale(source, scaled_surface.get_size(), scaled_surface)
+        flip()
+        return
+
+    # each pixel becomes a block of pixels, so the rects can be scaled alone
+    s = pix_scale
+    updates = []
+    for rect in rects:
+        dest = pygame.Rect(rect.x * s, rect.y * s, rect.w * s, rect.h * s)
+        scale(source.subsurface(rect), dest.size,
+              scaled_surface.subsurface(dest))
+        updates.append(dest)
+
+    pygame.display.update(updates)
+
+def replicate(src, dst, s):
+    """
+    copy each pixel of an array into an s by s block of another.  the arrays
+    are rows of pixels, and dst must be s times as big as src.
+    """
+
+    # spread each pixel across the first row of its block, then copy that
+    # row down the rest of the block.  dst[::s] can be viewed as
+    # (rows, pixels, s) without a copy, so nothing new is made.
+    first = dst[::s]
+    blocks = first.view()
+    blocks.shape = src.shape + (s,)
+    for i in xrange(s):
+        blocks[:, :, i] = src
+    for i in xrange(1, s):
+        dst[i::s] = first
+
+def present_replicate(source, rects):
+    """
+    same as present_scale, but the pixels are copied with numpy, which is
+    about twice as fast as pygame.transform.scale
+    """
+
+    if rects is not None and not rects:
+        return
+
+    s = pix_scale
+    updates = []
+
+    # the surfaces are locked until the arrays are gone
+    src = surfarray.pixels2d(source).T
+    dst = surfarray.pixels2d(scaled_surface).T
+    for x, y, w, h in rects or [ source.get_rect() ]:
+        replicate(src[y:y+h, x:x+w], dst[y*s:(y+h)*s, x*s:(x+w)*s], s)
+        updates.append(pygame.Rect(x * s, y * s, w * s, h * s))
+    del src, dst
+
+    if rects is None:
+        flip()
+    else:
+        pygame.display.update(updates)
+
+def can_replicate(source, dest):
+    """
+    return True if present_replicate can copy pixels between the surfaces
+    """
+
+    if surfarray is None:
+        return False
+
+    return (source.get_bitsize() in (8, 16, 32) and
+            source.get_bitsize() == dest.get_bitsize() and
+            source.get_masks() == dest.get_masks() and
+            (source.get_bitsize() != 8 or
+             source.get_palette() == dest.get_palette()))
 
 def update_display_scaled(dirty):
-    scale(screen, screen_dim, screen_surface)
-    flip()
+    present(screen, dirty_regions(dirty))
 
 def update_display_threaded(dirty):
-    global thread
-    thread.trigger = True
+    thread.present(screen, dirty_regions(dirty))
 
 def set_screen(dim, scale=1, transform=None):
 
-    global pixelize, pix_scale, buffer_dim, screen, update_display, screen_surface, screen_dim
+    global pixelize, pix_scale, buffer_dim, screen, update_display, screen_surface, screen_dim, thread
 
     screen_dim = Vec2d(dim)
 
@@ -106,39 +334,58 @@ def set_screen(dim, scale=1, transform=None):
         set_scale(scale, transform)
 
     elif transform is None:
+        if thread:
+            thread.stop()
+            thread = None
+
         pixelize = False
         pixel_buffer = None
         pix_scale = 1
-        buffer_dim = None
-        update_display = pygame.display.update
+        buffer_dim = tuple(screen_dim)
+        update_display = update_display_unscaled
         screen_surface = pygame.display.set_mode(screen_dim, surface_flags)
         screen = screen_surface
 
 def set_scale(scale, transform="scale"):
     from pygame.surface import Surface
 
-    global pixelize, pix_scale, buffer_dim, screen, update_display, screen_surface, screen_dim, thread
+    global pixelize, pix_scale, buffer_dim, screen, update_display, screen_surface, screen_dim, thread, scaled_surface, present
 
     if transform == "scale2x":
         pix_scale = 2
-        update_display = update_display_scaled2x
     elif transform == "scale":
         pix_scale = scale
-        update_display = update_display_scaled
-
-
-    if threaded:
-        thread = ScalingThread(update_display, None)
-        update_display = update_display_threaded
-        thread.start()
-
 
     pixelize = True
     buffer_dim = tuple([ int(i / pix_scale) for i in screen_dim ])
     screen_surface = pygame.display.set_mode(screen_dim, surface_flags)
     screen = Surface(buffer_dim, surface_flags)
+
+    # the buffer is scaled by a whole number, so that a pixel always covers
+    # the same block on the display.  this matches the mouse position
+    # conversion in playerinput.  any leftover edge is left black.
+    scaled_surface = screen_surface.subsurface(
+                     ((0, 0), [ i * pix_scale for i in buffer_dim ]))
     #screen_surface = pygame.display.set_mode(screen_dim)
 
+    if transform == "scale2x":
+        present = present_scale2x
+    elif fast_scale and can_replicate(screen, scaled_surface):
+        present = present_replicate
+    else:
+        present = present_scale
+
+    if thread:
+        thread.stop()
+        thread = None
+
+    if threaded:
+        thread = ScalingThread(present, buffer_dim)
+        update_display = update_display_threaded
+        thread.start()
+    else:
+        update_display = update_display_scaled
+
 
 def get_rect():
     return pygame.Rect((0,0), buffer_dim)
@@ -0,0 +1,151 @@
+"""
+run the game without a window or a keyboard
+
+the commands that the ContextDriver gives to each state can be recorded
+while playing, then given to the state again by ContextDriver.simulate().
+since the game is updated in ticks of the same length, a replay always ends
+in the same place, so the checksum of the bodies can be used to find changes
+that break the physics or the controllers:
+
+    >>> driver.recorder = Recording()
+    >>> driver.run()
+    >>> driver.recorder.save("walk.replay")
+
+    >>> headless.init()
+    >>> replay = Replay(Recording.load("walk.replay").segment("LevelState"))
+    >>> driver.simulate(3000, replay=replay)
+    >>> headless.checksum(area)
+    '3f6c2a9e51b0d7c4'
+"""
+
+import hashlib
+import pickle
+import struct
+import os
+
+
+
+def init(size=(320, 240)):
+    """
+    start pygame with the dummy video driver, so nothing is shown.  it must
+    be called before anything else uses pygame.
+    """
+
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    import pygame
+    pygame.init()
+
+    # the dummy driver makes 8 bit displays; the game needs more colors
+    return pygame.display.set_mode(size, 0, 32)
+
+
+def checksum(area):
+    """
+    return a hash of the position and velocity of every body in an area
+    """
+
+    h = hashlib.md5()
+    bodies = sorted((entity.guid, body) for entity, body in
+                    area.bodies.items())
+    for guid, body in bodies:
+        x, y = body.position
+        vx, vy = body.velocity
+        h.update(struct.pack("<q4d", guid or 0, x, y, vx, vy))
+
+    return h.hexdigest()[:16]
+
+
+
+class Recording(object):
+    """
+    the commands that were given to each state, with the tick of the state
+    that they were given on
+
+    a new segment is started each time the commands go to a different state,
+    so a recording of a game that started on the title screen can be played
+    back to just the level.
+    """
+
+    def __init__(self):
+        self.segments = []      # list of (name of the state, batches)
+        self.state = None
+        self.start = 0
+
+
+    def __getstate__(self):
+        return {"segments": self.segments}
+
+
+    def __setstate__(self, d):
+        self.__init__()
+        self.segments = d["segments"]
+
+
+    def record(self, state, tick, cmdlist):
+        """
+        called by the ContextDriver each time a state is given commands
+        """
+
+        if state is not self.state:
+            self.state = state
+            self.start = tick
+            self.segments.append((state.__class__.__name__, []))
+
+        if cmdlist:
+            self.segments[-1][1].append((tick - self.start, list(cmdlist)))
+
+
+    def segment(self, name):
+        """
+        return the commands of the first segment for a state with this name
+        """
+
+        for stateName, batches in self.segments:
+            if stateName == name:
+                return batches
+
+        raise KeyError, name
+
+
+    def save(self, filename):
+        with open(filename, "wb") as fh:
+            pickle.dump(self, fh, pickle.HIGHEST_PROTOCOL)
+
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as fh:
+            return pickle.load(fh)
+
+
+
+class Replay(object):
+    """
+    gives the commands of a segment back to a state, on the same ticks
+    """
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.index = 0
+
+
+    @property
+    def done(self):
+        return self.index >= len(self.batches)
+
+
+    def commandsAt(self, tick):
+        """
+        return the lists of commands that were given before this tick
+        """
+
+        batches = self.batches
+        start = self.index
+        end = start
+        while end < len(batches) and batches[end][0] <= tick:
+            end += 1
+
+        self.index = end
+        return [ cmdlist for t, cmdlist in batches[start:end] ]
@@ -22,9 +22,33 @@ class Image(object):
         self.kwargs.update(kwargs)
         self.loaded = False
 
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        d['loaded'] = False
+        return d
+
     def load(self):
+        """
+        return the surface.  the surface is shared with other images of the
+        same file, so don't change it.  the image is kept in the cache until
+        unload() is called.
+        """
+
+        acquire = not self.loaded
         self.loaded = True
-        return res.loadImage(self.filename, *self.args, **self.kwargs)
+        return res.loadImage(self.filename, *self.args, acquire=acquire,
+                             **self.kwargs)
+
+    def unload(self):
+        if self.loaded:
+            self.loaded = False
+            res.releaseImage(self.filename, *self.args, **self.kwargs)
+
+    def key(self):
+        """
+        return a value that is the same for images that load the same surface
+        """
+        return (self.filename, self.args, tuple(sorted(self.kwargs.items())))
 
 
 class ImageTile(object):
@@ -36,13 +60,32 @@ class ImageTile(object):
         self.image = Image(filename)
         self.tile = tile
         self.tilesize = tilesize
+        self.loaded = False
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        d['loaded'] = False
+        return d
 
     def load(self):
+        """
+        return the tile.  like Image, the surface is shared and cached until
+        unload() is called.
+        """
+
+        acquire = not self.loaded
         self.loaded = True
-        if self.image.loaded:
-            surface = self.image.load()
-        else:
-            surface = self.image.load()
+        return res.imageCache.get(self.key(), self.makeTile, res.surfaceSize,
+                                  acquire)
+
+    def unload(self):
+        if self.loaded:
+            self.loaded = False
+            res.imageCache.release(self.key())
+
+    def makeTile(self):
+        image = self.image
+        surface = res.loadImage(image.filename, *image.args, **image.kwargs)
         temp = pygame.Surface(self.tilesize).convert(surface)
         temp.blit(surface, (0,0),
                   ((self.tilesize[0] * self.tile[0],
@@ -51,3 +94,6 @@ class ImageTile(object):
         if self.image.kwargs['colorkey']:
             temp.set_colorkey(temp.get_at((0,0)), pygame.RLEACCEL)
         return temp
+
+    def key(self):
+        return (self.image.key(), self.tile, self.tilesize)
@@ -0,0 +1,441 @@
+"""
+save games that only write what changed
+
+a save is a pair of files.  the data file has a record for each object: its
+class and its state, pickled.  other game objects in the state are pickled
+as their guid, so each record can be read on its own, and an object and its
+children can be read without reading the rest of the world.
+
+the first save of a game is its baseline, made after the world is built.
+after that, the objects that changed since the last save are kept by the
+registry of the tree, and only they are written.  the new records are added
+to the end of the data file, and the index file gets the guid and offset of
+each one, so the newest record of each object is the one that is read:
+
+    >>> journal = game.save("resources/saves/save")
+    >>> hero.setDirty()
+    >>> journal.save(game)
+    1
+    >>> loadObject("resources/saves/save", 5001)
+    <PlatformArea: "...">
+
+the files only grow; snapshot() writes a new baseline when they get big.
+
+the records of the objects in an area are a segment of the save; the index
+keeps the area that each object is in.  a game can be read without its
+areas: each one is an AreaProxy, which reads the area the first time that
+it is used.  areas that are not used can be put back with evict():
+
+    >>> game = journal.load(lazy=True)
+    >>> level = game.getChildByGUID(5001)     # an AreaProxy
+    >>> level.getChildByGUID(1)               # the area is read now
+    <Entity: "...">
+    >>> journal.evictUnused(keep=driver.areas())
+"""
+
+from objects import GameObject
+from area import AbstractArea
+from collections import OrderedDict
+from cStringIO import StringIO
+import cPickle as pickle
+import os
+
+
+
+class Journal(object):
+    """
+    the data and index files of a save game
+    """
+
+    def __init__(self, name):
+        self.dataPath = name + "-data.save"
+        self.indexPath = name + "-index.save"
+        self.index = {}         # guid: (offset, length, area, name)
+        self.root = None        # guid of the object that was saved
+        self.tree = None        # the object, after it is saved or read
+        self.materialized = OrderedDict()   # guid: area read from a proxy
+        self.readIndex()
+
+
+    def readIndex(self):
+        """
+        read the index file, if there is one.  each save added the records
+        that it wrote; a save that was stopped before it finished is ignored.
+        """
+
+        try:
+            fh = open(self.indexPath, "rb")
+        except IOError:
+            return
+
+        with fh:
+            unpickler = pickle.Unpickler(fh)
+            while 1:
+                try:
+                    root, changes = unpickler.load()
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    break
+
+                self.root = root
+                for guid, entry in changes.iteritems():
+                    if entry is None:
+                        self.index.pop(guid, None)
+                    else:
+                        self.index[guid] = entry
+
+
+    def assignGUIDs(self, objects, registry):
+        """
+        give a guid to the objects that don't have one
+        """
+
+        i = 0
+        for obj in objects:
+            if obj.guid is not None: continue
+            while i in registry.guids:
+                i += 1
+            obj.setGUID(i)
+
+
+    def segmentOf(self, obj):
+        """
+        return the guid of the area that an object is in, or None
+        """
+
+        node = obj
+        while node._parent is not None:
+            if isinstance(node, AbstractArea):
+                return node.guid
+            node = node._parent
+        return None
+
+
+    def writeRecord(self, fh, obj, guids):
+        """
+        write an object at the end of a file and return its index entry
+        """
+
+        def persistent_id(other):
+            if other is not obj and isinstance(other, (GameObject, AreaProxy)):
+                if guids.get(other.guid) is other:
+                    return other.guid
+
+        # the parent is set again when the parent is read
+        state = obj.__getstate__()
+        state.pop("_parent", None)
+
+        offset = fh.tell()
+        pickler = pickle.Pickler(fh, -1)
+        pickler.persistent_id = persistent_id
+        pickler.dump(obj.__class__)
+        pickler.dump(state)
+        return (offset, fh.tell() - offset, self.segmentOf(obj),
+                getattr(obj, "name", None))
+
+
+    def snapshot(self, root):
+        """
+        write every object in the tree, as a new baseline
+        """
+
+        objects = [root] + list(root.getChildren())
+        registry = root.getRegistry()
+        self.assignGUIDs(objects, registry)
+
+        path = os.path.dirname(self.dataPath)
+        if path and not os.path.exists(path):
+            os.makedirs(path)
+
+        index = {}
+        with open(self.dataPath + ".temp", "wb") as fh:
+            for obj in objects:
+                index[obj.guid] = self.writeRecord(fh, obj, registry.guids)
+
+        with open(self.indexPath + ".temp", "wb") as fh:
+            pickle.dump((root.guid, index), fh, -1)
+
+        os.rename(self.dataPath + ".temp", self.dataPath)
+        os.rename(self.indexPath + ".temp", self.indexPath)
+
+        self.index = index
+        self.root = root.guid
+        self.tree = root
+        registry.dirty.clear()
+        registry.removed.clear()
+
+
+    def save(self, root):
+        """
+        write the objects that changed since the last save.  returns the
+        number of objects that were written.
+        """
+
+        if not self.index:
+            self.snapshot(root)
+            return len(self.index)
+
+        registry = root.getRegistry()
+        dirty = [ obj for obj in registry.dirty
+                  if not isinstance(obj, AreaProxy) ]
+        removed = [ guid for guid in registry.removed
+                    if guid not in registry.guids ]
+
+        if not dirty and not removed:
+            return 0
+
+        self.assignGUIDs(dirty, registry)
+
+        changes = dict.fromkeys(removed)
+        with open(self.dataPath, "ab") as fh:
+            fh.seek(0, 2)
+            for obj in dirty:
+                changes[obj.guid] = self.writeRecord(fh, obj, registry.guids)
+
+        with open(self.indexPath, "ab") as fh:
+            pickle.dump((root.guid, changes), fh, -1)
+
+        for guid, entry in changes.iteritems():
+            if entry is None:
+                self.index.pop(guid, None)
+            else:
+                self.index[guid] = entry
+
+        registry.dirty.clear()
+        registry.removed.clear()
+        return len(dirty)
+
+
+    def load(self, guid=None, lazy=False, live=None):
+        """
+        read an object, its children and anything that they refer to.
+        without a guid, the object that was saved is read.
+
+        if lazy, the areas under the object are AreaProxies.  objects that
+        are already in the registry live are used instead of being read.
+        """
+
+        if guid is None:
+            guid = self.root
+        guid = int(guid)
+
+        if guid not in self.index:
+            msg = "GUID ({}) not found in save {}."
+            raise KeyError, msg.format(guid, self.dataPath)
+
+        first = guid
+        loaded = {}     # guid: object
+
+        def persistent_load(pid):
+            return read(int(pid))
+
+        def read(guid):
+            try:
+                return loaded[guid]
+            except KeyError:
+                pass
+
+            if live is not None and guid != first:
+                obj = live.guids.get(guid)
+                if obj is not None:
+                    return obj
+
+            offset, length, area, name = self.index[guid]
+            if lazy and area == guid and guid != first:
+                obj = loaded[guid] = AreaProxy(self, guid, name)
+                return obj
+
+            fh.seek(offset)
+            unpickler = pickle.Unpickler(StringIO(fh.read(length)))
+            unpickler.persistent_load = persistent_load
+
+            # the object is made before its state is read, so other objects
+            # that refer back to it get the same one
+            cls = unpickler.load()
+            obj = loaded[guid] = cls.__new__(cls)
+            obj._parent = None
+            obj.__setstate__(unpickler.load())
+            return obj
+
+        with open(self.dataPath, "rb") as fh:
+            node = read(guid)
+
+        for obj in loaded.values():
+            for child in obj._children:
+                child._parent = obj
+
+        # a whole game is ready to be saved again
+        if guid == self.root:
+            self.tree = node
+            registry = node.getRegistry()
+            registry.dirty.clear()
+            registry.removed.clear()
+            registry.missing = self.find
+
+        return node
+
+
+    def find(self, guid):
+        """
+        return the object with the guid, reading the area that it is in if
+        it is an AreaProxy.  the registry calls it for guids it doesn't have.
+        """
+
+        entry = self.index.get(guid)
+        if entry is None or self.tree is None:
+            return None
+
+        registry = self.tree.getRegistry()
+        proxy = registry.guids.get(entry[2])
+        if isinstance(proxy, AreaProxy):
+            proxy.materialize()
+        return registry.guids.get(guid)
+
+
+    def replace(self, old, new):
+        """
+        put new in the place of old, under the same parent
+        """
+
+        parent = old._parent
+        children = parent._children
+        for i, child in enumerate(children):
+            if child is old:
+                children[i] = new
+                break
+        new._parent = parent
+        old._parent = None
+
+
+    def materialize(self, proxy):
+        """
+        read the area of a proxy and put it in the tree where the proxy is
+        """
+
+        area = self.load(proxy.guid, True, self.tree.getRegistry())
+        registry = self.tree.getRegistry()
+        objects = [area] + list(area.getChildren())
+
+        self.replace(proxy, area)
+        registry.removeObject(proxy)
+        registry.addTree(area)
+        registry.dirty.difference_update(objects)
+
+        self.materialized[area.guid] = area
+        return area
+
+
+    def evict(self, area):
+        """
+        save an area and put a proxy in its place, so it can be freed
+        """
+
+        registry = self.tree.getRegistry()
+        self.save(self.tree)
+
+        proxy = AreaProxy(self, area.guid, getattr(area, "name", None))
+        objects = [area] + list(area.getChildren())
+
+        self.replace(area, proxy)
+        registry.removeTree(area)
+        registry.removed.difference_update(obj.guid for obj in objects)
+        registry.addObject(proxy)
+        registry.dirty.discard(proxy)
+
+        for obj in objects:
+            obj.unload()
+
+        self.materialized.pop(area.guid, None)
+        return proxy
+
+
+    def evictUnused(self, keep=(), limit=0):
+        """
+        evict the areas that are not in keep, leaving the limit of them that
+        were read last.  returns the number of areas that were evicted.
+        """
+
+        if self.tree is None:
+            return 0
+
+        order = dict((guid, i) for i, guid in enumerate(self.materialized))
+        registry = self.tree.getRegistry()
+        areas = [ area for area in self.areas(registry) if area not in keep ]
+        areas.sort(key=lambda area: order.get(area.guid, -1))
+
+        evicted = 0
+        for area in areas[:max(0, len(areas) - limit)]:
+            self.evict(area)
+            evicted += 1
+        return evicted
+
+
+    def areas(self, registry):
+        """
+        return the areas in the tree that are read and can be evicted
+        """
+
+        return [ obj for cls, objects in registry.types.items()
+                 if issubclass(cls, AbstractArea)
+                 for obj in objects
+                 if obj._parent is not None and obj.guid in self.index ]
+
+
+
+class AreaProxy(object):
+    """
+    stands for an area of a save game until it is used
+
+    it has the guid and name of the area, and no children.  the first time
+    that anything else is used, the area is read from the save and put in
+    the tree where the proxy is; the proxy then passes everything to it.
+    the assets of the area are loaded when it is shown, like any area.
+    """
+
+    own = ("journal", "guid", "name", "area", "_parent", "_children",
+           "_registry")
+
+    def __init__(self, journal, guid, name):
+        d = self.__dict__
+        d["journal"] = journal
+        d["guid"] = guid
+        d["name"] = name
+        d["area"] = None
+        d["_parent"] = None
+        d["_children"] = []
+        d["_registry"] = None
+
+
+    def __repr__(self):
+        return "<AreaProxy: {} \"{}\">".format(self.guid, self.name)
+
+
+    def materialize(self):
+        """
+        return the area, reading it if it hasn't been read
+        """
+
+        if self.area is None:
+            self.__dict__["area"] = self.journal.materialize(self)
+        return self.area
+
+
+    def load(self):
+        # the assets of an area are loaded when it is read and shown
+        pass
+
+
+    def unload(self):
+        pass
+
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError, name
+        return getattr(self.materialize(), name)
+
+
+    def __setattr__(self, name, value):
+        if name in self.own:
+            self.__dict__[name] = value
+        else:
+            setattr(self.materialize(), name, value)
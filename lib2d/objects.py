@@ -1,21 +1,105 @@
 import res
-import pygame, types, os
+import pygame, os
 
 
-unsupported = [pygame.Surface, types.MethodType]
+def loadObject(name, guid=None):
+    """
+    read a node and its children from disk.  without a guid, the whole tree
+    that was saved is read.
+    """
+
+    from journal import Journal
 
+    return Journal(name).load(guid)
 
-def loadObject(name):
+
+class Registry(object):
     """
-    read this node from disk
+    indexes of the objects in a tree by guid, name and class
+
+    the root of each tree makes one the first time that something is looked
+    up in it.  after that, add(), remove(), setGUID() and setName() keep it
+    current, so finding an object doesn't need to search the tree.  objects
+    can share a name, but not a guid.
+
+    it also keeps the objects that changed since the journal last saved them.
     """
 
-    import cPickle as pickle
+    def __init__(self):
+        self.guids = {}         # guid: object
+        self.names = {}         # name: [ objects ]
+        self.types = {}         # class: set of objects
+        self.dirty = set()      # objects that changed since the last save
+        self.removed = set()    # guids that were taken out of the tree
+        self.missing = None     # called with guids that are not indexed
+
+
+    def addTree(self, node):
+        """
+        index an object and everything under it
+        """
+
+        other = node._registry
+        node._registry = None
+
+        # the object was the root of a tree that had an index, so use it
+        if other is not None:
+            self.addObject(node)
+            self.guids.update(other.guids)
+            for name, objects in other.names.iteritems():
+                self.names.setdefault(name, []).extend(objects)
+            for cls, objects in other.types.iteritems():
+                self.types.setdefault(cls, set()).update(objects)
+                self.dirty.update(objects)
+
+        else:
+            self.addObject(node)
+            for child in node.getChildren():
+                self.addObject(child)
+
+
+    def removeTree(self, node):
+        """
+        stop indexing an object and everything under it
+        """
+
+        self.removeObject(node)
+        for child in node.getChildren():
+            self.removeObject(child)
 
-    with open(name + "-data.save") as fh:
-        node = pickle.load(fh)
 
-    return node
+    def addObject(self, obj):
+        if obj.guid is not None:
+            self.guids[obj.guid] = obj
+
+        name = getattr(obj, "name", None)
+        if name is not None:
+            self.names.setdefault(name, []).append(obj)
+
+        self.types.setdefault(obj.__class__, set()).add(obj)
+        self.dirty.add(obj)
+
+
+    def removeObject(self, obj):
+        if self.guids.get(obj.guid) is obj:
+            del self.guids[obj.guid]
+            self.removed.add(obj.guid)
+
+        self.removeName(obj, getattr(obj, "name", None))
+        self.types.get(obj.__class__, set()).discard(obj)
+        self.dirty.discard(obj)
+
+
+    def removeName(self, obj, name):
+        objects = self.names.get(name)
+        if objects:
+            try:
+                objects.remove(obj)
+            except ValueError:
+                pass
+            if not objects:
+                del self.names[name]
+
 
 
 class GameObject(object):
@@ -42,6 +126,7 @@ class GameObject(object):
         self._children  = []
         self._parent    = parent
         self._childrenGUID = []  # children of this object by guid !dont use
+        self._registry = None    # index of the tree, if this is the root
         self.guid = None
 
         if self.time_update:
@@ -50,6 +135,18 @@ class GameObject(object):
 
     def __repr__(self):
         return "<{}: \"{}\">".format(self.__class__.__name__, id(self))
+
+
+    def __getstate__(self):
+        # the index is made again when it is needed
+        state = self.__dict__.copy()
+        state.pop("_registry", None)
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._registry = None
     
 
     def returnNew(self):
@@ -71,6 +168,7 @@ class GameObject(object):
         new._parent = None
         new._children = []
         new._childrenGUID = []
+        new._registry = None
         new.guid = None
 
         for child in self._children:
@@ -126,23 +224,52 @@ class GameObject(object):
 
     def setGUID(self, guid):
         try:
-            self.guid = int(guid)
+            guid = int(guid)
         except:
             raise ValueError, "GUID's must be an integer"
 
+        registry = self.getRoot()._registry
+        if registry is not None:
+            registry.removeObject(self)
+            self.guid = guid
+            registry.addObject(self)
+        else:
+            self.guid = guid
+
 
     def setName(self, name):
+        registry = self.getRoot()._registry
+        if registry is not None:
+            registry.removeName(self, getattr(self, "name", None))
+            registry.names.setdefault(name, []).append(self)
+            registry.dirty.add(self)
         self.name = name
 
 
+    def setDirty(self):
+        """
+        call when something about this object changed that should be saved.
+        add(), remove(), setGUID() and setName() do it already.
+        """
+
+        registry = self.getRoot()._registry
+        if registry is not None:
+            registry.dirty.add(self)
+
+
     def remove(self, other):
         try:
             self._children.remove(other)
-            other._parent = None
         except ValueError:
             msg = "Attempting to remove child ({}), but not in parent ({})"
             raise ValueError, msg.format(other, self)
 
+        registry = self.getRoot()._registry
+        if registry is not None:
+            registry.removeTree(other)
+            registry.dirty.add(self)
+        other._parent = None
+
 
     def add(self, other):
         self._children.append(other)
@@ -150,24 +277,37 @@ class GameObject(object):
             other._parent.remove(other)
         other.setParent(self)
 
+        # only the root of a tree keeps an index.  if this tree has one,
+        # the index of other is used to update it.
+        registry = self.getRoot()._registry
+        if registry is not None:
+            registry.addTree(other)
+            registry.dirty.add(self)
+        else:
+            other._registry = None
+
 
     def hasChild(self, child):
-        for c in self.getChildren():
-            if c == child: return True
+        node = child._parent
+        while node is not None:
+            if node is self: return True
+            node = node._parent
         return False
 
 
     def getChildren(self):
-        # should be a breadth-first search
-        children = []
-        openList = [self]
-        while openList:
-            parent = openList.pop()
-            children = parent._children[:]
-            while children:
-                child = children.pop()
-                openList.append(child)
-                yield child
+        """
+        iterate over everything under this object, depth first.  the tree
+        can be changed while iterating, but the changes might not be seen.
+        """
+
+        stack = self._children[:]
+        pop = stack.pop
+        extend = stack.extend
+        while stack:
+            child = pop()
+            extend(child._children)
+            yield child
 
 
     def getRoot(self):
@@ -177,6 +317,19 @@ class GameObject(object):
         return node
 
 
+    def getRegistry(self):
+        """
+        return the index of the tree that this object is in
+        """
+
+        root = self.getRoot()
+        if root._registry is None:
+            registry = Registry()
+            registry.addTree(root)
+            root._registry = registry
+        return root._registry
+
+
     def getChildByGUID(self, guid):
         """
         search the children of this object for an object
@@ -185,21 +338,45 @@ class GameObject(object):
       
         guid = int(guid) 
         if self.guid == guid: return self 
-        for child in self.getChildren():
-            if child.guid == guid: return child
+
+        registry = self.getRegistry()
+        child = registry.guids.get(guid)
+        if child is None and registry.missing is not None:
+            child = registry.missing(guid)
+        if child is not None and self.hasChild(child):
+            return child
 
         msg = "GUID ({}) not found."
         raise Exception, msg.format(guid)
 
 
     def getChildByName(self, name):
+        registry = self.getRegistry()
+        for child in registry.names.get(name, ()):
+            if child.name == name and self.hasChild(child):
+                return child
+
+        # the name was set without setName(), so look for it
         for child in self.getChildren():
-            if child.name == name: return child
+            if getattr(child, "name", None) == name:
+                registry.names.setdefault(name, []).append(child)
+                return child
 
         msg = "Object by name ({}) not found."
         raise Exception, msg.format(name)
 
 
+    def getChildrenByType(self, cls):
+        """
+        return a list of the objects under this one that are instances of cls
+        """
+
+        registry = self.getRegistry()
+        return [ child for klass, objects in registry.types.items()
+                 if issubclass(klass, cls)
+                 for child in objects if self.hasChild(child) ]
+
+
     def get_flag(self):
         """
         flags are binary values that are attached to the object
@@ -221,24 +398,6 @@ class GameObject(object):
         pass
 
 
-    def serialize(self, pickler, callback=None):
-        """
-        pickle this object, and continue with the children
-        """
-
-        # last chance we have to make sure children can be accessed in another
-        # life!
-        self.childrenGUID = [ c.guid for c in self._children ]
-
-        pickler.dump(self)
-
-        if callback:
-            callback(self, pickler)
-
-        for child in self._children:
-            child.serialize(pickler, callback)
-
-
     def get_image(self):
         """
         return an image suitable for drawing onto a surface.
@@ -275,45 +434,15 @@ class GameObject(object):
     def save(self, name):
         """
         write the state of this object and all of its children to disk.
-        it will be a pair of files.
+        it will be a pair of files, which are the baseline of a journal:
+        the journal that is returned saves only what changed after that.
         """
 
-        import cPickle as pickle
-        import StringIO
-
-        def testRun():
-            for child in self.getChildren():
-                for k, v in child.__dict__.items():
-                    if type(v) in unsupported:
-                        print "Object {} contains unpickleable attribute \"{}\" {} ({})".format(child, k, type(v), v)
-                        raise ValueError
-
-        # generate unique ID's for all the objects (if not already assigned)
-        i = 0
-        used = set([ child.guid for child in self.getChildren() ])
-        used.add(self.guid)
-        for child in self.getChildren():
-            if child.guid: continue
-            while i in used:
-                i += 1
-            child.setGUID(i)
-            used.add(i)
-
-        testRun()
-
-        toc = {}
-        def handleWrite(obj, pickler):
-            toc[obj.guid] = fh.tell()
-
-        with open(name + "-data.temp", "w") as fh:
-            pickler = pickle.Pickler(fh, -1)
-            self.serialize(pickler, handleWrite)
-
-        os.rename(name + "-data.temp", name + "-data.save")
+        from journal import Journal
 
-        #with open(name + "-index.txt", "w") as fh:
-        #    pickler = pickle.Pickler(fh, -1)
-        #    pickler.dump(toc)
+        journal = Journal(name)
+        journal.snapshot(self)
+        return journal
 
 
 class InteractiveObject(GameObject):
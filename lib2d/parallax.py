@@ -0,0 +1,373 @@
+"""
+layers of images that scroll slower than the map, to fake depth
+
+each layer has a scroll factor: a layer with a factor of .5 moves half as
+far as the camera.  a layer can repeat, so a small image can fill any size
+of screen.  the layers are drawn from the farthest to the nearest, but the
+parts of a layer that are hidden by the solid parts of nearer layers are not
+drawn at all.
+
+    >>> layers = [ ParallaxLayer(res.loadImage("sky.png"), (.1, .1)),
+    ...            ParallaxLayer.fromMap(tmxdata, (.5, .5)) ]
+    >>> renderer = ParallaxRenderer(layers)
+    >>> renderer.center(camera.center)
+    >>> renderer.draw(surface, rect)
+
+if the map in front of the layers has holes in it, pass the rects of the
+holes to draw(), and only they are drawn.
+"""
+
+from timeit import default_timer
+import pygame
+import math
+import gfx
+
+
+
+def subtractRects(rects, covers):
+    """
+    return a list of rects that cover the parts of rects that are not
+    covered by any of the covers
+    """
+
+    for c in covers:
+        out = []
+        for r in rects:
+            if not r.colliderect(c):
+                out.append(r)
+                continue
+
+            top = max(r.top, c.top)
+            bottom = min(r.bottom, c.bottom)
+            if c.top > r.top:
+                out.append(pygame.Rect(r.left, r.top, r.width, c.top - r.top))
+            if c.bottom < r.bottom:
+                out.append(pygame.Rect(r.left, c.bottom,
+                                       r.width, r.bottom - c.bottom))
+            if c.left > r.left:
+                out.append(pygame.Rect(r.left, top,
+                                       c.left - r.left, bottom - top))
+            if c.right < r.right:
+                out.append(pygame.Rect(c.right, top,
+                                       r.right - c.right, bottom - top))
+        rects = out
+
+    return rects
+
+
+
+class ParallaxLayer(object):
+    """
+    an image that scrolls at factor times the speed of the camera
+
+    the parts of the image with no clear pixels are found when the layer is
+    made, in blocks of cellSize pixels, so the layers behind them can be
+    skipped.
+
+    stats counts the frames that the layer was drawn, the frames that it
+    didn't need to be drawn again, the frames that it was hidden by nearer
+    layers, and the time spent drawing it, in seconds.
+    """
+
+    cellSize = 16
+
+    def __init__(self, image, factor=(.5, .5), repeat=True, name=None):
+        self.image = image
+        self.factor = factor
+        self.repeat = repeat
+        self.name = name
+        self.findOpaqueRects()
+        self.stats = dict(drawn=0, skipped=0, culled=0, time=0.0)
+
+
+    def __repr__(self):
+        return "<ParallaxLayer: \"{0}\">".format(self.name)
+
+
+    @classmethod
+    def fromMap(cls, tmxdata, factor=(.5, .5), repeat=True, name=None,
+                background=None):
+        """
+        make a layer from the visible tile layers of a map.  if a background
+        color is given, the tiles are drawn over it, like a tilemap renderer
+        draws them, and the layer is opaque.
+        """
+
+        tw = tmxdata.tilewidth
+        th = tmxdata.tileheight
+        size = (tmxdata.width * tw, tmxdata.height * th)
+        if background is None:
+            image = pygame.Surface(size, pygame.SRCALPHA, 32)
+            image.fill((0, 0, 0, 0))
+        else:
+            image = pygame.Surface(size)
+            image.fill(background)
+
+        for l in xrange(len(tmxdata.visibleTileLayers)):
+            for y in xrange(tmxdata.height):
+                for x in xrange(tmxdata.width):
+                    tile = tmxdata.getTileImage(x, y, l)
+                    if tile:
+                        image.blit(tile, (x * tw, y * th))
+
+        # opaque surfaces are much quicker to blit
+        if background is None:
+            if pygame.mask.from_surface(image, 254).count() == size[0]*size[1]:
+                opaque = pygame.Surface(size)
+                opaque.blit(image, (0, 0))
+                image = opaque
+            else:
+                image = image.convert_alpha()
+
+        return cls(image, factor, repeat, name)
+
+
+    def findOpaqueRects(self):
+        """
+        find the blocks of the image that have no clear pixels
+        """
+
+        image = self.image
+        w, h = image.get_size()
+
+        if not image.get_masks()[3] and image.get_colorkey() is None:
+            self.opaque = True
+            self.opaqueRects = [ image.get_rect() ]
+            return
+
+        mask = pygame.mask.from_surface(image, 254)
+        self.opaque = mask.count() == w * h
+        if self.opaque:
+            self.opaqueRects = [ image.get_rect() ]
+            return
+
+        # runs of solid cells in each row, joined with the same runs in the
+        # rows below them
+        size = self.cellSize
+        cells = {}
+        rects = []
+        last = {}
+        for y in xrange(0, h, size):
+            ch = min(size, h - y)
+            runs = {}
+            start = None
+            for x in xrange(0, w + size, size):
+                cw = min(size, w - x)
+                solid = False
+                if cw > 0:
+                    cell = cells.get((cw, ch))
+                    if cell is None:
+                        cell = pygame.mask.Mask((cw, ch))
+                        cell.fill()
+                        cells[(cw, ch)] = cell
+                    solid = mask.overlap_area(cell, (x, y)) == cw * ch
+
+                if solid and start is None:
+                    start = x
+                elif not solid and start is not None:
+                    r = last.pop((start, x), None)
+                    if r is None:
+                        r = pygame.Rect(start, y, min(x, w) - start, 0)
+                        rects.append(r)
+                    r.height += ch
+                    runs[(start, x)] = r
+                    start = None
+            last = runs
+
+        self.opaqueRects = rects
+
+
+    def offset(self, (x, y), (w, h)):
+        """
+        return the pixel of the image that is at the top-left of a screen of
+        size w, h that is centered on x, y of the camera
+        """
+
+        fx, fy = self.factor
+        return (int(math.floor(x * fx - w / 2)),
+                int(math.floor(y * fy - h / 2)))
+
+
+    def copies(self, (ox, oy), bounds):
+        """
+        return the top-left of each copy of the image that touches the bounds
+        """
+
+        iw, ih = self.image.get_size()
+        if not self.repeat:
+            return [ (-ox, -oy) ]
+
+        x0 = bounds.left - (bounds.left + ox) % iw
+        y0 = bounds.top - (bounds.top + oy) % ih
+        return [ (x, y) for y in xrange(y0, bounds.bottom, ih)
+                        for x in xrange(x0, bounds.right, iw) ]
+
+
+    def covers(self, offset, bounds):
+        """
+        return the rects of the bounds that the layer hides completely
+        """
+
+        if self.opaque and self.repeat:
+            return [ bounds ]
+
+        rects = []
+        for x, y in self.copies(offset, bounds):
+            for r in self.opaqueRects:
+                r = bounds.clip(r.move(x, y))
+                if r:
+                    rects.append(r)
+
+        return rects
+
+
+    def draw(self, surface, offset, areas):
+        """
+        draw the parts of the layer that are in the areas of the surface
+        """
+
+        image = self.image
+        blit = surface.blit
+        copies = self.copies
+        w, h = image.get_size()
+
+        start = default_timer()
+        for area in areas:
+            for x, y in copies(offset, area):
+                r = area.clip((x, y, w, h))
+                if r:
+                    blit(image, r, r.move(-x, -y))
+
+        self.stats["time"] += default_timer() - start
+        self.stats["drawn"] += 1
+
+
+
+class ParallaxRenderer(object):
+    """
+    draws parallax layers, listed from the farthest to the nearest
+
+    when more than one layer can be seen, they are drawn onto a buffer that
+    is only drawn again when one of the layers moves by a pixel, and the
+    areas are copied from it.  if only one layer can be seen, it is drawn
+    straight onto the areas, since that is as quick as copying them.
+    """
+
+    def __init__(self, layers):
+        self.layers = layers
+        self.position = (0, 0)
+        self.buffer = None
+
+        # what the last draw() looked like, to know when it has to change
+        self.lastDraw = None
+        self.lastAreas = []
+        self.plan = []
+
+
+    def center(self, (x, y)):
+        """
+        center the layers on a pixel of the camera
+        """
+
+        self.position = (x, y)
+
+
+    def update(self, time=None):
+        pass
+
+
+    def timings(self):
+        """
+        return a list of the name of each layer, the frames it was drawn,
+        skipped and hidden, and the average time to draw it, in ms
+        """
+
+        timings = []
+        for layer in self.layers:
+            stats = layer.stats
+            average = 0.0
+            if stats["drawn"]:
+                average = stats["time"] / stats["drawn"] * 1000.0
+            timings.append((layer.name, stats["drawn"], stats["skipped"],
+                            stats["culled"], average))
+
+        return timings
+
+
+    def makePlan(self, offsets, bounds):
+        """
+        return a list of (layer, offset, areas) for the layers that can be
+        seen, with the areas of the bounds that each one shows
+        """
+
+        plan = []
+        areas = [ bounds ]
+        for layer, offset in reversed(zip(self.layers, offsets)):
+            if areas:
+                plan.append((layer, offset, areas))
+                areas = subtractRects(areas, layer.covers(offset, bounds))
+
+        plan.reverse()
+        return plan
+
+
+    def draw(self, surface, rect, areas=None):
+        """
+        draw the layers onto the rect of the surface.  if a list of areas of
+        the surface is given, only they are drawn.
+
+        returns a list of the rects of the surface that are different from
+        the last time that the layers were drawn on it.
+        """
+
+        rect = pygame.Rect(rect)
+        if areas is None:
+            areas = [ rect ]
+
+        offsets = [ layer.offset(self.position, rect.size)
+                    for layer in self.layers ]
+
+        drawn = (surface, tuple(rect), offsets)
+        moved = drawn != self.lastDraw
+        if moved:
+            self.plan = self.makePlan(offsets, pygame.Rect((0, 0), rect.size))
+
+        lastAreas = self.lastAreas
+        self.lastDraw, self.lastAreas = drawn, areas
+
+        if len(self.plan) < len(self.layers):
+            for layer in self.layers[:len(self.layers) - len(self.plan)]:
+                layer.stats["culled"] += 1
+
+        # one layer is drawn straight onto the surface.  holes that touch are
+        # joined, so there are fewer blits.  a blit costs about the same for
+        # each pixel, so holes that cover most of the rect are still cheaper
+        # to draw than all of it.
+        if len(self.plan) == 1:
+            layer, (ox, oy), parts = self.plan[0]
+            parts = [ r.move(rect.topleft) for r in parts ]
+            holes = gfx.merge_rects([ a.clip(p) for a in areas for p in parts ],
+                                    rect, 1.0)
+            if holes is None:
+                holes = parts
+            layer.draw(surface, (ox - rect.left, oy - rect.top), holes)
+
+        # more are drawn onto the buffer, when one of them moves
+        elif self.plan:
+            if self.buffer is None or self.buffer.get_size() != rect.size:
+                self.buffer = pygame.Surface(rect.size, 0, surface)
+                moved = True
+
+            if moved:
+                for layer, offset, parts in self.plan:
+                    layer.draw(self.buffer, offset, parts)
+            else:
+                for layer, offset, parts in self.plan:
+                    layer.stats["skipped"] += 1
+
+            for r in areas:
+                surface.blit(self.buffer, r, r.move(-rect.left, -rect.top))
+
+        if moved or areas != lastAreas:
+            return areas + lastAreas
+        return []
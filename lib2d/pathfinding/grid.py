@@ -0,0 +1,311 @@
+"""
+pathfinding on a grid of tiles
+
+the cost of entering each tile is worked out once, from the control layer of
+the map, and kept in a flat list with a border of walls around it, so a tile
+is one index and its neighbors are the index plus an offset.  the open and
+closed sets are flat lists too; instead of clearing them, each search has a
+number, and a tile is only open or closed if it was marked with the number
+of the current search.
+
+searches go from both ends at once, and can move in 8 directions; the
+estimates of the distance left are octile distances.  moving diagonally
+past the corner of a wall is not allowed.  the paths that were found last
+are kept until the map is changed:
+
+    >>> finder = GridPathfinder(costGrid(tmxdata))
+    >>> finder.findPath((2, 20), (60, 4))
+    [(60, 4), (59, 5), ..., (2, 20)]
+    >>> finder.setCost((10, 18), WALL)
+"""
+
+from heapq import heappush, heappop
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+WALL = float("inf")
+SQRT2 = 2 ** .5
+
+
+
+def tileCost(tmxdata, gid, solid=1):
+    """
+    return the cost of entering a tile of the control layer.  the solid tile
+    is a wall.  other tiles cost 1, or their "cost" property.
+    """
+
+    if gid in [ g for g, flags in tmxdata.mapGID(solid) or () ]:
+        return WALL
+
+    try:
+        return float(tmxdata.tile_properties[gid]["cost"])
+    except KeyError:
+        return 1.0
+
+
+def costGrid(tmxdata, layer="Control", solid=1):
+    """
+    return the cost of entering each tile of a map, as rows of costs
+    """
+
+    data = tmxdata.getTileLayerByName(layer).data
+
+    if numpy is not None:
+        data = numpy.asarray(data)
+        costs = numpy.ones(data.shape)
+        for gid in numpy.unique(data):
+            cost = tileCost(tmxdata, int(gid), solid)
+            if cost != 1.0:
+                costs[data == gid] = cost
+        return costs
+
+    costs = {}
+    return [ [ costs.setdefault(gid, tileCost(tmxdata, gid, solid))
+               for gid in row ] for row in data ]
+
+
+
+class GridPathfinder(object):
+    """
+    finds the cheapest paths between tiles of a grid
+
+    costs is rows of the cost of entering each tile; WALL can't be entered.
+    the last cacheSize paths that were found are kept.
+    """
+
+    cacheSize = 64
+
+    def __init__(self, costs, cacheSize=None):
+        if cacheSize is not None:
+            self.cacheSize = cacheSize
+
+        self.height = len(costs)
+        self.width = len(costs[0])
+        w = self.width + 2
+
+        if numpy is not None:
+            padded = numpy.empty((self.height + 2, w))
+            padded.fill(WALL)
+            padded[1:-1, 1:-1] = costs
+            self.cost = padded.ravel().tolist()
+            finite = padded[numpy.isfinite(padded)]
+            self.minCost = float(finite.min()) if finite.size else 1.0
+        else:
+            self.cost = [WALL] * w
+            for row in costs:
+                self.cost.append(WALL)
+                self.cost.extend(float(c) for c in row)
+                self.cost.append(WALL)
+            self.cost.extend([WALL] * w)
+            finite = [ c for c in self.cost if c != WALL ]
+            self.minCost = min(finite) if finite else 1.0
+
+        # offset to the neighbor, distance, and the two tiles that a
+        # diagonal move passes
+        self.neighbors = [ (-w, 1.0, 0, 0), (w, 1.0, 0, 0),
+                           (-1, 1.0, 0, 0), (1, 1.0, 0, 0),
+                           (-w - 1, SQRT2, -w, -1), (-w + 1, SQRT2, -w, 1),
+                           (w - 1, SQRT2, w, -1), (w + 1, SQRT2, w, 1) ]
+
+        size = len(self.cost)
+        self.searches = 0           # number of the last search
+        self.gForward = [0.0] * size
+        self.gBackward = [0.0] * size
+        self.parentForward = [0] * size
+        self.parentBackward = [0] * size
+        self.seenForward = [0] * size
+        self.seenBackward = [0] * size
+        self.closedForward = [0] * size
+        self.closedBackward = [0] * size
+        self.cache = OrderedDict()
+
+
+    def index(self, (x, y)):
+        return (y + 1) * (self.width + 2) + x + 1
+
+
+    def position(self, i):
+        y, x = divmod(i, self.width + 2)
+        return x - 1, y - 1
+
+
+    def inside(self, (x, y)):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+
+    def getCost(self, (x, y)):
+        return self.cost[self.index((x, y))]
+
+
+    def setCost(self, (x, y), cost):
+        """
+        change the cost of a tile.  the paths that were kept are forgotten.
+        """
+
+        self.cost[self.index((x, y))] = float(cost)
+        if cost != WALL and cost < self.minCost:
+            self.minCost = float(cost)
+        self.invalidate()
+
+
+    def invalidate(self):
+        self.cache.clear()
+
+
+    def findPath(self, start, goal):
+        """
+        return a list of the tiles from the goal back to the start, so the
+        next tile to move to is at the end.  returns [] if there is no path.
+        """
+
+        key = (tuple(start), tuple(goal))
+        try:
+            path = self.cache.pop(key)
+        except KeyError:
+            path = self.bidirectional(*key)
+            if len(self.cache) >= self.cacheSize:
+                self.cache.popitem(last=False)
+
+        self.cache[key] = path
+        return list(path)
+
+
+    def bidirectional(self, start, goal):
+        """
+        search from both ends at once.  each tile has a potential: half of
+        the estimate to the goal less half of the estimate to the start.
+        the search forward sorts tiles by the cost so far plus the
+        potential, and the search backward by the cost so far less it, so
+        the estimates of both searches agree, and the search can stop when
+        the two smallest sums are more than the cheapest path found.
+        """
+
+        if not (self.inside(start) and self.inside(goal)):
+            return ()
+
+        cost = self.cost
+        s = self.index(start)
+        t = self.index(goal)
+        if cost[s] == WALL or cost[t] == WALL:
+            return ()
+        if s == t:
+            return (start,)
+
+        self.searches += 1
+        search = self.searches
+        w = self.width + 2
+        m = self.minCost * .5
+        k = SQRT2 - 1.0
+        neighbors = self.neighbors
+        sy, sx = divmod(s, w)
+        ty, tx = divmod(t, w)
+
+        gF = self.gForward
+        gB = self.gBackward
+        parentF = self.parentForward
+        parentB = self.parentBackward
+        seenF = self.seenForward
+        seenB = self.seenBackward
+        closedF = self.closedForward
+        closedB = self.closedBackward
+
+        gF[s] = 0.0
+        gB[t] = 0.0
+        seenF[s] = search
+        seenB[t] = search
+        parentF[s] = -1
+        parentB[t] = -1
+
+        # the heaps hold the sum, the cost so far as a negative number, so
+        # of two equal sums the one further along is first, and the tile
+        openF = [(0.0, 0.0, s)]
+        openB = [(0.0, 0.0, t)]
+        best = WALL
+        meet = -1
+
+        while openF and openB:
+
+            # no path through the tiles left to search can be cheaper
+            if openF[0][0] + openB[0][0] >= best:
+                break
+
+            # search forward from the start, or backward from the goal.
+            # moving from i to j backward is moving from j to i on the path,
+            # so it costs the cost of i.
+            forward = len(openF) <= len(openB)
+            if forward:
+                f, g, i = heappop(openF)
+                g = -g
+                if closedF[i] == search or g > gF[i]:
+                    continue
+                closedF[i] = search
+                heap, gs, parents, seen, gOther, seenOther, sign = \
+                    openF, gF, parentF, seenF, gB, seenB, 1.0
+            else:
+                f, g, i = heappop(openB)
+                g = -g
+                if closedB[i] == search or g > gB[i]:
+                    continue
+                closedB[i] = search
+                heap, gs, parents, seen, gOther, seenOther, sign = \
+                    openB, gB, parentB, seenB, gF, seenF, -1.0
+                c = cost[i]
+
+            for offset, d, a, b in neighbors:
+                j = i + offset
+                if forward:
+                    c = cost[j]
+                    if c == WALL:
+                        continue
+                elif cost[j] == WALL:
+                    continue
+                if a and (cost[i + a] == WALL or cost[i + b] == WALL):
+                    continue
+
+                ng = g + c * d
+                if seen[j] == search:
+                    if ng >= gs[j]:
+                        continue
+                else:
+                    seen[j] = search
+
+                gs[j] = ng
+                parents[j] = i
+
+                # the octile distances to the goal and to the start
+                y, x = divmod(j, w)
+                dx = abs(x - tx)
+                dy = abs(y - ty)
+                p = dy + k * dx if dx < dy else dx + k * dy
+                dx = abs(x - sx)
+                dy = abs(y - sy)
+                p -= dy + k * dx if dx < dy else dx + k * dy
+
+                heappush(heap, (ng + sign * m * p, -ng, j))
+
+                if seenOther[j] == search and ng + gOther[j] < best:
+                    best = ng + gOther[j]
+                    meet = j
+
+        if meet < 0:
+            return ()
+
+        # the half from the meeting tile to the goal, then back to the start
+        path = []
+        i = meet
+        while i >= 0:
+            path.append(i)
+            i = parentB[i]
+        path.reverse()
+
+        i = parentF[meet]
+        while i >= 0:
+            path.append(i)
+            i = parentF[i]
+
+        return tuple(self.position(i) for i in path)
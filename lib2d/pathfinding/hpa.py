@@ -0,0 +1,419 @@
+"""
+pathfinding on large maps, through clusters of tiles
+
+the map is cut into square clusters.  where two clusters touch, each run of
+open tiles along the border gets an entrance: a pair of tiles, one on each
+side, or two pairs at the ends of a long run.  when the map is loaded, the
+cost of the paths between the entrances of each cluster is found by
+searching inside the cluster, so a long path can be found on the graph of
+entrances instead of on every tile.
+
+only the first few steps of the path are made into tiles; the rest of it is
+the entrances that it goes through.  things that follow a path ask for it
+again before they get that far, and by then the map may have changed:
+
+    >>> finder = ClusterPathfinder(GridPathfinder(costGrid(tmxdata)))
+    >>> finder.findPath((2, 20), (600, 4))
+    [(600, 4), (576, 7), (559, 15), ..., (3, 19), (2, 20)]
+
+when a tile changes, only the clusters that it is in or on the border of are
+searched again:
+
+    >>> finder.setCost((10, 18), WALL)
+"""
+
+from grid import GridPathfinder, WALL, SQRT2
+from heapq import heappush, heappop
+from collections import OrderedDict
+
+
+
+class ClusterPathfinder(object):
+    """
+    finds paths between tiles of a grid through clusters of tiles
+
+    grid is the GridPathfinder of the map; paths inside one cluster are
+    found by it.  the first refine steps between entrances are made into
+    tiles.  the last cacheSize paths that were found are kept.
+    """
+
+    clusterSize = 16
+    refine = 3
+    cacheSize = 64
+
+    def __init__(self, grid, clusterSize=None, refine=None, cacheSize=None):
+        if clusterSize is not None:
+            self.clusterSize = clusterSize
+        if refine is not None:
+            self.refine = refine
+        if cacheSize is not None:
+            self.cacheSize = cacheSize
+
+        self.grid = grid
+        size = self.clusterSize
+        self.columns = (grid.width + size - 1) // size
+        self.rows = (grid.height + size - 1) // size
+
+        # the cluster of each tile of the grid, or -1 for the border
+        w = grid.width + 2
+        self.clusterOf = [-1] * len(grid.cost)
+        for y in xrange(grid.height):
+            row = (y // size) * self.columns
+            i = (y + 1) * w + 1
+            for x in xrange(grid.width):
+                self.clusterOf[i + x] = row + x // size
+
+        self.borders = {}       # (cluster, "h" or "v"): [(i, j), ...]
+        self.entrances = {}     # cluster: [i, ...]
+        self.inter = {}         # i: {j: cost} across borders
+        self.intra = {}         # cluster: {i: {j: cost}} inside clusters
+        self.segments = {}      # cluster: {(i, j): tiles from i to j}
+        self.cache = OrderedDict()
+
+        for c in xrange(self.columns * self.rows):
+            self.findEntrances(c, "h")
+            self.findEntrances(c, "v")
+
+        for c in xrange(self.columns * self.rows):
+            self.buildCluster(c)
+
+
+    def bounds(self, c):
+        """
+        return the tiles that a cluster covers as (left, top, right, bottom)
+        """
+
+        size = self.clusterSize
+        y, x = divmod(c, self.columns)
+        return (x * size, y * size, min(self.grid.width, (x + 1) * size),
+                min(self.grid.height, (y + 1) * size))
+
+
+    def findEntrances(self, c, side):
+        """
+        find the entrances on the right ("h") or bottom ("v") border of a
+        cluster, replacing the ones that were there
+        """
+
+        grid = self.grid
+        cost = grid.cost
+        inter = self.inter
+
+        for i, j in self.borders.pop((c, side), ()):
+            del inter[i][j]
+            del inter[j][i]
+            if not inter[i]: del inter[i]
+            if not inter[j]: del inter[j]
+
+        left, top, right, bottom = self.bounds(c)
+        if side == "h":
+            if right == grid.width: return
+            tiles = [ (grid.index((right - 1, y)), grid.index((right, y)))
+                      for y in xrange(top, bottom) ]
+        else:
+            if bottom == grid.height: return
+            tiles = [ (grid.index((x, bottom - 1)), grid.index((x, bottom)))
+                      for x in xrange(left, right) ]
+
+        # runs of tiles that are open on both sides of the border
+        runs = []
+        run = []
+        for i, j in tiles:
+            if cost[i] == WALL or cost[j] == WALL:
+                if run: runs.append(run)
+                run = []
+            else:
+                run.append((i, j))
+        if run: runs.append(run)
+
+        pairs = []
+        for run in runs:
+            if len(run) < 6:
+                pairs.append(run[len(run) // 2])
+            else:
+                pairs.append(run[0])
+                pairs.append(run[-1])
+
+        for i, j in pairs:
+            inter.setdefault(i, {})[j] = cost[j]
+            inter.setdefault(j, {})[i] = cost[i]
+
+        self.borders[(c, side)] = pairs
+
+
+    def buildCluster(self, c):
+        """
+        find the cost of the paths between the entrances of a cluster
+        """
+
+        # the first tile of a pair is left of or above the border
+        borders = self.borders
+        entrances = set()
+        for key, side in (((c, "h"), 0), ((c, "v"), 0),
+                          ((c - 1, "h"), 1), ((c - self.columns, "v"), 1)):
+            entrances.update(pair[side] for pair in borders.get(key, ()))
+
+        entrances = list(entrances)
+        edges = {}
+        for i in entrances:
+            edges[i], parents = self.clusterSearch(i, c, entrances)
+            del edges[i][i]
+
+        self.entrances[c] = entrances
+        self.intra[c] = edges
+        self.segments[c] = {}
+
+
+    def clusterSearch(self, source, c, targets, backward=False):
+        """
+        search from a tile through its cluster, without leaving it, until the
+        targets are found.  returns the cost of the path to each target that
+        can be reached, and the tile that each tile was reached from.
+
+        backward is the cost of the paths from the targets to the source.
+        the parents are the grid's flat list, and are only good until the
+        next search in the same direction.
+        """
+
+        grid = self.grid
+        cost = grid.cost
+        clusterOf = self.clusterOf
+        neighbors = grid.neighbors
+        grid.searches += 1
+        search = grid.searches
+
+        if backward:
+            g, parents = grid.gBackward, grid.parentBackward
+            seen, closed = grid.seenBackward, grid.closedBackward
+        else:
+            g, parents = grid.gForward, grid.parentForward
+            seen, closed = grid.seenForward, grid.closedForward
+
+        left = len(targets)
+        for i in targets:
+            closed[i] = -search     # a target that hasn't been reached
+        g[source] = 0.0
+        parents[source] = -1
+        seen[source] = search
+        heap = [(0.0, source)]
+
+        while heap:
+            gi, i = heappop(heap)
+            if closed[i] == search: continue
+            if closed[i] == -search:
+                left -= 1
+                if not left:
+                    closed[i] = search
+                    break
+            closed[i] = search
+
+            ci = cost[i]
+            for offset, d, a, b in neighbors:
+                j = i + offset
+                if clusterOf[j] != c: continue
+                cj = cost[j]
+                if cj == WALL: continue
+                if a and (cost[i + a] == WALL or cost[i + b] == WALL):
+                    continue
+
+                ng = gi + (ci if backward else cj) * d
+                if seen[j] != search or ng < g[j]:
+                    g[j] = ng
+                    parents[j] = i
+                    seen[j] = search
+                    heappush(heap, (ng, j))
+
+        costs = dict((i, g[i]) for i in targets if closed[i] == search)
+        return costs, parents
+
+
+    def segment(self, i, j):
+        """
+        return the tiles of the path from i to j, two tiles of a cluster,
+        not including i
+        """
+
+        c = self.clusterOf[i]
+        if c != self.clusterOf[j]:
+            return [j]
+
+        segments = self.segments[c]
+        try:
+            return segments[(i, j)]
+        except KeyError:
+            pass
+
+        costs, parents = self.clusterSearch(i, c, (j,))
+        path = []
+        node = j
+        while node != i:
+            path.append(node)
+            node = parents[node]
+        path.reverse()
+
+        segments[(i, j)] = path
+        return path
+
+
+    def getCost(self, (x, y)):
+        return self.grid.getCost((x, y))
+
+
+    def setCost(self, (x, y), cost):
+        """
+        change the cost of a tile.  the clusters that it is in, or on the
+        border of, are searched again, and the paths that were kept are
+        forgotten.
+        """
+
+        self.grid.setCost((x, y), cost)
+
+        c = self.clusterOf[self.grid.index((x, y))]
+        left, top, right, bottom = self.bounds(c)
+        affected = set([c])
+        if x == left and x > 0:
+            self.findEntrances(c - 1, "h")
+            affected.add(c - 1)
+        if x == right - 1 and right < self.grid.width:
+            self.findEntrances(c, "h")
+            affected.add(c + 1)
+        if y == top and y > 0:
+            self.findEntrances(c - self.columns, "v")
+            affected.add(c - self.columns)
+        if y == bottom - 1 and bottom < self.grid.height:
+            self.findEntrances(c, "v")
+            affected.add(c + self.columns)
+
+        for c in affected:
+            self.buildCluster(c)
+
+        self.invalidate()
+
+
+    def invalidate(self):
+        self.cache.clear()
+
+
+    def findPath(self, start, goal):
+        """
+        return a list of the tiles from the goal back to the start, so the
+        next tile to move to is at the end.  past the first steps, the list
+        only has the entrances that the path goes through.  returns [] if
+        there is no path.
+        """
+
+        key = (tuple(start), tuple(goal))
+        try:
+            path = self.cache.pop(key)
+        except KeyError:
+            path = self.search(*key)
+            if len(self.cache) >= self.cacheSize:
+                self.cache.popitem(last=False)
+
+        self.cache[key] = path
+        return list(path)
+
+
+    def search(self, start, goal):
+        grid = self.grid
+        if not (grid.inside(start) and grid.inside(goal)):
+            return ()
+
+        s = grid.index(start)
+        t = grid.index(goal)
+        if grid.cost[s] == WALL or grid.cost[t] == WALL:
+            return ()
+
+        # paths inside one cluster are short enough to search on the grid
+        cs = self.clusterOf[s]
+        ct = self.clusterOf[t]
+        if cs == ct:
+            return grid.bidirectional(start, goal)
+
+        # join the start and the goal to the entrances of their clusters
+        startEdges, startParents = self.clusterSearch(s, cs,
+                                                      self.entrances[cs])
+        goalEdges, goalParents = self.clusterSearch(t, ct, self.entrances[ct],
+                                                    True)
+
+        nodes = self.abstractSearch(s, t, startEdges, goalEdges)
+        if not nodes:
+            return ()
+
+        # tiles for the first steps, then the entrances.  the step from the
+        # start is first, before segment() searches forward again.
+        path = [s]
+        steps = min(self.refine, len(nodes) - 1)
+        for i, j in zip(nodes, nodes[1:steps + 1]):
+            if i == s and self.clusterOf[j] == cs:
+                tiles = []
+                while j != s:
+                    tiles.append(j)
+                    j = startParents[j]
+                tiles.reverse()
+            elif j == t and self.clusterOf[i] == ct:
+                tiles = []
+                while i != t:
+                    i = goalParents[i]
+                    tiles.append(i)
+            else:
+                tiles = self.segment(i, j)
+            path.extend(tiles)
+
+        path.extend(nodes[steps + 1:])
+        path.reverse()
+        return tuple(grid.position(i) for i in path)
+
+
+    def abstractSearch(self, s, t, startEdges, goalEdges):
+        """
+        return the entrances on the cheapest path from s to t, with s and t
+        """
+
+        grid = self.grid
+        w = grid.width + 2
+        m = grid.minCost
+        k = SQRT2 - 1.0
+        ty, tx = divmod(t, w)
+        clusterOf = self.clusterOf
+        intra = self.intra
+        inter = self.inter
+
+        g = {s: 0.0}
+        parents = {s: -1}
+        closed = set()
+        heap = [(0.0, 0.0, s)]
+
+        while heap:
+            f, gi, i = heappop(heap)
+            if i == t: break
+            if i in closed: continue
+            closed.add(i)
+
+            if i == s:
+                edges = [startEdges, inter.get(i, ())]
+            else:
+                edges = [intra[clusterOf[i]].get(i, ()), inter.get(i, ())]
+                if i in goalEdges:
+                    edges.append({t: goalEdges[i]})
+
+            for e in edges:
+                for j in e:
+                    ng = gi + e[j]
+                    if ng < g.get(j, WALL):
+                        g[j] = ng
+                        parents[j] = i
+                        y, x = divmod(j, w)
+                        dx = abs(x - tx)
+                        dy = abs(y - ty)
+                        h = dy + k * dx if dx < dy else dx + k * dy
+                        heappush(heap, (ng + h * m, ng, j))
+        else:
+            return []
+
+        nodes = []
+        while t >= 0:
+            nodes.append(t)
+            t = parents[t]
+        nodes.reverse()
+        return nodes
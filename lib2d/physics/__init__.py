@@ -1,2 +1,3 @@
 from physicsbody import *
 from physicsgroup import *
+from broadphase import *
@@ -0,0 +1,185 @@
+"""
+Broadphase collision structures for the PhysicsGroup.
+
+A broadphase answers the question "which bodies might be touching this bbox?"
+quickly, so the group only has to run the exact bbox test on a handful of
+bodies instead of all of them.  Any object with the same methods as
+BruteForce can be passed to a PhysicsGroup.
+
+The broadphase must be told when a body moves by calling update().  Only the
+body is passed; the broadphase reads the position from body.bbox.
+"""
+
+from lib2d.bbox import intersect
+from math import floor
+
+
+
+class BruteForce(object):
+    """
+    Checks every body.  This is how the PhysicsGroup used to work.
+
+    Useful as a reference for testing and benchmarking, or when there are
+    only a few bodies in the group.
+    """
+
+    def __init__(self):
+        self.bodies = []
+
+
+    def __len__(self):
+        return len(self.bodies)
+
+
+    def add(self, body):
+        self.bodies.append(body)
+
+
+    def remove(self, body):
+        self.bodies.remove(body)
+
+
+    def update(self, body):
+        pass
+
+
+    def query(self, bbox, skip=None):
+        """
+        return a list of bodies that may collide with the bbox
+        """
+
+        return [ b for b in self.bodies if b is not skip ]
+
+
+    def hit(self, bbox, skip=None):
+        """
+        return a list of bodies that collide with the bbox
+        """
+
+        return [ b for b in self.bodies
+                 if b is not skip and intersect(bbox, b.bbox) ]
+
+
+
+class SpatialHash(object):
+    """
+    Uniform grid that stores bodies in each 3d cell that their bbox touches.
+
+    Moving a body only costs something when it crosses into a new cell, so
+    this is cheap to keep current while the simulation runs.
+
+    The cellsize should be about twice as large as a typical body.  If it is
+    much smaller, each body will be stored in many cells; if it is much
+    larger, each cell will contain many bodies.
+    """
+
+    def __init__(self, cellsize=32):
+        self.cellsize = float(cellsize)
+        self.cells = {}         # cell key: list of bodies
+        self.keys = {}          # body: tuple of cell keys
+
+
+    def __len__(self):
+        return len(self.keys)
+
+
+    def cellsFor(self, bbox):
+        """
+        return a tuple of the cell keys that the bbox touches
+        """
+
+        cs = self.cellsize
+        x0 = int(floor(bbox[0] / cs))
+        y0 = int(floor(bbox[1] / cs))
+        z0 = int(floor(bbox[2] / cs))
+        x1 = int(floor((bbox[0] + bbox[3]) / cs))
+        y1 = int(floor((bbox[1] + bbox[4]) / cs))
+        z1 = int(floor((bbox[2] + bbox[5]) / cs))
+
+        # most bodies will fit in one cell.  avoid the loops if so.
+        if x0 == x1 and y0 == y1 and z0 == z1:
+            return ((x0, y0, z0),)
+
+        return tuple((x, y, z) for x in xrange(x0, x1 + 1)
+                               for y in xrange(y0, y1 + 1)
+                               for z in xrange(z0, z1 + 1))
+
+
+    def add(self, body):
+        keys = self.cellsFor(body.bbox)
+        self.keys[body] = keys
+        cells = self.cells
+        for key in keys:
+            try:
+                cells[key].append(body)
+            except KeyError:
+                cells[key] = [body]
+
+
+    def remove(self, body):
+        cells = self.cells
+        for key in self.keys.pop(body):
+            cell = cells[key]
+            cell.remove(body)
+            if not cell:
+                del cells[key]
+
+
+    def update(self, body):
+        """
+        call after the body has moved
+        """
+
+        keys = self.cellsFor(body.bbox)
+        if keys == self.keys[body]:
+            return
+
+        self.remove(body)
+        self.keys[body] = keys
+        cells = self.cells
+        for key in keys:
+            try:
+                cells[key].append(body)
+            except KeyError:
+                cells[key] = [body]
+
+
+    def query(self, bbox, skip=None):
+        """
+        return a list of bodies that may collide with the bbox
+
+        the bodies are returned in the order that they were found, so the
+        results are stable from one run to the next.
+        """
+
+        cells = self.cells
+        keys = self.cellsFor(bbox)
+
+        if len(keys) == 1:
+            try:
+                cell = cells[keys[0]]
+            except KeyError:
+                return []
+            return [ b for b in cell if b is not skip ]
+
+        found = []
+        seen = set()
+        for key in keys:
+            try:
+                cell = cells[key]
+            except KeyError:
+                continue
+            for body in cell:
+                if body is skip or body in seen: continue
+                seen.add(body)
+                found.append(body)
+
+        return found
+
+
+    def hit(self, bbox, skip=None):
+        """
+        return a list of bodies that collide with the bbox
+        """
+
+        return [ b for b in self.query(bbox, skip) if intersect(bbox, b.bbox) ]
@@ -1,6 +1,8 @@
 from lib2d import res, quadtree, vec, context, bbox
 from lib2d.utils import *
+from lib2d.bbox import BBox, intersect
 
+from broadphase import SpatialHash
 import euclid, physicsbody
 import pygame, itertools
 
@@ -48,6 +50,11 @@ class PhysicsGroup(context.Context):
     static bodies are simply called 'geometry' and handled slightly different
     from dynamic bodies.
 
+    bodies that come to rest are put to sleep and are not simulated.  bodies
+    that touch each other are grouped into 'islands' when they sleep.  if a
+    moving body hits a sleeping one, or wakeBody() is called, the whole
+    island is woken up.
+
     the dimensions of your objects are important!  internally, collision
     detection against static bodies is handled by pygame rects, which cannot
     handle floats.  this means that the smallest body in the game must be at
@@ -58,6 +65,10 @@ class PhysicsGroup(context.Context):
         using the platformer mixin, this will be the zy plane
         the bboxes passed to geometry will be translated into the correct type
 
+    collisions between dynamic bodies are found with a broadphase structure.
+    by default a SpatialHash is used.  any object from the broadphase module
+    can be passed, or a custom one with the same methods.
+
     a word on the coordinate system:
         coordinates are 'right handed'
         x axis moves toward viewer
@@ -66,14 +77,22 @@ class PhysicsGroup(context.Context):
 
     """
 
-    def __init__(self, scaling, timestep, gravity, bodies, geometry, precision=2):
+    def __init__(self, scaling, timestep, gravity, bodies, geometry,
+                 precision=2, broadphase=None):
         self.scaling = scaling
         self.gravity = euclid.Vector3(0,0,gravity)
-        self.bodies = bodies
+        self.bodies = []
         self.precision = precision
-        self.sleeping = []
+        self.sleeping = set()       # bodies that will not be simulated
+        self.islands = {}           # sleeping body: bodies woken along with it
         self.staticBodies = []
-        [ self.scaleBody(b, scaling) for b in self.bodies ]
+
+        if broadphase is None:
+            broadphase = SpatialHash()
+        self.broadphase = broadphase
+        self.awake = []
+        self.pushing = set()
+        [ self.add(b) for b in bodies ]
 
         rects = []
         for bbox in geometry:
@@ -83,6 +102,7 @@ class PhysicsGroup(context.Context):
             rects.append(self.toRect(body.bbox))
 
         self.geometry = quadtree.FastQuadTree(rects)
+        self.geometryHits = []
 
         self.setTimestep(timestep)
 
@@ -91,11 +111,39 @@ class PhysicsGroup(context.Context):
         return itertools.chain(self.bodies, self.staticBodies)
 
 
+    def add(self, body):
+        """
+        add a dynamic body.  it is scaled like the bodies that the group was
+        made with, and starts awake.
+        """
+
+        self.scaleBody(body, self.scaling)
+        self.bodies.append(body)
+        self.broadphase.add(body)
+        self.awake.append(body)
+
+
+    def remove(self, body):
+        """
+        remove a dynamic body.  the bodies that were sleeping with it are
+        woken, since they may have been resting on it.
+        """
+
+        self.wakeBody(body)
+        self.bodies.remove(body)
+        self.broadphase.remove(body)
+        self.awake.remove(body)
+
+
     def update(self, time):
-        for body in (b for b in self.bodies if b not in self.sleeping):
+        resting = []
+
+        # bodies woken during this loop are appended and will be moved, too
+        for body in self.awake:
             body.acc += self.gravity_delta
             body.vel += body.acc * self.timestep
             x, y, z = body.vel
+            supported = False
 
             if not x==0:
                 if not self.moveBody(body, (x, 0, 0)):
@@ -125,16 +173,26 @@ class PhysicsGroup(context.Context):
                         body.vel.z = 0.0
  
             elif z < 0:
-                self.moveBody(body, (0, 0, z))
+                # landed on the ground or on another body
+                if not self.moveBody(body, (0, 0, z)):
+                    body.acc.z = 0.0
+                    body.vel.z = 0.0
+                    supported = True
 
             if body.bbox.z == 0:
+                supported = True
+
+            if supported:
                 body.vel.x = body.vel.x * self.ground_friction
                 body.vel.y = body.vel.y * self.ground_friction
 
-            if (round(body.vel.x, 4) ==
-                round(body.vel.y, 4) ==
-                round(body.vel.z, 1) == 0.0) and body.bbox.z == 0:
-                self.sleeping.append(body)
+            if supported and (round(body.vel.x, 4) ==
+                              round(body.vel.y, 4) ==
+                              round(body.vel.z, 1) == 0.0):
+                resting.append(body)
+
+        if resting:
+            self.sleepIslands(resting)
 
 
     def scaleBody(self, body, scale):
@@ -145,11 +203,68 @@ class PhysicsGroup(context.Context):
         return iter(self.bodies)
 
 
+    def awakeBodies(self):
+        return iter(self.awake)
+
+
+    def buildIsland(self, body):
+        """
+        return a list of bodies that are touching this one, and the bodies
+        touching those, and so on.
+        """
+
+        island = [body]
+        found = set(island)
+        hit = self.broadphase.hit
+        i = 0
+        while i < len(island):
+            x, y, z, d, w, h = island[i].bbox
+            touching = BBox((x-1, y-1, z-1, d+2, w+2, h+2))
+            for other in hit(touching, island[i]):
+                if other not in found:
+                    found.add(other)
+                    island.append(other)
+            i += 1
+
+        return island
+
+
+    def sleepIslands(self, resting):
+        """
+        put bodies to sleep.  a body will only sleep if every body it touches
+        (its island) is resting or sleeping too.
+        """
+
+        sleeping = self.sleeping
+        candidates = set(resting)
+
+        for body in resting:
+            if body in sleeping: continue
+            island = self.buildIsland(body)
+            for other in island:
+                if not (other in candidates or other in sleeping):
+                    break
+            else:
+                # any islands that were touched are merged into this one
+                for other in island:
+                    sleeping.add(other)
+                    self.islands[other] = island
+
+        self.awake = [ b for b in self.awake if b not in sleeping ]
+
+
     def wakeBody(self, body):
-        try:
-            self.sleeping.remove(body)
-        except:
-            pass
+        """
+        wake a body and every other body in its island
+        """
+
+        if body not in self.sleeping:
+            return
+
+        for other in self.islands[body]:
+            self.sleeping.discard(other)
+            del self.islands[other]
+            self.awake.append(other)
 
     
     def setTimestep(self, time):
@@ -166,30 +281,37 @@ class PhysicsGroup(context.Context):
             if body.bbox[2] < -10:
                 body.bbox[2] = -10.0
                 body.bbox.move(-x, -y, 0)
+                self.broadphase.update(body)
             else:
                 body.bbox.move(-x, -y, -z)
             return False
 
         else:
-            # test for collision with another object
-            # must do a spatial hash or oct tree or something here [later]
+            # test for collision with another object.  bodies that are already
+            # pushing cannot be pushed back, or two overlapping bodies would
+            # push each other forever.
             bbox = body.bbox
-            for other in (b for b in self.bodies if b is not body):
-                if bbox.collidebbox(other.bbox):
-                    if self.moveBody(other, (x, y, z)):
-                        return True
-                    else:
+            pushing = self.pushing
+            pushing.add(body)
+            for other in self.broadphase.query(bbox, body):
+                if intersect(bbox, other.bbox):
+                    if other in self.sleeping:
+                        self.wakeBody(other)
+                    if other in pushing or not self.moveBody(other, (x, y, z)):
+                        pushing.discard(body)
                         body.bbox.move(-x, -y, -z)
                         return False
+            pushing.discard(body)
 
+        self.broadphase.update(body)
         return True
 
 
     def testCollisionOther(self, body, bbox=None):
         if bbox is None:
             bbox = body.bbox
-        for other in (b for b in self.bodies if b is not body):
-            if bbox.collidebbox(other.bbox):
+        for other in self.broadphase.query(bbox, body):
+            if intersect(bbox, other.bbox):
                 return True
         return False
 
@@ -199,7 +321,11 @@ class PhysicsGroup(context.Context):
         # for adventure games
         if bbox[2] < 0:
             return True
-        return bool(self.geometry.hit(self.toRect(bbox)))
+        hits = self.geometry.query(self.toRect(bbox), self.geometryHits)
+        if hits:
+            del hits[:]
+            return True
+        return False
 
 
 class PlatformerPhysicsGroup(PhysicsGroup, PlatformerMixin):
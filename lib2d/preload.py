@@ -0,0 +1,292 @@
+"""
+load the files that an area needs before it is started
+
+decoding images, reading sounds and parsing maps is done by a pool of
+threads, so the screen can keep drawing while the files load.  only the
+steps that need the display (converting the surfaces) are done in the main
+thread, a little at a time, when update() is called.
+
+the results go into the caches in res, so when the area and its objects are
+loaded in the usual way, the files are already there:
+
+    >>> loader = Preloader(Manifest.fromArea(area))
+    >>> loader.start()
+    >>> while not loader.done:
+    ...     loader.update()
+    ...     draw_a_progress_bar(loader.progress)
+"""
+
+from animation import Animation
+from image import ImageTile
+import res
+
+from Queue import Queue, Empty
+from threading import Thread
+from timeit import default_timer
+import sys
+
+
+
+def mapSounds(tmxdata):
+    """
+    return a list of the sounds that the tiles of a map use
+    """
+
+    sounds = []
+    for i, layer in enumerate(tmxdata.tilelayers):
+        props = tmxdata.getTilePropertiesByLayer(i)
+        for gid, tileProp in props:
+            for key, value in tileProp.items():
+                if key[4:].lower() == "sound":
+                    sounds.append(value)
+
+    return sounds
+
+
+
+class Manifest(object):
+    """
+    list of the images, maps and sounds to load
+    """
+
+    def __init__(self):
+        self.images = {}        # key of the image: Image
+        self.maps = {}          # key of the map: (path, options)
+        self.sounds = set()
+
+
+    def __len__(self):
+        return len(self.images) + len(self.maps) + len(self.sounds)
+
+
+    @classmethod
+    def fromArea(cls, area):
+        """
+        return a manifest of the map and sounds of an area and the images of
+        the animations of everything in it
+        """
+
+        manifest = cls()
+
+        if area.mappath:
+            manifest.addMap(area.mappath, **area.mapOptions)
+
+        for filename in area.soundFiles:
+            manifest.addSound(filename)
+
+        for child in area.getChildren():
+            if isinstance(child, Animation):
+                manifest.addImage(child.image)
+            for filename in child.sounds:
+                manifest.addSound(filename)
+
+        return manifest
+
+
+    def addImage(self, image):
+        # tiles are cut from the image when they are loaded; that is cheap
+        if isinstance(image, ImageTile):
+            image = image.image
+
+        key = res.imageKey(image.filename, *image.args, **image.kwargs)
+        self.images[key] = image
+
+
+    def addMap(self, path, **kwargs):
+        self.maps[res.mapKey(path, kwargs)] = (path, kwargs)
+
+
+    def addSound(self, filename):
+        self.sounds.add(filename)
+
+
+
+class Preloader(object):
+    """
+    loads the files in a manifest with a pool of threads
+
+    each file is read in a worker thread, then finished in the main thread
+    by update().  update() will stop after timeBudget microseconds, so it can
+    be called every frame.
+
+    progress is a number from 0 to 1, and done is True when every file is
+    loaded.  if a callback is given, it is called with the number of files
+    loaded and the total after each one.  if a file cannot be loaded, the
+    error is raised by update().
+    """
+
+    def __init__(self, manifest=None, workers=2, callback=None,
+                 timeBudget=10000):
+        if manifest is None:
+            manifest = Manifest()
+
+        self.manifest = manifest
+        self.workers = workers
+        self.callback = callback
+        self.timeBudget = timeBudget
+        self.jobs = Queue()
+        self.results = Queue()
+        self.threads = []
+        self.total = 0
+        self.loaded = 0
+        self.sounds = set()
+
+
+    @property
+    def progress(self):
+        if self.total:
+            return float(self.loaded) / self.total
+        return 1.0
+
+
+    @property
+    def done(self):
+        return self.loaded == self.total
+
+
+    def start(self):
+        """
+        start the threads and queue the files of the manifest
+        """
+
+        self.add(self.manifest)
+
+        for i in xrange(self.workers):
+            thread = Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+
+    def stop(self):
+        """
+        stop the threads.  files that are not loaded yet are left out.
+        waits for the files that are being read to finish.
+        """
+
+        while 1:
+            try:
+                self.jobs.get_nowait()
+            except Empty:
+                break
+
+        for thread in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+
+    def add(self, manifest):
+        """
+        queue the files of another manifest.  can be called while loading,
+        even from a finish function.
+        """
+
+        for key, image in manifest.images.items():
+            self.queueImage(key, image)
+
+        for path, kwargs in manifest.maps.values():
+            self.queueMap(path, kwargs)
+
+        for filename in manifest.sounds:
+            self.queueSound(filename)
+
+
+    def work(self):
+        """
+        read files until told to stop.  run by the threads.
+        """
+
+        while 1:
+            job = self.jobs.get()
+            if job is None:
+                break
+
+            read, finish = job
+            try:
+                self.results.put((finish, read(), None))
+            except:
+                self.results.put((finish, None, sys.exc_info()))
+
+
+    def queue(self, read, finish):
+        """
+        read() is called in a thread, and its result is passed to finish() in
+        the main thread.  anything that doesn't need the display can be done
+        in read().
+        """
+
+        self.total += 1
+        self.jobs.put((read, finish))
+
+
+    def queueImage(self, key, image):
+        def finish(surface):
+            make = lambda: res.convertImage(surface, *image.args,
+                                            **image.kwargs)
+            res.imageCache.get(key, make, res.surfaceSize)
+
+        self.queue(lambda: res.readImage(image.filename), finish)
+
+
+    def queueMap(self, path, kwargs):
+        from pytmx import tmxloader
+
+        def finish(loaded):
+            tmxdata = tmxloader.convert_pygame(loaded, **kwargs)
+            res.storeMap(path, tmxdata, **kwargs)
+            for filename in mapSounds(tmxdata):
+                self.queueSound(filename)
+
+        self.queue(lambda: tmxloader.read_pygame(path, **kwargs), finish)
+
+
+    def queueSound(self, filename):
+        import pygame
+
+        # without the mixer, res.loadSound doesn't read the file
+        if filename in self.sounds or not pygame.mixer.get_init():
+            return
+
+        def finish(data):
+            make = lambda: res.makeSound(filename, data)
+            res.soundCache.get(res.soundPath(filename), make, res.soundSize)
+
+        self.sounds.add(filename)
+        self.queue(lambda: res.readSound(filename), finish)
+
+
+    def update(self, block=False):
+        """
+        finish the files that have been read, until the time budget is spent.
+        if block is True, wait for all the files to be loaded.
+        """
+
+        deadline = default_timer() + self.timeBudget / 1000000.0
+
+        while self.loaded < self.total:
+            if not block and (self.results.empty() or
+                              default_timer() >= deadline):
+                break
+
+            finish, data, error = self.results.get()
+            if error is not None:
+                self.stop()
+                raise error[0], error[1], error[2]
+
+            finish(data)
+            self.loaded += 1
+            if self.callback:
+                self.callback(self.loaded, self.total)
+
+        if self.loaded == self.total:
+            self.stop()
+
+
+    def wait(self):
+        """
+        load everything before returning
+        """
+
+        self.update(True)
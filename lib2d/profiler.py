@@ -0,0 +1,358 @@
+"""
+frame timings for finding out where the time goes
+
+the ContextDriver records how long each part of a frame takes: the events,
+the updates, the drawing and the display update.  other code can
+time itself in a named scope, which adds to the same frame:
+
+    >>> @profiler.profiled("area.update")
+    ... def update(self, time):
+    ...     pass
+
+    >>> with profiler.scope("collisions"):
+    ...     checkCollisions()
+
+the last frames are kept in a ring buffer, so the cost of recording a scope
+is the same, however long the game runs.  nothing is recorded until enable()
+is called, and then a scope costs a couple of microseconds.
+
+    >>> profiler.enable()
+    >>> profiler.current.percentiles("draw")
+    (2.1, 3.5, 5.0)
+    >>> profiler.current.dumpCSV("frames.csv")
+
+F3 shows a graph of the frame times while the game is running.
+"""
+
+from timeit import default_timer
+from array import array
+from functools import wraps
+import pygame
+import math
+import json
+
+
+# the profiler that scopes are recorded in, or None when profiling is off
+current = None
+
+
+
+def enable(size=600):
+    """
+    start recording frames.  size is the number of frames that are kept.
+    """
+
+    global current
+
+    if current is None or current.size != size:
+        current = Profiler(size)
+    return current
+
+
+def disable():
+    global current
+
+    current = None
+
+
+
+class NullScope(object):
+    def __enter__(self):
+        pass
+
+
+    def __exit__(self, *exc):
+        pass
+
+
+nullScope = NullScope()
+
+
+
+class Scope(object):
+    __slots__ = ["profiler", "name", "start"]
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+
+    def __enter__(self):
+        self.start = default_timer()
+
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, default_timer() - self.start)
+
+
+
+def scope(name):
+    """
+    return a context manager that adds the time spent in it to the frame
+    """
+
+    if current is None:
+        return nullScope
+    return Scope(current, name)
+
+
+
+def profiled(name):
+    """
+    decorator that adds the time spent in a function to the frame
+    """
+
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = current
+            if profiler is None:
+                return func(*args, **kwargs)
+
+            start = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.add(name, default_timer() - start)
+
+        return wrapper
+    return decorate
+
+
+
+class Profiler(object):
+    """
+    keeps the time spent in each scope for the last size frames
+
+    a scope that is entered more than once in a frame is added up.  a scope
+    that isn't entered in a frame counts as 0 for that frame.  times are
+    kept in seconds and reported in ms.
+    """
+
+    def __init__(self, size=600):
+        self.size = size
+        self.frames = 0
+        self.index = 0
+        self.names = []
+        self.channels = {}
+
+
+    def newFrame(self):
+        """
+        start recording the next frame
+        """
+
+        index = self.frames % self.size
+        for data in self.channels.values():
+            data[index] = 0.0
+        self.index = index
+        self.frames += 1
+
+
+    def add(self, name, seconds):
+        try:
+            self.channels[name][self.index] += seconds
+        except KeyError:
+            self.names.append(name)
+            self.channels[name] = array("d", [0.0]) * self.size
+            self.channels[name][self.index] = seconds
+
+
+    def last(self, name):
+        """
+        return the time of a scope in the last frame that was finished, in ms
+        """
+
+        data = self.channels.get(name)
+        if data is None or self.frames < 2:
+            return 0.0
+        return data[(self.frames - 2) % self.size] * 1000.0
+
+
+    def history(self, name):
+        """
+        return the times of a scope in the finished frames, oldest first, in ms
+        """
+
+        data = self.channels.get(name)
+        end = self.frames - 1
+        count = max(0, min(end, self.size - 1))
+        if data is None:
+            return [0.0] * count
+
+        return [ data[i % self.size] * 1000.0
+                 for i in xrange(end - count, end) ]
+
+
+    def percentiles(self, name, points=(50, 95, 99)):
+        """
+        return the times of a scope at each percentile, in ms
+        """
+
+        values = sorted(self.history(name))
+        if not values:
+            return tuple(0.0 for p in points)
+
+        n = len(values)
+        return tuple(values[max(0, int(math.ceil(p / 100.0 * n)) - 1)]
+                     for p in points)
+
+
+    def summary(self):
+        """
+        return a list of the name and 50th, 95th and 99th percentile of each
+        scope
+        """
+
+        return [ (name,) + self.percentiles(name) for name in self.names ]
+
+
+    def report(self):
+        lines = [ "{0:<24} {1:>8} {2:>8} {3:>8}".format(
+                  "scope (ms)", "p50", "p95", "p99") ]
+        for name, p50, p95, p99 in self.summary():
+            lines.append("{0:<24} {1:>8.3f} {2:>8.3f} {3:>8.3f}".format(
+                         name, p50, p95, p99))
+        return "\n".join(lines)
+
+
+    def dumpCSV(self, filename):
+        """
+        write the times of every frame in the buffer, one frame to a row
+        """
+
+        history = [ self.history(name) for name in self.names ]
+        first = self.frames - 1 - len(history[0]) if history else 0
+
+        with open(filename, "w") as fh:
+            fh.write(",".join(["frame"] + self.names) + "\n")
+            for i, row in enumerate(zip(*history)):
+                fh.write(",".join([str(first + i)] +
+                                  [ "{0:.4f}".format(v) for v in row ]) + "\n")
+
+
+    def dumpJSON(self, filename):
+        """
+        write the percentiles and the times of every frame in the buffer
+        """
+
+        data = {
+            "frames": self.frames,
+            "percentiles": dict((name, dict(p50=p50, p95=p95, p99=p99))
+                                for name, p50, p95, p99 in self.summary()),
+            "history": dict((name, self.history(name))
+                            for name in self.names)
+        }
+
+        with open(filename, "w") as fh:
+            json.dump(data, fh)
+
+
+
+class ProfilerGraph(object):
+    """
+    graph of the frame times that is drawn over the screen
+
+    each frame is a column of the graph, with the time of each of the
+    channels stacked on top of each other.  the line is the time that a
+    frame can take at the target fps.  only the newest column is drawn each
+    frame; the rest of the graph is scrolled.
+
+    the part of the screen under the graph is saved before the graph is
+    drawn and put back before the next frame is drawn, so states that only
+    draw what changed are not confused by it.
+    """
+
+    channels = [ ("events", (80, 160, 255)),
+                 ("update", (80, 220, 80)),
+                 ("draw", (255, 200, 60)),
+                 ("display", (230, 80, 80)) ]
+
+    background = (0, 0, 0)
+    lineColor = (255, 255, 255)
+
+    def __init__(self, size=(120, 40), budget=1000.0 / 60):
+        self.size = size
+        self.budget = budget
+        self.graph = None
+        self.under = None
+        self.saved = False
+        self.rect = None
+        self.text = None
+        self.textFrame = 0
+
+
+    def restore(self, surface):
+        """
+        put back the part of the surface that the graph covers.  returns the
+        rect that was changed, or None.
+        """
+
+        if not self.saved:
+            return None
+
+        surface.blit(self.under, self.rect)
+        self.saved = False
+        return self.rect
+
+
+    def columnOf(self, profiler):
+        """
+        return the height of each channel of the last frame, in pixels
+        """
+
+        h = self.size[1]
+        scale = h / (self.budget * 2.0)
+        heights = []
+        for name, color in self.channels:
+            ms = sum(profiler.last(i) for i in profiler.names
+                     if i == name or i.startswith(name + "."))
+            heights.append((int(ms * scale + .5), color))
+        return heights
+
+
+    def draw(self, surface, profiler):
+        """
+        draw the graph in the bottom left of the surface and return its rect
+        """
+
+        from banner import loadFont
+
+        w, h = self.size
+        if self.graph is None:
+            self.graph = pygame.Surface((w, h))
+            self.graph.fill(self.background)
+            self.font = loadFont(None, 10)
+
+        sw, sh = surface.get_size()
+        self.rect = pygame.Rect(0, sh - h, w, h).clip(surface.get_rect())
+
+        # add the newest frame to the right side of the graph
+        graph = self.graph
+        graph.scroll(-1, 0)
+        graph.fill(self.background, (w - 1, 0, 1, h))
+        y = h
+        for height, color in self.columnOf(profiler):
+            if height > 0:
+                graph.fill(color, (w - 1, y - height, 1, height))
+                y -= height
+
+        # the text is only made a few times a second
+        if profiler.frames - self.textFrame >= 30 or self.text is None:
+            self.textFrame = profiler.frames
+            p50, p95, p99 = profiler.percentiles("frame")
+            text = "{0:.1f} {1:.1f} {2:.1f} ms".format(p50, p95, p99)
+            self.text = self.font.render(text, False, self.lineColor)
+
+        if self.under is None or self.under.get_size() != self.rect.size:
+            self.under = pygame.Surface(self.rect.size, 0, surface)
+            if surface.get_bitsize() == 8:
+                self.under.set_palette(surface.get_palette())
+        self.under.blit(surface, (0, 0), self.rect)
+        self.saved = True
+        surface.blit(graph, self.rect)
+        line = self.rect.bottom - int(h / 2.0)
+        surface.fill(self.lineColor, (self.rect.left, line, w, 1))
+        surface.blit(self.text, self.rect.topleft)
+
+        return self.rect
@@ -1,12 +1,19 @@
 """
-Module contains two classes for quadtree collision detection.
+Module contains three classes for quadtree collision detection.
 
 In Lib2d, they are used in various parts in rendering and collision detection
 between 'sprites' and world geometry.
 
-It is important to remember that once the quadtree's are useful for static
-objects (which is why it is being used for world geometry).  There are
-probably better solutions for moving objects.
+It is important to remember that FastQuadTree and QuadTree are built once
+and are useful for static objects (which is why they are used for world
+geometry).  For moving objects, use the DynamicQuadTree.  Items can be
+inserted, removed and moved without rebuilding the tree.
+
+The DynamicQuadTree is only faster while few things move far each frame.
+In utilities/quadtreebench.py, when items jump anywhere on the map, building
+a FastQuadTree again is faster once about 10% of them move each frame.  When
+they walk a few pixels, like sprites do, the DynamicQuadTree is faster until
+nearly all of them move.
 """
 
 
@@ -73,7 +80,7 @@ class FastQuadTree(object):
     objects, or objects with a rect attribute.  The return value will always
     be a set of a tupes that represent the items passed.  In other words,
     you will not get back the objects that were passed, just a tuple that
-    describes it.
+    describes it.  Use query() to get the objects that were passed.
 
     Items being stored in the tree must be a pygame.Rect or have have a
     .rect (pygame.Rect) attribute that is a pygame.Rect
@@ -191,6 +198,81 @@ class FastQuadTree(object):
         return hits
 
 
+    def query(self, rect, out=None, visitor=None):
+        """Finds the items that overlap a bounding rectangle.
+
+        Unlike hit(), the items that were passed to the quad-tree are
+        returned, not tuples.  Each item is only returned once, even if it
+        was stored in more than one quadrant.
+
+        @param rect:
+            The bounding rectangle being tested against the quad-tree.  This
+            must be a pygame.Rect.
+
+        @param out:
+            Optional list.  Items will be appended to it and it is returned.
+            Pass the same list each frame to avoid making a new one.
+
+        @param visitor:
+            Optional callable.  If passed, it will be called with each item
+            instead of adding it to a list, and None is returned.
+        """
+
+        if visitor is None:
+            if out is None: out = []
+            visitor = out.append
+
+        self._query(rect, visitor, set(), [])
+        return out
+
+
+    def hit_many(self, rects, out=None, visitor=None):
+        """Finds the items that overlap any of the bounding rectangles.
+
+        Works like query(), but tests many rects at once.  An item that
+        overlaps more than one rect is still only returned once.
+        """
+
+        if visitor is None:
+            if out is None: out = []
+            visitor = out.append
+
+        seen = set()
+        stack = []
+        for rect in rects:
+            self._query(rect, visitor, seen, stack)
+        return out
+
+
+    def _query(self, rect, visitor, seen, stack):
+        # walk the tree without recursion.  items may be stored in more than
+        # one quadrant, so the ids of the items are kept in a set to skip
+        # them the second time.  pygame rects are not hashable.
+        collide = rect.collidelistall
+        left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
+
+        stack.append(self)
+        while stack:
+            node = stack.pop()
+            items = node.items
+            if items:
+                for i in collide(items):
+                    item = items[i]
+                    key = id(item)
+                    if key not in seen:
+                        seen.add(key)
+                        visitor(item)
+
+            if node.nw and left <= node.cx and top <= node.cy:
+                stack.append(node.nw)
+            if node.sw and left <= node.cx and bottom >= node.cy:
+                stack.append(node.sw)
+            if node.ne and right >= node.cx and top <= node.cy:
+                stack.append(node.ne)
+            if node.se and right >= node.cx and bottom >= node.cy:
+                stack.append(node.se)
+
+
 class QuadTree(object):
     """Another implementation of a quad-tree.
 
@@ -303,3 +385,338 @@ class QuadTree(object):
 
 
 
+class DynamicQuadNode(object):
+    """
+    Node of a DynamicQuadTree.  For internal use only.
+    """
+
+    __slots__ = ['left', 'top', 'right', 'bottom', 'cx', 'cy', 'depth',
+                 'parent', 'children', 'items', 'count']
+
+    def __init__(self, (left, top, right, bottom), depth, parent):
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+        self.cx = (left + right) * 0.5
+        self.cy = (top + bottom) * 0.5
+        self.depth = depth
+        self.parent = parent
+        self.children = None    # nw, ne, sw, se
+        self.items = []         # items that are stored in this node
+        self.count = 0          # number of items in this node and below
+
+
+    def childFor(self, (l, t, r, b)):
+        """
+        return the child that completely contains the box, or None
+        """
+
+        if l < self.left or t < self.top or r > self.right or b > self.bottom:
+            return None
+
+        if r <= self.cx:
+            x = 0
+        elif l >= self.cx:
+            x = 1
+        else:
+            return None
+
+        if b <= self.cy:
+            y = 0
+        elif t >= self.cy:
+            y = 2
+        else:
+            return None
+
+        return self.children[x + y]
+
+
+
+class DynamicQuadTree(object):
+    """Quad-tree that can be changed after it is built.
+
+    Items are inserted with a rect and may be moved by calling update().
+    Moving an item a short way is cheap, since it only climbs to the nearest
+    node that still contains it.  A node is split into four when it holds
+    more than max_items, and the four are merged back together when the node
+    and its children hold min_items or fewer.
+
+    Each item is stored once, in the smallest node that contains all of it.
+    Unlike FastQuadTree, the items themselves are returned by hit(), so they
+    must be hashable.  Pygame rects are not hashable; use a FrozenRect if you
+    want to store rects.
+
+    Items outside of the bounding rect are still stored, but they will be
+    checked by every query.
+    """
+
+    def __init__(self, bounding_rect, max_items=8, min_items=4, max_depth=8):
+        """Creates an empty quad-tree.
+
+        @param bounding_rect:
+            The area that the tree will cover.  Items may be outside of it,
+            but queries will be slower.
+
+        @param max_items:
+            Split a node when it holds more than this many items.
+
+        @param min_items:
+            Merge a node's children when they hold this many or fewer items.
+
+        @param max_depth:
+            Nodes at this depth will never be split.
+        """
+
+        l, t, w, h = bounding_rect
+        self.root = DynamicQuadNode((l, t, l + w, t + h), 0, None)
+        self.max_items = max_items
+        self.min_items = min_items
+        self.max_depth = max_depth
+        self.nodes = {}     # item: node that holds it
+        self.boxes = {}     # item: (left, top, right, bottom)
+
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+    def __contains__(self, item):
+        return item in self.nodes
+
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+
+    def insert(self, item, rect=None):
+        """
+        add an item.  if rect is not passed, item must be rect-like
+        """
+
+        if item in self.nodes:
+            msg = "Item {0} is already in the quadtree."
+            raise ValueError, msg.format(item)
+
+        if rect is None: rect = item
+        l, t, w, h = rect
+        box = (l, t, l + w, t + h)
+        self.boxes[item] = box
+
+        node = self.root
+        while node.children:
+            child = node.childFor(box)
+            if child is None: break
+            node = child
+
+        self._add(node, item)
+
+
+    def remove(self, item):
+        """
+        remove an item.  raises KeyError if the item is not in the tree.
+        """
+
+        node = self.nodes.pop(item)
+        del self.boxes[item]
+        node.items.remove(item)
+
+        parent = node
+        while parent:
+            parent.count -= 1
+            parent = parent.parent
+
+        # merge the highest node that is no longer worth keeping split
+        if node.children is None:
+            node = node.parent
+        merge = None
+        while node and node.count <= self.min_items:
+            merge = node
+            node = node.parent
+
+        if merge:
+            self._merge(merge)
+
+
+    def update(self, item, rect):
+        """
+        move an item to a new rect
+        """
+
+        l, t, w, h = rect
+        box = (l, t, l + w, t + h)
+        old = self.nodes[item]
+        self.boxes[item] = box
+
+        # climb to the nearest node that still contains the box, then go down
+        # as far as it fits.  items that move a little don't go far.
+        top = old
+        while top.parent and not (box[0] >= top.left and box[1] >= top.top and
+                                  box[2] <= top.right and box[3] <= top.bottom):
+            top = top.parent
+
+        node = top
+        while node.children:
+            child = node.childFor(box)
+            if child is None: break
+            node = child
+
+        if node is old:
+            return
+
+        # counts above the node that they share don't change
+        old.items.remove(item)
+        parent = old
+        while parent is not top:
+            parent.count -= 1
+            parent = parent.parent
+
+        node.items.append(item)
+        self.nodes[item] = node
+        parent = node
+        while parent is not top:
+            parent.count += 1
+            parent = parent.parent
+
+        # merge the highest node below the shared one that is no longer worth
+        # keeping split.  it can't hold the new node.
+        if old.children is None:
+            old = old.parent
+        merge = None
+        while old is not top and old.count <= self.min_items:
+            merge = old
+            old = old.parent
+
+        if merge:
+            self._merge(merge)
+
+        if (node.children is None and len(node.items) > self.max_items and
+            node.depth < self.max_depth):
+            self._split(node)
+
+
+    def hit(self, rect):
+        """Returns the items that overlap a bounding rectangle.
+
+        Returns the set of all items in the quad-tree that overlap with a
+        bounding rectangle.
+
+        @param rect:
+            The bounding rectangle being tested against the quad-tree.  It
+            must be a pygame.Rect or a (left, top, width, height) tuple.
+        """
+
+        return set(self.query(rect))
+
+
+    def query(self, rect, out=None, visitor=None):
+        """Finds the items that overlap a bounding rectangle.
+
+        Works like FastQuadTree.query().  Items are appended to out, or
+        passed to the visitor if one is given.  The visitor must not change
+        the quad-tree.
+        """
+
+        if visitor is None:
+            if out is None: out = []
+            visitor = out.append
+
+        self._query(rect, visitor, None)
+        return out
+
+
+    def hit_many(self, rects, out=None, visitor=None):
+        """Finds the items that overlap any of the bounding rectangles.
+
+        An item that overlaps more than one rect is only returned once.
+        """
+
+        if visitor is None:
+            if out is None: out = []
+            visitor = out.append
+
+        seen = set()
+        for rect in rects:
+            self._query(rect, visitor, seen)
+        return out
+
+
+    def _query(self, rect, visitor, seen):
+        # each item is stored in only one node, so there are no duplicates
+        # unless many rects are being tested.
+        ql, qt, w, h = rect
+        qr = ql + w
+        qb = qt + h
+        boxes = self.boxes
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for item in node.items:
+                l, t, r, b = boxes[item]
+                if l < qr and ql < r and t < qb and qt < b:
+                    if seen is not None:
+                        if item in seen: continue
+                        seen.add(item)
+                    visitor(item)
+
+            if node.children:
+                for child in node.children:
+                    if (child.count and child.left <= qr and ql <= child.right
+                        and child.top <= qb and qt <= child.bottom):
+                        stack.append(child)
+
+
+    def _add(self, node, item):
+        node.items.append(item)
+        self.nodes[item] = node
+
+        parent = node
+        while parent:
+            parent.count += 1
+            parent = parent.parent
+
+        if (node.children is None and len(node.items) > self.max_items and
+            node.depth < self.max_depth):
+            self._split(node)
+
+
+    def _split(self, node):
+        l, t, r, b = node.left, node.top, node.right, node.bottom
+        cx, cy = node.cx, node.cy
+        depth = node.depth + 1
+        node.children = (DynamicQuadNode((l, t, cx, cy), depth, node),
+                         DynamicQuadNode((cx, t, r, cy), depth, node),
+                         DynamicQuadNode((l, cy, cx, b), depth, node),
+                         DynamicQuadNode((cx, cy, r, b), depth, node))
+
+        boxes = self.boxes
+        nodes = self.nodes
+        keep = []
+        for item in node.items:
+            child = node.childFor(boxes[item])
+            if child is None:
+                keep.append(item)
+            else:
+                child.items.append(item)
+                child.count += 1
+                nodes[item] = child
+        node.items = keep
+
+        # all the items may have landed in one child
+        for child in node.children:
+            if len(child.items) > self.max_items and depth < self.max_depth:
+                self._split(child)
+
+
+    def _merge(self, node):
+        nodes = self.nodes
+        stack = list(node.children)
+        while stack:
+            child = stack.pop()
+            for item in child.items:
+                nodes[item] = node
+            node.items.extend(child.items)
+            if child.children:
+                stack.extend(child.children)
+        node.children = None
@@ -27,6 +27,7 @@ simple:
 
 import pygame
 import sys, os.path
+from collections import OrderedDict
 
 
 DEBUG = True
@@ -52,6 +53,12 @@ _defaultFont = None
 
 global_colorkey = (48, 47, 46)
 
+# bytes of decoded images that are kept after nothing is using them
+imageCacheBytes = 64 * 1024 * 1024
+
+# bytes of decoded sounds that are kept
+soundCacheBytes = 16 * 1024 * 1024
+
 class NoSound:
     def play(self): pass
     def stop(self): pass
@@ -82,6 +89,38 @@ def mapPath(filename):
     return os.path.join(_resPath, "maps", filename)
 
 
+# maps that were loaded ahead of time.  each one is handed out only once,
+# since a map can be changed after it is loaded.
+_loadedMaps = {}
+
+
+def mapKey(path, kwargs):
+    return (os.path.abspath(path), tuple(sorted(kwargs.items())))
+
+
+def loadMap(path, **kwargs):
+    """
+    return a map loaded with pytmx.  if the map was stored with storeMap(),
+    with the same options, that one is returned.
+    """
+
+    try:
+        return _loadedMaps.pop(mapKey(path, kwargs))
+    except KeyError:
+        pass
+
+    from pytmx import tmxloader
+    return tmxloader.load_pygame(path, **kwargs)
+
+
+def storeMap(path, tmxdata, **kwargs):
+    """
+    keep a map that was loaded ahead of time for loadMap()
+    """
+
+    _loadedMaps[mapKey(path, kwargs)] = tmxdata
+
+
 def aniPath(filename):
     return os.path.join(_resPath, "animations", filename)
 
@@ -89,16 +128,166 @@ def imagePath(filename):
     return os.path.join(_resPath, "images", filename)
     
 
-def loadImage(name, alpha=False, colorkey=False, fake=False):
+class ResourceCache(object):
+    """
+    Process-wide cache of loaded resources.
+
+    Resources are kept by a key and are shared by everything that asks for
+    the same key, so they must not be changed by the caller.  Objects that
+    hold on to a resource acquire it when they load and release it when they
+    unload.  Resources that are not in use are kept until the cache grows
+    past its budget, then the ones used least recently are dropped.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.entries = OrderedDict()    # key: [resource, refs, size]
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key, make, size, acquire=False):
+        """
+        return the resource for the key.  if it isn't cached, make() is
+        called to make it and size(resource) to find how many bytes it uses.
+        """
+
+        try:
+            entry = self.entries.pop(key)
+            self.hits += 1
+        except KeyError:
+            resource = make()
+            entry = [resource, 0, size(resource)]
+            self.bytes += entry[2]
+            self.misses += 1
+
+        self.entries[key] = entry
+        if acquire:
+            entry[1] += 1
+        self.trim()
+
+        return entry[0]
+
+
+    def release(self, key):
+        """
+        stop using a resource that was acquired with get()
+        """
+
+        try:
+            entry = self.entries[key]
+        except KeyError:
+            return
+
+        if entry[1] > 0:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self.trim()
+
+
+    def trim(self):
+        """
+        drop unused resources until the cache fits in the budget
+        """
+
+        if self.bytes <= self.budget:
+            return
+
+        for key, entry in self.entries.items():
+            if entry[1] == 0:
+                del self.entries[key]
+                self.bytes -= entry[2]
+                if self.bytes <= self.budget:
+                    break
+
+
+    def clear(self):
+        """
+        drop all unused resources
+        """
+
+        for key, entry in self.entries.items():
+            if entry[1] == 0:
+                del self.entries[key]
+                self.bytes -= entry[2]
+
+
+    def stats(self):
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "resident": len(self.entries),
+                "bytes": self.bytes}
+
+
+
+imageCache = ResourceCache(imageCacheBytes)
+
+
+def surfaceSize(surface):
+    return surface.get_pitch() * surface.get_height()
+
+
+def imageKey(name, alpha=False, colorkey=False, fake=False):
+    return (imagePath(name), bool(alpha), bool(colorkey), bool(fake))
+
+
+def loadImage(name, alpha=False, colorkey=False, fake=False, acquire=False):
+    """
+    return a converted image from the images folder.
+
+    images are cached, so this only reads the file once.  the surface is
+    shared with everything else that loads the image, so don't change it.
+    if acquire is true, the image is kept until releaseImage() is called.
+    """
+
+    key = imageKey(name, alpha, colorkey, fake)
+    make = lambda: convertImage(readImage(name), alpha, colorkey, fake)
+    return imageCache.get(key, make, surfaceSize, acquire)
+
+
+def releaseImage(name, alpha=False, colorkey=False, fake=False):
+    imageCache.release(imageKey(name, alpha, colorkey, fake))
+
+
+def setImageCacheSize(size):
+    """
+    set the number of bytes of unused images that are kept in memory
+    """
+
+    imageCache.budget = size
+    imageCache.trim()
+
+
+def imageCacheStats():
+    """
+    return a dict with the hits, misses, resident images, and bytes used
+    """
+
+    return imageCache.stats()
+
+
+def readImage(name):
+    """
+    decode an image file, without converting it.  the display is not used,
+    so this can be run in another thread.
+    """
+
     fullpath = imagePath(name)
 
     try:
-        image = pygame.image.load(fullpath)
+        return pygame.image.load(fullpath)
 
     except pygame.error, message:
         msg = "Cannot load image: {}"
         raise Exception, msg.format(fullpath)
 
+
+def convertImage(image, alpha=False, colorkey=False, fake=False):
+    """
+    convert a decoded image to the display format
+    """
+
     if alpha or fake:
         image = image.convert_alpha()
 
@@ -131,25 +320,57 @@ def soundPath(filename):
     return os.path.join(_resPath, "sounds", filename)
 
 
+soundCache = ResourceCache(soundCacheBytes)
+
+
+def soundSize(sound):
+    if sound is dummySound:
+        return 0
+
+    try:
+        freq, bits, channels = pygame.mixer.get_init()
+    except TypeError:
+        return 0
+    return int(sound.get_length() * freq * channels * abs(bits) / 8)
+
+
 def loadSound(filename):
-    fullpath = soundPath(filename)
-    
+    """
+    return a sound from the sounds folder.  sounds are cached, and shared
+    with everything else that loads the same file.
+    """
+
     if not pygame.mixer:
         debug("Cannot load sound: pygame.mixer not ready\n")
         return dummySound
 
-    # pygame will load a sound even if it doesn't exist... do a sanity check.
-    open(fullpath).close()
+    make = lambda: makeSound(filename, readSound(filename))
+    return soundCache.get(soundPath(filename), make, soundSize)
+
+
+def readSound(filename):
+    """
+    return the contents of a sound file.  this can be run in another thread.
+    """
+
+    with open(soundPath(filename), "rb") as fh:
+        return fh.read()
+
+
+def makeSound(filename, data):
+    """
+    make a sound from the contents of the file
+    """
+
+    from cStringIO import StringIO
 
     try:
-        sound = pygame.mixer.Sound(fullpath)
+        return pygame.mixer.Sound(file=StringIO(data))
     except pygame.error, message:
-        debug("Cannot load sound: %s\n" % fullpath)
+        debug("Cannot load sound: %s\n" % soundPath(filename))
         debug("%s\n" % message)
         return dummySound
 
-    return sound
-
 
 def musicPath(filename):
     return os.path.join(_resPath, "music", filename)
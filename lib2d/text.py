@@ -0,0 +1,341 @@
+"""
+text that is drawn often, made cheap
+
+fonts are loaded once for each file and size.  the width of each character
+of a font is measured once, so the width of any piece of text is a sum, and
+wrapping a paragraph doesn't have to measure it again and again.  the lines
+that a paragraph is wrapped into are kept, too.
+
+each font and color has a glyph atlas: every character is rendered once,
+onto one surface.  lines of text are put together from the atlas and kept,
+so a page of text that is drawn every frame costs one blit for each line:
+
+    >>> font = text.getFont("dpcomic.ttf", 16)
+    >>> text.drawText(surface, page, (0, 0, 0), rect, font)
+"""
+
+from pygame.locals import SRCALPHA, BLEND_RGBA_MAX, RLEACCEL
+from collections import OrderedDict
+import pygame
+import res
+
+
+pygame.font.init()
+
+
+# the most layouts, lines of each atlas and outlined banners that are kept
+maxLayouts = 256
+maxLines = 256
+maxOutlined = 64
+
+fonts = {}          # (filename, size): Font
+widths = {}         # Font: {character: width}
+atlases = {}        # (Font, color, aa, background): GlyphAtlas
+layouts = OrderedDict()
+outlined = OrderedDict()
+
+
+
+def cached(cache, limit, key, make):
+    """
+    return the value of key in an OrderedDict, or make it.  when there are
+    more than limit values, the one used the longest time ago is dropped.
+    """
+
+    try:
+        value = cache.pop(key)
+    except KeyError:
+        value = make()
+        if len(cache) >= limit:
+            cache.popitem(last=False)
+
+    cache[key] = value
+    return value
+
+
+def getFont(font=None, size=12):
+    """
+    return a font.  font can be the name of a file in the fonts folder,
+    None for pygame's font, or a Font, which is returned as it is.
+    """
+
+    if isinstance(font, pygame.font.Font):
+        return font
+
+    try:
+        return fonts[(font, size)]
+    except KeyError:
+        pass
+
+    if font is None:
+        path = res.defaultFont()
+    else:
+        path = res.fontPath(font)
+
+    f = fonts[(font, size)] = pygame.font.Font(path, size)
+    return f
+
+
+def charWidth(font, char):
+    """
+    return how far the pen moves after drawing a character
+    """
+
+    try:
+        return widths[font][char]
+    except KeyError:
+        pass
+
+    metrics = font.metrics(char)[0]
+    if metrics is None:
+        w = font.size(char)[0]
+    else:
+        w = metrics[4]
+
+    widths.setdefault(font, {})[char] = w
+    return w
+
+
+def layout(text, width, font):
+    """
+    return a list of (start, end) of the lines that the text is wrapped into
+    to fit the width.  lines are broken after a space, or at a new line.  a
+    word too long for a line is broken where it doesn't fit.
+
+    like the old drawText, a line is broken at the first character that
+    makes font.size() of the line reach the width, and the last character
+    of the text is never measured, so it can go past the edge.
+    """
+
+    def make():
+        lines = []
+        start = 0
+        end = len(text)
+        while start < end:
+
+            # guess where the line doesn't fit from the widths of the
+            # characters, which can be a pixel off from font.size()
+            x = 0
+            i = start
+            while i < end and text[i] != "\n":
+                x += charWidth(font, text[i])
+                if x >= width:
+                    break
+                i += 1
+
+            # then find the first character that doesn't fit with
+            # font.size(), looking at only a few characters around the guess
+            stop = end
+            if i < end:
+                stop = text.find("\n", i)
+                if stop < 0: stop = end
+            last = stop if stop < end else end - 1
+            i = min(i, last)
+            while i > start and font.size(text[start:i])[0] >= width:
+                i -= 1
+            while i < last and font.size(text[start:i + 1])[0] < width:
+                i += 1
+
+            # the whole line fits, or it ends at a new line
+            if i == last:
+                lines.append((start, stop))
+                start = stop + 1
+
+            # wrap after the last space, if there is one
+            else:
+                space = text.rfind(" ", start, i + 1)
+                if space >= 0:
+                    i = space + 1
+                else:
+                    i = max(i, start + 1)
+                lines.append((start, i))
+                start = i
+
+        return lines
+
+    return cached(layouts, maxLayouts, (text, width, font), make)
+
+
+def getAtlas(font, color, aa=False, background=None):
+    """
+    return the glyph atlas for a font and color
+    """
+
+    if background is not None:
+        background = tuple(background)
+
+    key = (font, tuple(color), bool(aa), background)
+    try:
+        return atlases[key]
+    except KeyError:
+        atlas = atlases[key] = GlyphAtlas(font, color, aa, background)
+        return atlas
+
+
+def drawText(surface, text, color, rect, font=None, aa=False, bkg=None):
+    """
+    draw some text into an area of a surface, wrapping the words.  returns
+    any text that didn't fit.  passing None as the surface is ok.
+    """
+
+    rect = pygame.Rect(rect)
+    lineSpacing = -2
+
+    if font is None:
+        font = getFont(None, 12)
+
+    # get the height of the font
+    fontHeight = font.size("Tg")[1]
+
+    # for very small fonts, turn off antialiasing
+    if fontHeight < 16:
+        aa = False
+        bkg = None
+
+    if surface:
+        atlas = getAtlas(font, color, aa, bkg)
+
+    y = rect.top
+    for start, end in layout(text, rect.width, font):
+
+        # determine if the row of text will be outside our area
+        if y + fontHeight > rect.bottom:
+            return text[start:]
+
+        if surface:
+            surface.blit(atlas.line(text[start:end]), (rect.left, y))
+
+        y += fontHeight + lineSpacing
+
+    return ""
+
+
+def outlinedText(text, font, size, color):
+    """
+    return a banner.outlinedText with an alpha channel.  the banners are
+    kept, so menus don't make them again when the selection changes.
+    """
+
+    from banner import outlinedText
+
+    key = (text, font, size, tuple(color))
+    make = lambda: outlinedText(text, font, size, color, True, None)
+    return cached(outlined, maxOutlined, key, make)
+
+
+
+class GlyphAtlas(object):
+    """
+    the characters of a font rendered in one color, packed onto one surface
+
+    without a background, the atlas has an alpha channel.  glyphs are put
+    together with BLEND_RGBA_MAX, so the parts of glyphs that overlap are
+    not erased by the clear pixels around the next one.
+    """
+
+    width = 512
+
+    def __init__(self, font, color, aa=False, background=None):
+        self.font = font
+        self.color = color
+        self.aa = aa
+        self.background = background
+        self.height = font.get_height()
+        self.glyphs = {}            # character: (area in the atlas, width)
+        self.lines = OrderedDict()  # text: surface
+        self.surface = self.newSurface((self.width, self.height))
+        self.pen = (0, 0)
+
+        if background is None:
+            self.flags = BLEND_RGBA_MAX
+        else:
+            self.flags = 0
+
+
+    def newSurface(self, size):
+        if self.background is None:
+            surface = pygame.Surface(size, SRCALPHA, 32)
+            surface.fill((0, 0, 0, 0))
+        else:
+            surface = pygame.Surface(size)
+            surface.fill(self.background)
+        return surface
+
+
+    def glyph(self, char):
+        """
+        return the area of the atlas that a character is in, and its width
+        """
+
+        try:
+            return self.glyphs[char]
+        except KeyError:
+            pass
+
+        font = self.font
+        if self.background is None:
+            rendered = font.render(char, self.aa, self.color)
+        else:
+            rendered = font.render(char, self.aa, self.color, self.background)
+
+        w, h = rendered.get_size()
+        x, y = self.pen
+        if x + w > self.width:
+            x, y = 0, y + self.height
+
+        # make the atlas taller when it is full
+        if y + h > self.surface.get_height():
+            surface = self.newSurface((self.width, y + self.height * 4))
+            surface.blit(self.surface, (0, 0), None, self.flags)
+            self.surface = surface
+
+        flags = 0
+        if rendered.get_flags() & SRCALPHA:
+            flags = self.flags
+
+        self.surface.blit(rendered, (x, y), None, flags)
+        self.pen = (x + w, y)
+
+        glyph = self.glyphs[char] = (pygame.Rect(x, y, w, h),
+                                     charWidth(font, char))
+        return glyph
+
+
+    def line(self, text):
+        """
+        return a surface with a line of text on it
+        """
+
+        return cached(self.lines, maxLines, text, lambda: self.makeLine(text))
+
+
+    def makeLine(self, text):
+        glyphs = [ self.glyph(char) for char in text ]
+
+        # the last glyph can be wider than its width, if it leans over
+        x = 0
+        right = 1
+        for area, w in glyphs:
+            right = max(right, x + area.width)
+            x += w
+
+        image = self.newSurface((right, self.height))
+        blit = image.blit
+        atlas = self.surface
+        flags = self.flags
+
+        x = 0
+        for area, w in glyphs:
+            blit(atlas, (x, 0), area, flags)
+            x += w
+
+        if pygame.display.get_surface():
+            if self.background is None:
+                image = image.convert_alpha()
+            else:
+                image = image.convert()
+
+        if self.background is not None:
+            image.set_colorkey(self.background, RLEACCEL)
+
+        return image
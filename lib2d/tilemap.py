@@ -5,9 +5,13 @@ this time has tiled TMX maps built in and required
 """
 
 from objects import GameObject
+from profiler import profiled
 import pygame
-from itertools import product, chain, ifilter
 from pytmx import tmxloader
+from timeit import default_timer
+from collections import OrderedDict
+from array import array
+import heapq
 
 
 # this image will be used when a tile cannot be loaded
@@ -40,6 +44,13 @@ class BufferedTilemapRenderer(GameObject):
     The original library for this, Lib2d updates 4 times for every draw.  To
     take advantage of the processing done inbetween screen updates, update()
     will blit any tiles needed to the offscreen buffer.
+
+    The updates between two draws share a time budget, in microseconds, that
+    can be set with the timeBudget keyword.  Tiles closest to the screen are
+    drawn first, and if the queue is empty, the rest of the budget is used to
+    draw the next column and row in the direction the map is scrolling.  When
+    the map is drawn, only the queued tiles that are on the screen are drawn
+    right away; the rest will wait for the next update.
     """
 
     time_update = True
@@ -50,6 +61,9 @@ class BufferedTilemapRenderer(GameObject):
         self.default_image = generateDefaultImage((tmx.tilewidth,
                                                    tmx.tileheight))
         self.tmx = tmx
+        self.timeBudget = kwargs.get("timeBudget", 3000)
+        self.opacity = None
+        self.buildOccupancy()
         self.setSize(size)
 
 
@@ -59,8 +73,6 @@ class BufferedTilemapRenderer(GameObject):
         necessary to set the size with the function.
         """
 
-        import quadtree
-
         """
         left, self.xoffset = divmod(size[0] / 2, self.tmx.tilewidth)
         top,  self.yoffset = divmod(size[1] / 2, self.tmx.tileheight)
@@ -93,21 +105,31 @@ class BufferedTilemapRenderer(GameObject):
         # this is where the magic happens
         self.buffer = pygame.Surface((self.bufferWidth, self.bufferHeight))
 
-        # how many tiles are blitted to the buffer during an update
-        self.blitPerUpdate = int(self.view.width * 1.5)
-
-        # quadtree is used to correctly draw tiles that cover 'sprites'
-        rects = []
-        p = product(range(self.view.width+2), range(self.view.height+2))
-        for x, y in p:
-            rect = pygame.Rect((x*self.tmx.tilewidth,y*self.tmx.tileheight),
-                               (self.tmx.tilewidth, self.tmx.tileheight))
-            rects.append(rect)
-        self.layerQuadtree = quadtree.FastQuadTree(rects, 4)
+        # time left for drawing tiles until the next draw, in microseconds
+        self.budgetLeft = self.timeBudget
 
         self.idle = False
         self.blank = True 
-        self.queue = None
+
+        # heap of (distance from the screen, x, y) for cells to be drawn
+        self.queue = []
+        self.queued = set()
+
+        # pixels per call to center(), used to guess where the map will go
+        self.velocity = (0.0, 0.0)
+
+        # column and row beyond the buffer that are drawn ahead of time:
+        # [line, first cell, surface, set of cells that are drawn]
+        self.strips = [None, None]
+
+        # what the last draw() looked like, to find what changed since then:
+        # the surface, the rect, the pixel at the top-left of the screen and
+        # the surfaces that were drawn on the map
+        self.lastDraw = None
+        self.lastSurfaces = set()
+
+        # rects of the buffer that were drawn since the last draw()
+        self.changed = []
 
 
     def center(self, (x, y)):
@@ -123,6 +145,9 @@ class BufferedTilemapRenderer(GameObject):
 
         x, y = int(x), int(y)
 
+        vx, vy = self.velocity
+        self.velocity = ((vx + x - self.oldX) / 2.0, (vy + y - self.oldY) / 2.0)
+
         if (self.oldX == x) and (self.oldY == y):
             self.idle = True
             return
@@ -189,26 +214,86 @@ class BufferedTilemapRenderer(GameObject):
         for example v=(1, 0) will shift the map one tile to the right and fill
         the blit queue with the tiles needed to complete it.
 
-        if background updating is not enabled for whatever reason, then the
-        buffer will be redrawn here.
+        tiles that are queued are not drawn here.  the ones on the screen will
+        be drawn by draw(), the others by update().
 
         this method is mostly for internal use only
         """
 
-        # make sure that the map is completely drawn
-        self.flushQueue()
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
 
         self.view = self.view.move((x, y))
 
         # scroll the image (much faster than reblitting the tiles!)
-        self.buffer.scroll(-x * self.tmx.tilewidth, -y * self.tmx.tileheight)
+        self.buffer.scroll(-x * tw, -y * th)
+        self.changed = None
+
+        # forget about tiles that have scrolled out of the buffer, and sort
+        # the rest again since the screen has moved
+        self.requeue()
 
-        # queue the missing tiles
-        self.queueEdgeTiles((x, y))
+        # queue the missing tiles that were not drawn ahead of time
+        self.queueEdgeTiles((x, y), self.useStrips((x, y)))
 
-        # prevent edges on the screen if moving too fast or camera is shaking
-        if (abs(x) > 1) or (abs(y) > 1):
-            self.flushQueue()
+
+    def useStrips(self, (x, y)):
+        """
+        copy the cells of the prefetched strips that are now in the buffer,
+        and drop the strips that cannot be used anymore.  returns a set of the
+        cells that were copied.
+        """
+
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        view = self.view
+        done = set()
+
+        for axis, d in enumerate((x, y)):
+            strip = self.strips[axis]
+            if strip is None:
+                continue
+
+            line, start, surface, drawn = strip
+            if axis == 0:
+                near, far = view.left, view.right + 1
+                lo, hi = view.top, view.bottom + 2
+            else:
+                near, far = view.top, view.bottom + 1
+                lo, hi = view.left, view.right + 2
+
+            # the strip is still just beyond the edge of the buffer
+            if d == 0 and line in (near - 1, far + 1):
+                continue
+
+            self.strips[axis] = None
+            if d == 1:
+                edge = far
+            elif d == -1:
+                edge = near
+            else:
+                continue
+
+            if line != edge:
+                continue
+
+            a = max(lo, start)
+            b = min(hi, start + hi - lo)
+            if a >= b:
+                continue
+
+            if axis == 0:
+                self.buffer.blit(surface, ((line - view.left) * tw,
+                                           (a - view.top) * th),
+                                 (0, (a - start) * th, tw, (b - a) * th))
+                done.update((line, c) for c in xrange(a, b) if c in drawn)
+            else:
+                self.buffer.blit(surface, ((a - view.left) * tw,
+                                           (line - view.top) * th),
+                                 ((a - start) * tw, 0, (b - a) * tw, th))
+                done.update((c, line) for c in xrange(a, b) if c in drawn)
+
+        return done
 
 
     def optSurfaces(self, surface=None, depth=None, flags=0):
@@ -221,6 +306,8 @@ class BufferedTilemapRenderer(GameObject):
         if (surface==depth==None) and (flags==0):
             raise ValueError, "Need to pass a surface, depth, for flags"
 
+        self.changed = None
+
         if surface:
             for i, t in enumerate(self.tilemap.images):
                 if t: self.tilemap.images[i] = t.convert(surface)
@@ -233,72 +320,240 @@ class BufferedTilemapRenderer(GameObject):
             self.buffer = self.buffer.convert(depth, flags)
 
 
-    def queueEdgeTiles(self, (x, y)):
+    def queueEdgeTiles(self, (x, y), skip=()):
         """
         add the tiles on the edge that need to be redrawn to the queue.
-        uses a iterator for the queue
+        cells in skip are not queued.
         override if you want a different type of queue
         """
 
-        if self.queue is None:
-            self.queue = iter([])
-
+        view = self.view
 
         # right
         if x > 0:
-            p=product(xrange(self.view.right+1, self.view.right-x,-1),
-                      xrange(self.view.top, self.view.bottom + 2),
-                      xrange(len(self.tmx.visibleTileLayers)))
-            self.queue = chain(p, self.queue) 
+            self.queueRegion((view.right + 2 - x, view.top,
+                              view.right + 1, view.bottom + 1), skip)
 
         # left
         elif x < 0:
-            p=product(xrange(self.view.left, self.view.left - x),
-                      xrange(self.view.top, self.view.bottom + 2),
-                      xrange(len(self.tmx.visibleTileLayers)))
-            self.queue = chain(p, self.queue) 
+            self.queueRegion((view.left, view.top,
+                              view.left - x - 1, view.bottom + 1), skip)
 
         # bottom
         if y > 0:
-            p=product(xrange(self.view.left, self.view.right + 2),
-                      xrange(self.view.bottom+1, self.view.bottom-y, -1),
-                      xrange(len(self.tmx.visibleTileLayers)))
-            self.queue = chain(p, self.queue) 
+            self.queueRegion((view.left, view.bottom + 2 - y,
+                              view.right + 1, view.bottom + 1), skip)
 
         # top
         elif y < 0:
-            p=product(xrange(self.view.left, self.view.right + 2),
-                      xrange(self.view.top, self.view.top - y),
-                      xrange(len(self.tmx.visibleTileLayers)))
-            self.queue = chain(p, self.queue)
+            self.queueRegion((view.left, view.top,
+                              view.right + 1, view.top - y - 1), skip)
+
+
+    def queueRegion(self, (x0, y0, x1, y1), skip=()):
+        """
+        queue the cells between two corners, inclusive.  cells outside the
+        buffer, already in the queue, or in skip are ignored.
+        """
+
+        view = self.view
+        x0 = max(x0, view.left)
+        y0 = max(y0, view.top)
+        x1 = min(x1, view.right + 1)
+        y1 = min(y1, view.bottom + 1)
+
+        queue = self.queue
+        queued = self.queued
+        push = heapq.heappush
+        distance = self.screenDistance
+        screen = self.visibleTiles()
+
+        for y in xrange(y0, y1 + 1):
+            for x in xrange(x0, x1 + 1):
+                if (x, y) in queued or (x, y) in skip: continue
+                queued.add((x, y))
+                push(queue, (distance((x, y), screen), x, y))
+
+
+    def requeue(self):
+        """
+        drop cells that are outside the buffer from the queue and sort the
+        rest by their distance to the screen
+        """
 
+        if not self.queue:
+            return
+
+        view = self.view
+        left, top = view.left, view.top
+        right, bottom = view.right + 1, view.bottom + 1
+        distance = self.screenDistance
+        screen = self.visibleTiles()
+
+        queue = []
+        queued = self.queued
+        for p, x, y in self.queue:
+            if (x, y) not in queued:
+                continue
+            elif left <= x <= right and top <= y <= bottom:
+                queue.append((distance((x, y), screen), x, y))
+            else:
+                queued.discard((x, y))
+
+        heapq.heapify(queue)
+        self.queue = queue
+
+
+    def visibleTiles(self):
+        """
+        return the corners of the cells that are on the screen, inclusive
+        """
+
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        view = self.view
+
+        return (view.left + self.xoffset / tw,
+                view.top + self.yoffset / th,
+                min(view.left + (self.xoffset + self.size[0] - 1) / tw,
+                    view.right + 1),
+                min(view.top + (self.yoffset + self.size[1] - 1) / th,
+                    view.bottom + 1))
+
+
+    def screenDistance(self, (x, y), (x0, y0, x1, y1)):
+        """
+        return how many cells away from the screen a cell is.  0 is on it.
+        """
+
+        return max(x0 - x, 0, x - x1) + max(y0 - y, 0, y - y1)
 
+
+    def drawCell(self, surface, (x, y), (px, py), layers, color):
+        """
+        draw all the layers of a cell onto a surface
+        """
+
+        surface.fill(color, (px, py, self.tmx.tilewidth, self.tmx.tileheight))
+        getTile = self.getTileImage
+        blit = surface.blit
+        for l in layers:
+            image = getTile((x, y, l))
+            if image:
+                blit(image, (px, py))
+
+
+    def background(self):
+        """
+        return the color that empty cells are filled with
+        """
+
+        colorkey = self.buffer.get_colorkey()
+        if colorkey is None:
+            return (0, 0, 0)
+        return colorkey
+
+
+    @profiled("tilemap.update")
     def update(self, time=None):
         """
         the drawing operations and management of the buffer is handled here.
-        if you notice that the tiles are being drawn while the screen
-        is scrolling, you will need to adjust the number of tiles that are
-        bilt per update or increase update frequency.
+
+        tiles are drawn until the time budget for this frame is used up.  if
+        you notice that the tiles are being drawn while the screen is
+        scrolling, increase the budget or the update frequency.
         """
 
+        if self.budgetLeft <= 0:
+            return
+
+        if not self.queue and self.velocity == (0.0, 0.0):
+            return
+
+        start = default_timer()
+        deadline = start + self.budgetLeft / 1000000.0
+
         if self.queue:
-            bufblit = self.buffer.blit
-            getTile = self.getTileImage
-            ltw = self.tmx.tilewidth * self.view.left
-            tth = self.tmx.tileheight * self.view.top
-            tw = self.tmx.tilewidth
-            th = self.tmx.tileheight
+            layers = xrange(len(self.tmx.visibleTileLayers))
+            color = self.background()
+            pop = heapq.heappop
+            queue = self.queue
+            queued = self.queued
+            drawQueued = self.drawQueued
 
-            for i in range(self.blitPerUpdate):
-                try:
-                    x,y,l = next(self.queue)
-                except StopIteration:
-                    self.queue = None
-                    break
+            while queue:
+                p, x, y = pop(queue)
+                if (x, y) in queued:
+                    drawQueued((x, y), layers, color)
+                    if default_timer() >= deadline:
+                        break
 
-                image = getTile((x, y, l))
-                if image:
-                    bufblit(image, (x * tw - ltw, y * th - tth))
+        if not self.queue:
+            self.prefetch(deadline)
+
+        self.budgetLeft -= int((default_timer() - start) * 1000000)
+
+
+    def prefetch(self, deadline):
+        """
+        draw the next column and row beyond the buffer, in the direction that
+        the map is scrolling, until the deadline.  adjustView() will use them
+        instead of queueing the tiles.
+        """
+
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        view = self.view
+        velocity = self.velocity
+        layers = xrange(len(self.tmx.visibleTileLayers))
+        color = self.background()
+        drawCell = self.drawCell
+
+        # the axis that the map is moving on the most goes first
+        if abs(velocity[0]) >= abs(velocity[1]):
+            axes = (0, 1)
+        else:
+            axes = (1, 0)
+
+        for axis in axes:
+            v = velocity[axis]
+            if abs(v) < .5:
+                continue
+
+            if axis == 0:
+                line = view.right + 2 if v > 0 else view.left - 1
+                lo, hi = view.top, view.bottom + 2
+                size = (tw, self.bufferHeight)
+            else:
+                line = view.bottom + 2 if v > 0 else view.top - 1
+                lo, hi = view.left, view.right + 2
+                size = (self.bufferWidth, th)
+
+            strip = self.strips[axis]
+            if strip is None or strip[0] != line or \
+               abs(strip[1] - lo) > (hi - lo) / 2:
+                if strip is None:
+                    # same format as the buffer, but without the colorkey, so
+                    # the strip replaces what is in the buffer
+                    surface = pygame.Surface(size, 0, self.buffer)
+                else:
+                    surface = strip[2]
+                strip = [line, lo, surface, set()]
+                self.strips[axis] = strip
+
+            line, start, surface, drawn = strip
+            for c in xrange(max(lo, start), min(hi, start + hi - lo)):
+                if c in drawn: continue
+                drawn.add(c)
+                if axis == 0:
+                    drawCell(surface, (line, c), (0, (c - start) * th),
+                             layers, color)
+                else:
+                    drawCell(surface, (c, line), ((c - start) * tw, 0),
+                             layers, color)
+
+                if default_timer() >= deadline:
+                    return
 
 
     def draw(self, surface, rect, surfaces=[]):
@@ -313,6 +568,9 @@ class BufferedTilemapRenderer(GameObject):
 
         passing a list here will correctly draw the surfaces to create the
         illusion of depth.
+
+        returns a list of the rects of the surface that are different from
+        the last time that the map was drawn on it.
         """
 
         if self.blank:
@@ -324,15 +582,15 @@ class BufferedTilemapRenderer(GameObject):
         ox, oy = self.xoffset, self.yoffset
         ox -= rect.left
         oy -= rect.top
-        getTile = self.getTileImage
 
         # set clipping.  need to do this, otherwise the map will draw outside
         # its defined area.
         origClip = surface.get_clip()
         surface.set_clip(rect)
 
+        # tiles off the screen can wait for the next update
         if self.queue:
-            self.flushQueue()
+            self.flushVisible()
 
         # draw the entire map to the surface
         surblit(self.buffer, (-ox, -oy))
@@ -346,25 +604,331 @@ class BufferedTilemapRenderer(GameObject):
         #       collisions with other sprites, then those two are sorted
         #       finally, the 'sort' flag is set to 0 and draw order is saved
 
-        # redraw tiles that overlap surfaces that were passed in
-        for dirtyRect, layer in dirty:
-            dirtyRect = dirtyRect.move(ox, oy)
-            for r in self.layerQuadtree.hit(dirtyRect):
-                x, y, tw, th = r
-                layers = xrange(layer+1, len(self.tmx.visibleTileLayers))
-                for l in layers: 
-                    tile = getTile((x/tw + left, y/th + top, l))
-                    if tile:
-                        surblit(tile, (x-ox, y-oy))
+        # redraw tiles that overlap surfaces that were passed in.  first find
+        # the layers that need to be drawn in each cell, so a tile that covers
+        # more than one surface is only drawn once.
+        if dirty:
+            occupancy = self.occupancy
+            tw = self.tmx.tilewidth
+            th = self.tmx.tileheight
+
+            # the cells are a grid, so there is no need to search for the ones
+            # under a rect.  only cells in the buffer and the map are drawn.
+            x0, y0 = max(left, 0), max(top, 0)
+            x1 = min(left + self.view.width + 2, self.tmx.width)
+            y1 = min(top + self.view.height + 2, self.tmx.height)
+
+            cells = {}
+            for dirtyRect, layer in dirty:
+                if not dirtyRect:
+                    continue
+
+                above = -1 << (layer + 1)
+                rx, ry, rw, rh = dirtyRect
+                rx += ox
+                ry += oy
+                xs = xrange(max(rx / tw + left, x0),
+                            min((rx + rw - 1) / tw + left + 1, x1))
+                for y in xrange(max(ry / th + top, y0),
+                                min((ry + rh - 1) / th + top + 1, y1)):
+                    row = occupancy[y]
+                    for x in xs:
+                        mask = row[x] & above
+                        if mask:
+                            cells[(x, y)] = cells.get((x, y), 0) | mask
+
+            if cells:
+                self.drawOver(surblit, cells, (left*tw + ox, top*th + oy))
 
         # restore clipping area
         surface.set_clip(origClip)
 
-        if self.idle:
-            return [ i[0] for i in dirty ]
-        else:
+        # the updates until the next draw get a new budget
+        self.budgetLeft = self.timeBudget
+
+        return self.changedRects(surface, rect, surfaces, (ox, oy))
+
+
+    def changedRects(self, surface, rect, surfaces, (ox, oy)):
+        """
+        return the rects of the surface that are different from the last
+        draw().  if the map moved, all of it is.  if not, only the cells under
+        the surfaces that moved or changed, and the tiles drawn since then,
+        are.
+        """
+
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        position = (self.view.left * tw + ox, self.view.top * th + oy)
+        drawn = (surface, tuple(rect), position)
+        sprites = set((a[0], tuple(a[1].topleft), a[2]) for a in surfaces)
+
+        changed = self.changed
+        lastDraw, lastSurfaces = self.lastDraw, self.lastSurfaces
+        self.lastDraw, self.lastSurfaces = drawn, sprites
+        self.changed = []
+
+        if drawn != lastDraw or changed is None:
             return [ rect ]
 
+        # tiles are drawn over a whole cell, not just the part that a surface
+        # covers, so the cells under a surface change too
+        px, py = position
+        dirty = []
+        for image, (x, y), layer in sprites.symmetric_difference(lastSurfaces):
+            w, h = image.get_size()
+            x0 = (x + px) / tw * tw - px
+            y0 = (y + py) / th * th - py
+            x1 = (x + w + px + tw - 1) / tw * tw - px
+            y1 = (y + h + py + th - 1) / th * th - py
+            r = rect.clip(pygame.Rect(x0, y0, x1 - x0, y1 - y0))
+            if r:
+                dirty.append(r)
+
+        for r in changed:
+            r = rect.clip(r.move(-ox, -oy))
+            if r:
+                dirty.append(r)
+
+        return dirty
+
+
+    def drawOver(self, blit, cells, (ox, oy)):
+        """
+        draw the tiles of a dict of cell: layer bitmask, one layer at a time
+        """
+
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        images = self.tmx.images
+        items = cells.items()
+        l = 0
+        bits = reduce(lambda a, b: a | b, cells.itervalues())
+        while bits:
+            if bits & 1:
+                bit = 1 << l
+                data = self.tmx.tilelayers[l].data
+                for (x, y), mask in items:
+                    if mask & bit:
+                        blit(images[data[y][x]], (x*tw - ox, y*th - oy))
+            bits >>= 1
+            l += 1
+
+
+    def buildOccupancy(self):
+        """
+        make a bitmask for every cell of the map with a bit set for each
+        layer that has a tile there.  tiles with no visible pixels are
+        ignored.  used by draw() to skip cells that have nothing to draw over
+        the surfaces.
+        """
+
+        tmx = self.tmx
+        self.emptyGIDs = {0: True}
+        layers = xrange(len(tmx.visibleTileLayers))
+
+        if tmx.use_numpy:
+            import numpy
+
+            occupancy = numpy.zeros((tmx.height, tmx.width), numpy.uint32)
+            for l in layers:
+                data = numpy.asarray(tmx.tilelayers[l].data)
+                gids = numpy.unique(data)
+                filled = numpy.zeros(int(gids.max()) + 1, numpy.uint32)
+                for gid in gids:
+                    if not self.isEmpty(gid):
+                        filled[gid] = 1 << l
+                occupancy |= filled[data]
+
+        else:
+            occupancy = [ array("L", [0] * tmx.width)
+                          for y in xrange(tmx.height) ]
+            isEmpty = self.isEmpty
+            for l in layers:
+                bit = 1 << l
+                data = tmx.tilelayers[l].data
+                for row, gids in zip(occupancy, data):
+                    for x, gid in enumerate(gids):
+                        if not isEmpty(gid):
+                            row[x] |= bit
+
+        self.occupancy = occupancy
+
+
+    def isEmpty(self, gid):
+        """
+        return True if the tile for a gid does not draw anything.  the result
+        is cached.
+        """
+
+        try:
+            return self.emptyGIDs[gid]
+        except KeyError:
+            pass
+
+        try:
+            image = self.tmx.images[gid]
+        except (IndexError, TypeError):
+            image = None
+
+        if not image:
+            empty = True
+
+        # the mask of a surface with a surface alpha but no alpha channel is
+        # always empty, so only check surfaces that can have clear pixels
+        elif image.get_masks()[3] or image.get_colorkey() is not None:
+            empty = pygame.mask.from_surface(image).count() == 0
+
+        else:
+            empty = False
+
+        self.emptyGIDs[gid] = empty
+        return empty
+
+
+    def isOpaque(self, gids):
+        """
+        return True if the tiles of a cell, one gid for each layer, cover the
+        cell of the buffer, so nothing behind the map can be seen there.  the
+        result is cached.
+        """
+
+        try:
+            return self.opaqueCells[gids]
+        except KeyError:
+            pass
+
+        # draw the tiles the way they are drawn on the buffer, and look for
+        # pixels of the colorkey.  a tile can have pixels of the colorkey too.
+        colorkey = self.buffer.get_colorkey()
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        temp = pygame.Surface((tw, th), 0, self.buffer)
+        temp.fill(colorkey)
+        for gid in gids:
+            if gid:
+                image = self.tmx.images[gid]
+                if image:
+                    temp.blit(image, (0, 0))
+
+        temp.set_colorkey(colorkey)
+        opaque = pygame.mask.from_surface(temp).count() == tw * th
+
+        self.opaqueCells[gids] = opaque
+        return opaque
+
+
+    def cellGIDs(self, (x, y)):
+        data = [ self.tmx.tilelayers[l].data
+                 for l in xrange(len(self.tmx.visibleTileLayers)) ]
+        return tuple(int(d[y][x]) for d in data)
+
+
+    def buildOpacity(self):
+        """
+        make a row of bytes for every row of the map, that is 1 for each cell
+        that is covered by its tiles.  needs the colorkey of the buffer, so it
+        is made when it is first needed.
+        """
+
+        tmx = self.tmx
+        self.opaqueCells = {}
+        self.opacityKey = self.buffer.get_colorkey()
+        self.clearRuns = {}
+        isOpaque = self.isOpaque
+
+        data = [ tmx.tilelayers[l].data
+                 for l in xrange(len(tmx.visibleTileLayers)) ]
+        opacity = []
+        for y in xrange(tmx.height):
+            rows = [ d[y] for d in data ]
+            opacity.append(bytearray(isOpaque(tuple(int(r[x]) for r in rows))
+                                     for x in xrange(tmx.width)))
+
+        self.opacity = opacity
+
+
+    def transparentRects(self, rect):
+        """
+        return a list of rects of the surface where draw() will leave the
+        surface showing through the map, because the buffer has a colorkey.
+        anything behind the map only needs to be drawn in them.
+        """
+
+        colorkey = self.buffer.get_colorkey()
+        if colorkey is None:
+            return []
+
+        if self.opacity is None or self.opacityKey != colorkey:
+            self.buildOpacity()
+
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        left, top = self.view.topleft
+        ox = self.xoffset - rect.left
+        oy = self.yoffset - rect.top
+
+        # the cells on the surface.  the offset can be more than a cell, so
+        # the buffer doesn't always reach the far edges; those parts are
+        # clear too.
+        cells = (left + (rect.left + ox) / tw, top + (rect.top + oy) / th,
+                 left + (rect.right + ox - 1) / tw + 1,
+                 top + (rect.bottom + oy - 1) / th + 1)
+
+        # the runs of clear cells only change when the view moves a cell
+        runs = self.clearRuns.get(cells)
+        if runs is None:
+            runs = self.findClearRuns(cells)
+            self.clearRuns = {cells: runs}
+
+        rects = []
+        for x0, y0, x1, y1 in runs:
+            r = rect.clip(((x0 - left) * tw - ox, (y0 - top) * th - oy,
+                           (x1 - x0) * tw, (y1 - y0) * th))
+            if r:
+                rects.append(r)
+
+        return rects
+
+
+    def findClearRuns(self, (x0, y0, x1, y1)):
+        """
+        return (x0, y0, x1, y1) blocks of cells that are not opaque, from
+        runs in each row that are joined with the same runs below them
+        """
+
+        # cells that are on the map and in the buffer can be opaque
+        left, top = self.view.topleft
+        xa = max(x0, 0, left)
+        xb = min(x1, self.tmx.width, left + self.view.width + 2)
+        ya = max(y0, 0, top)
+        yb = min(y1, self.tmx.height, top + self.view.height + 2)
+
+        blocks = []
+        last = {}
+        for y in xrange(y0, y1):
+            line = bytearray(x1 - x0)
+            if ya <= y < yb and xa < xb:
+                line[xa - x0:xb - x0] = self.opacity[y][xa:xb]
+
+            runs = {}
+            i = line.find('\x00')
+            while i >= 0:
+                j = line.find('\x01', i)
+                if j < 0:
+                    j = len(line)
+                key = (i + x0, j + x0)
+                block = last.pop(key, None)
+                if block is None:
+                    block = [key[0], y, key[1], y]
+                    blocks.append(block)
+                block[3] = y + 1
+                runs[key] = block
+                i = line.find('\x00', j)
+            last = runs
+
+        return [ tuple(b) for b in blocks ]
+
 
     def flushQueue(self):
         """
@@ -372,17 +936,84 @@ class BufferedTilemapRenderer(GameObject):
         """
 
         if self.queue:
-            tw = self.tmx.tilewidth
-            th = self.tmx.tileheight
-            blit = self.buffer.blit
-            ltw = self.view.left * tw
-            tth = self.view.top * th
-            getTile = self.getTileImage
+            self.flushCells(self.queue)
+            self.queue = []
+            self.queued.clear()
+
+
+    def flushVisible(self):
+        """
+        draw the tiles in the queue that are on the screen
+        """
 
-            images = ifilter(lambda x: x[1], ((i, getTile(i)) for i in self.queue))
-            [ blit(image, (x*tw-ltw, y*th-tth)) for ((x,y,l), image) in images ]
+        x0, y0, x1, y1 = self.visibleTiles()
+        visible = [ item for item in self.queue
+                    if x0 <= item[1] <= x1 and y0 <= item[2] <= y1 ]
 
-            self.queue = None
+        if visible:
+            self.flushCells(visible)
+            queued = self.queued
+            queue = [ item for item in self.queue
+                      if (item[1], item[2]) in queued ]
+            heapq.heapify(queue)
+            self.queue = queue
+
+
+    def flushCells(self, cells):
+        layers = xrange(len(self.tmx.visibleTileLayers))
+        color = self.background()
+        queued = self.queued
+        drawQueued = self.drawQueued
+
+        for p, x, y in cells:
+            if (x, y) in queued:
+                drawQueued((x, y), layers, color)
+
+
+    def drawQueued(self, (x, y), layers, color):
+        """
+        draw a cell from the queue onto the buffer.  the cells that are drawn
+        must be removed from self.queued; entries in the heap for cells that
+        are not in self.queued are ignored.
+        """
+
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        px = (x - self.view.left) * tw
+        py = (y - self.view.top) * th
+
+        self.queued.discard((x, y))
+        self.drawCell(self.buffer, (x, y), (px, py), layers, color)
+        if self.changed is not None:
+            self.changed.append(pygame.Rect(px, py, tw, th))
+
+
+    def setTileGID(self, (x, y, l), gid):
+        """
+        change the tile at this location and redraw it
+        """
+
+        self.tmx.setTileGID(x, y, l, gid)
+
+        if self.isEmpty(gid):
+            self.occupancy[y][x] &= ~(1 << l)
+        else:
+            self.occupancy[y][x] |= 1 << l
+
+        if self.opacity is not None:
+            self.opacity[y][x] = self.isOpaque(self.cellGIDs((x, y)))
+            self.clearRuns = {}
+
+        self.invalidate((x, y))
+
+
+    def invalidate(self, (x, y)):
+        """
+        call when a tile has changed so the cell will be redrawn
+        """
+
+        self.strips = [None, None]
+        self.queueRegion((x, y, x, y))
 
 
     def redraw(self):
@@ -393,10 +1024,12 @@ class BufferedTilemapRenderer(GameObject):
         buffer.  will be slow, you've been warned.
         """
 
-        self.queue = product(xrange(self.view.left, self.view.right + 2),
-                             xrange(self.view.top, self.view.bottom + 2),
-                             xrange(len(self.tmx.visibleTileLayers)))
-
+        self.queue = []
+        self.queued.clear()
+        self.strips = [None, None]
+        self.changed = None
+        self.queueRegion((self.view.left, self.view.top,
+                          self.view.right + 1, self.view.bottom + 1))
         self.flushQueue()
 
 
@@ -412,6 +1045,229 @@ class BufferedTilemapRenderer(GameObject):
 
 
 
+class ChunkedTilemapRenderer(BufferedTilemapRenderer):
+    """
+    Renderer that draws the map in chunks of tiles instead of single tiles.
+
+    Each chunk is a block of cells with all the layers drawn on it, so the
+    buffer can be filled with a few large blits from the chunks instead of a
+    blit for every tile of every layer.  Chunks are made when they are first
+    needed and kept in a cache; when the cache is larger than chunkMemory
+    (in bytes), the chunks that were used least recently are thrown away.
+    Instead of drawing the next column and row, update() makes the chunks
+    that the map is scrolling towards.
+
+    The map is treated as static.  To change a tile, use setTileGID() so that
+    the chunk it is in will be made again.
+    """
+
+    def __init__(self, tmx, size, **kwargs):
+        self.chunkSize = kwargs.get("chunkSize", (8, 8))
+        self.chunkMemory = kwargs.get("chunkMemory", 32 * 1024 * 1024)
+        self.chunks = OrderedDict()
+        self.chunkBytes = 0
+
+        # chunk: rect of the cells in it that need to be drawn, in cells
+        self.dirty = {}
+
+        BufferedTilemapRenderer.__init__(self, tmx, size, **kwargs)
+
+
+    def getChunk(self, key, layers, color):
+        """
+        return the chunk surface for the chunk at this location, in chunks
+        """
+
+        try:
+            chunk = self.chunks.pop(key)
+        except KeyError:
+            chunk = self.makeChunk(key, layers, color)
+            w, h = chunk.get_size()
+            self.chunkBytes += w * h * chunk.get_bytesize()
+
+            # the chunk that was just made is not in the cache yet, so it
+            # will never be thrown away here
+            while self.chunks and self.chunkBytes > self.chunkMemory:
+                old = self.chunks.popitem(last=False)[1]
+                w, h = old.get_size()
+                self.chunkBytes -= w * h * old.get_bytesize()
+
+        self.chunks[key] = chunk
+        return chunk
+
+
+    def makeChunk(self, (cx, cy), layers, color):
+        """
+        draw all the layers of the cells in a chunk onto a new surface
+        """
+
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        cw, ch = self.chunkSize
+
+        # same format as the buffer, but without the colorkey
+        chunk = pygame.Surface((cw * tw, ch * th), 0, self.buffer)
+        chunk.fill(color)
+
+        getTile = self.getTileImage
+        blit = chunk.blit
+        for y in xrange(ch):
+            for x in xrange(cw):
+                for l in layers:
+                    image = getTile((cx * cw + x, cy * ch + y, l))
+                    if image:
+                        blit(image, (x * tw, y * th))
+
+        return chunk
+
+
+    def queueRegion(self, (x0, y0, x1, y1), skip=()):
+        """
+        queue the cells between two corners, inclusive.
+
+        the cells are kept as one rect for each chunk.  the heap holds the
+        cell of each rect that is closest to the screen, so the rect is
+        drawn as soon as any of its cells are needed.
+        """
+
+        view = self.view
+        x0 = max(x0, view.left)
+        y0 = max(y0, view.top)
+        x1 = min(x1, view.right + 1)
+        y1 = min(y1, view.bottom + 1)
+        if x0 > x1 or y0 > y1:
+            return
+
+        cw, ch = self.chunkSize
+        dirty = self.dirty
+        for cy in xrange(y0 // ch, y1 // ch + 1):
+            for cx in xrange(x0 // cw, x1 // cw + 1):
+                rect = (max(x0, cx * cw), max(y0, cy * ch),
+                        min(x1, cx * cw + cw - 1), min(y1, cy * ch + ch - 1))
+                try:
+                    old = dirty[(cx, cy)]
+                except KeyError:
+                    dirty[(cx, cy)] = rect
+                else:
+                    dirty[(cx, cy)] = (min(rect[0], old[0]),
+                                       min(rect[1], old[1]),
+                                       max(rect[2], old[2]),
+                                       max(rect[3], old[3]))
+
+        self.requeue()
+
+
+    def requeue(self):
+        """
+        clip the queued rects to the buffer and sort them by their distance
+        to the screen
+        """
+
+        view = self.view
+        left, top = view.left, view.top
+        right, bottom = view.right + 1, view.bottom + 1
+        sx0, sy0, sx1, sy1 = self.visibleTiles()
+
+        dirty = self.dirty
+        queue = []
+        queued = set()
+        for key, (x0, y0, x1, y1) in dirty.items():
+            x0 = max(x0, left)
+            y0 = max(y0, top)
+            x1 = min(x1, right)
+            y1 = min(y1, bottom)
+            if x0 > x1 or y0 > y1:
+                del dirty[key]
+                continue
+
+            dirty[key] = (x0, y0, x1, y1)
+
+            # the closest cell to the screen
+            x = min(max(sx0, x0), x1)
+            y = min(max(sy0, y0), y1)
+            p = max(sx0 - x, 0, x - sx1) + max(sy0 - y, 0, y - sy1)
+            queue.append((p, x, y))
+            queued.add((x, y))
+
+        heapq.heapify(queue)
+        self.queue = queue
+        self.queued = queued
+
+
+    def drawQueued(self, (x, y), layers, color):
+        """
+        draw the queued rect of the chunk that this cell is in
+        """
+
+        tw = self.tmx.tilewidth
+        th = self.tmx.tileheight
+        cw, ch = self.chunkSize
+        cx, cy = x // cw, y // ch
+        view = self.view
+
+        self.queued.discard((x, y))
+        x0, y0, x1, y1 = self.dirty.pop((cx, cy))
+
+        chunk = self.getChunk((cx, cy), layers, color)
+        r = self.buffer.blit(chunk,
+                             ((x0 - view.left) * tw, (y0 - view.top) * th),
+                             ((x0 - cx * cw) * tw, (y0 - cy * ch) * th,
+                              (x1 - x0 + 1) * tw, (y1 - y0 + 1) * th))
+        if self.changed is not None:
+            self.changed.append(r)
+
+
+    def flushQueue(self):
+        BufferedTilemapRenderer.flushQueue(self)
+        self.dirty.clear()
+
+
+    def prefetch(self, deadline):
+        """
+        make the chunks just beyond the buffer, in the direction that the
+        map is scrolling, until the deadline
+        """
+
+        cw, ch = self.chunkSize
+        view = self.view
+        vx, vy = self.velocity
+        keys = []
+
+        if abs(vx) >= .5:
+            cx = (view.right + 2 if vx > 0 else view.left - 1) // cw
+            keys.extend((cx, cy) for cy in xrange(view.top // ch,
+                                                  (view.bottom + 1) // ch + 1))
+
+        if abs(vy) >= .5:
+            cy = (view.bottom + 2 if vy > 0 else view.top - 1) // ch
+            keys.extend((cx, cy) for cx in xrange(view.left // cw,
+                                                  (view.right + 1) // cw + 1))
+
+        mw = (self.tmx.width - 1) // cw
+        mh = (self.tmx.height - 1) // ch
+        layers = xrange(len(self.tmx.visibleTileLayers))
+        color = self.background()
+        for key in keys:
+            if key in self.chunks or not (0 <= key[0] <= mw and \
+                                          0 <= key[1] <= mh):
+                continue
+
+            self.getChunk(key, layers, color)
+            if default_timer() >= deadline:
+                return
+
+
+    def invalidate(self, (x, y)):
+        cw, ch = self.chunkSize
+        chunk = self.chunks.pop((x // cw, y // ch), None)
+        if chunk is not None:
+            w, h = chunk.get_size()
+            self.chunkBytes -= w * h * chunk.get_bytesize()
+
+        BufferedTilemapRenderer.invalidate(self, (x, y))
+
+
+
 class ShadowMask(object):
     """
     Renders shadows onto a map by blitting black tiles with dittered tiles, or
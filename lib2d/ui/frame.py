@@ -1,4 +1,5 @@
 from lib2d.ui.element import Element
+import pygame
 
 
 
@@ -26,4 +27,20 @@ class Frame(Element):
 
 
     def draw(self, surface):
-        return [ e.draw(surface) for e in self.packer.elements ]
+        """
+        draw the elements and return a list of the rects that changed.  if an
+        element doesn't say what it changed, None is returned, meaning that
+        anything could have.
+        """
+
+        dirty = []
+        for e in self.packer.elements:
+            rects = e.draw(surface)
+            if rects is None or dirty is None:
+                dirty = None
+            elif isinstance(rects, pygame.Rect):
+                dirty.append(rects)
+            else:
+                dirty.extend(rects)
+
+        return dirty
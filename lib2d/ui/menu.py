@@ -19,7 +19,7 @@ along with lib2d.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 from lib2d.ui import Element
-from lib2d import res, banner
+from lib2d import res, text
 
 from collections import namedtuple
 from pygame.locals import *
@@ -27,8 +27,8 @@ import pygame
 
 
 
-def OutlinedFactory(text, font, size, color):
-    return banner.outlinedText(text, font, size, color, True, None)
+def OutlinedFactory(label, font, size, color):
+    return text.outlinedText(label, font, size, color)
 
 
 MenuOption = namedtuple('MenuOption', 'label callback image')
@@ -124,6 +124,7 @@ class Menu(Element):
             self.options.append(option)
 
         self.points = []
+        self.drawn = []                           # images from the last draw
 
         self.update_buttons = True
 
@@ -133,8 +134,16 @@ class Menu(Element):
             rects = [ o.image.get_rect() for o in self.options ]
             self.points = positionRects(rects, self.alignment, self.spacing, self.rect.topleft)
             self.update_buttons = False
+            self.drawn = []
 
-        return [ surface.blit(o.image, self.points[i]) for i, o in enumerate(self.options) ]
+        # the screen keeps what was drawn, so only the options that look
+        # different from the last draw need to be drawn again
+        drawn = self.drawn
+        self.drawn = [ o.image for o in self.options ]
+
+        return [ surface.blit(o.image, self.points[i])
+                 for i, o in enumerate(self.options)
+                 if i >= len(drawn) or drawn[i] is not o.image ]
 
 
     def handle_event(self, event):
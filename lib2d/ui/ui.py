@@ -15,8 +15,8 @@ this is a bare-bones simple draw toolkit for mouse use only.
 from lib2d.ui.packer import GridPacker
 from lib2d.ui import Element, Frame
 from lib2d.buttons import *
-from lib2d import res, draw, vec
-import pygame, itertools
+from lib2d import res, draw, vec, text
+import pygame, itertools, weakref
 
 
 
@@ -142,7 +142,7 @@ class UserInterface(Frame):
         proportioned correctly.
         """
 
-        self.msgFont = pygame.font.Font((res.fontPath("volter.ttf")), 9)
+        self.msgFont = text.getFont("volter.ttf", 9)
         self.border = draw.GraphicBox("dialog2-h.png", hollow=True)
         self.borderFilled = draw.GraphicBox("dialog2.png")
         self.paneManager = None
@@ -163,9 +163,7 @@ class UserInterface(Frame):
 
 
     def draw(self, surface):
-        Frame.draw(self, surface)
-
-        return
+        return Frame.draw(self, surface)
 
         x, y, w, h = self.rect
         back_width = x+int((w*.70))
@@ -249,7 +247,7 @@ class VirtualAvatarElement(Element):
 
     def draw(self, surface):
         #pygame.draw.rect(surface, (0,255,0,64), self.rect, 1)
-        pass
+        return []
 
     def onClick(self, point, button):
         print "clicked", self.avatar
@@ -270,7 +268,7 @@ class VirtualMapElement(Element):
             self.shift((-dx, -dy))
             self.oldExtent = self.camera.extent.copy()
                 
-        self.camera.draw(surface, self.rect)
+        return self.camera.draw(surface, self.rect)
 
 
     def onClick(self, point, button):
@@ -296,7 +294,8 @@ class ViewPort(Frame):
     coordinates (so elements move with the map when scrolled)
     """
 
-    loadedAreas = []
+    # areas that were loaded; an area that was evicted can be freed
+    loadedAreas = weakref.WeakSet()
 
 
     def __init__(self, frame, area):
@@ -305,7 +304,7 @@ class ViewPort(Frame):
         self.map_element = None
 
         if area not in self.loadedAreas:
-            self.loadedAreas.append(area)
+            self.loadedAreas.add(area)
             area.loadAll()
 
             # load sounds from area
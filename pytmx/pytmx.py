@@ -45,7 +45,7 @@ class TiledMap(TiledElement):
     reserved = "version orientation width height tilewidth tileheight properties tileset layer objectgroup".split()
 
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, use_numpy=False):
         from collections import defaultdict
 
         TiledElement.__init__(self)
@@ -76,6 +76,10 @@ class TiledMap(TiledElement):
         self.imagemap = {}  # mapping of gid and trans flags to real gids
         self.maxgid = 1
 
+        # store the layer data in numpy arrays instead of python arrays.
+        # loading is much faster for large maps.  requires numpy.
+        self.use_numpy = use_numpy
+
         if filename: self.load()
 
 
@@ -108,6 +112,26 @@ class TiledMap(TiledElement):
                 raise Exception, msg.format(x, y, layer, gid)
 
 
+    def getTileArea(self, x, y, layer):
+        """
+        return a tuple of the surface and area to blit the tile at this
+        location.  if the map was loaded as an atlas, the surface is the
+        tileset image; otherwise it is the tile image and the area is None.
+
+        return value will be None if there is no tile with that location.
+
+        >>> surface.blit(image, position, area)
+        """
+
+        gid = self.getTileGID(x, y, layer)
+        try:
+            return self.images.area(gid)
+        except AttributeError:
+            image = self.images[gid]
+            if image:
+                return image, None
+
+
     def getTileGID(self, x, y, layer):
         """
         return GID of a tile in this location
@@ -121,6 +145,19 @@ class TiledMap(TiledElement):
             raise Exception, msg.format(x, y, layer)
 
 
+    def setTileGID(self, x, y, layer, gid):
+        """
+        change the GID of a tile in this location
+        the GID is the one used internally, see registerGID
+        """
+
+        try:
+            self.tilelayers[int(layer)].data[int(y)][int(x)] = gid
+        except (IndexError, ValueError):
+            msg = "Coords: ({0},{1}) in layer {2} is invalid"
+            raise Exception, msg.format(x, y, layer)
+
+
     def getDrawOrder(self):
         """
         return a list of objects in the order that they should be drawn
@@ -461,17 +498,95 @@ class TiledLayer(TiledElement):
         """
         parse a layer element
         """
-        from utils import group
         from itertools import product, imap
         from struct import unpack
         import array
 
         self.set_properties(node)
 
-        data = None
-        next_gid = None
+        if self.parent.use_numpy:
+            return self.parseNumpy(node)
+
+        encoding, data = self.decode(node.find('data'))
+
+        if encoding is None:
+            # data is a list of gids from tile elements
+            next_gid = iter(data)
+
+        elif encoding == "csv":
+            next_gid = imap(int, data.split(","))
+
+        else:
+            # data is a list of gid's. cast as 32-bit ints to format properly
+            # unpack them all at once; it is much faster than one at a time
+            next_gid = iter(unpack("<{0}L".format(len(data) / 4), data))
+
+        # using shorts here limits the layer to 65536 unique tiles
+        [ self.data.append(array.array("H")) for i in xrange(self.height) ]
+
+        for (y, x) in product(xrange(self.height), xrange(self.width)):
+            self.data[y].append(self.parent.registerGID(*decode_gid(next(next_gid))))
+
 
-        data_node = node.find('data')
+    def parseNumpy(self, node):
+        """
+        parse the layer data into a 2d numpy array
+
+        the entire layer is decoded at once, then the gids are remapped with
+        a lookup table.  registerGID is only called once for each unique gid
+        in the layer, not for every tile.
+
+        the array can be indexed like the normal layer data:
+        >>> gid = layer.data[y][x]
+        """
+
+        try:
+            import numpy
+        except ImportError:
+            msg = "Numpy is required to load maps with use_numpy=True."
+            raise ImportError, msg
+
+        encoding, data = self.decode(node.find('data'))
+
+        if encoding is None:
+            raw = numpy.fromiter(data, numpy.uint32)
+
+        elif encoding == "csv":
+            raw = numpy.fromstring(data, numpy.uint32, sep=",")
+
+        else:
+            raw = numpy.frombuffer(data, "<u4")
+
+        if len(raw) != self.width * self.height:
+            msg = "Layer \"{0}\" has {1} tiles, but should have {2}."
+            raise Exception, msg.format(self.name, len(raw),
+                                        self.width * self.height)
+
+        # remap each unique gid once, then apply it to the whole layer
+        gids, inverse = numpy.unique(raw, return_inverse=True)
+        register = self.parent.registerGID
+        lut = [ register(*decode_gid(int(gid))) for gid in gids ]
+
+        if lut and max(lut) > 65535:
+            dtype = numpy.uint32
+        else:
+            dtype = numpy.uint16
+
+        lut = numpy.array(lut, dtype)
+        self.data = lut[inverse].reshape((self.height, self.width))
+
+
+    def decode(self, data_node):
+        """
+        decode and decompress the data element of a layer
+
+        returns a tuple of the encoding and the data.  for base64, the data is
+        a string of 32-bit little endian gids; for csv, it is the text of the
+        gids without whitespace; and if there is no encoding, it is a list of
+        gids read from the tile elements.
+        """
+
+        data = None
 
         encoding = data_node.get("encoding", None)
         if encoding == "base64":
@@ -479,9 +594,7 @@ class TiledLayer(TiledElement):
             data = decodestring(data_node.text.strip())
 
         elif encoding == "csv":
-            next_gid = imap(int, "".join(
-                line.strip() for line in data_node.text.strip()
-                ).split(","))
+            data = "".join(line.strip() for line in data_node.text.strip())
 
         elif encoding:
             msg = "TMX encoding type: {0} is not supported."
@@ -501,30 +614,15 @@ class TiledLayer(TiledElement):
 
         elif compression:
             msg = "TMX compression type: {0} is not supported."
-            raise Exception, msg.format(str(attr["compression"]))
-     
-        # if data is None, then it was not decoded or decompressed, so
-        # we assume here that it is going to be a bunch of tile elements
-        # TODO: this will probably raise an exception if there are no tiles
-        if encoding == next_gid is None:
-            def get_children(parent):
-                for child in parent.findall('tile'):
-                    yield int(child.get('gid'))
-
-            next_gid = get_children(data_node)
-
-        elif data:
-            # data is a list of gid's. cast as 32-bit ints to format properly
-            # create iterator to efficiently parse data
-            next_gid=imap(lambda i:unpack("<L", "".join(i))[0], group(data, 4))
+            raise Exception, msg.format(compression)
 
-        # using bytes here limits the layer to 256 unique tiles
-        # may be a limitation for very detailed maps, but most maps are not
-        # so detailed. 
-        [ self.data.append(array.array("B")) for i in xrange(self.height) ]
+        # if there is no encoding, then we assume here that it is going to be
+        # a bunch of tile elements
+        # TODO: this will probably raise an exception if there are no tiles
+        if encoding is None:
+            data = [ int(child.get('gid')) for child in data_node.findall('tile') ]
 
-        for (y, x) in product(xrange(self.height), xrange(self.width)):
-            self.data[y].append(self.parent.registerGID(*decode_gid(next(next_gid))))
+        return encoding, data
 
 
 class TiledObjectGroup(TiledElement, list):
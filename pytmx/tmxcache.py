@@ -0,0 +1,355 @@
+"""
+Compiled map cache for the pygame loader.
+
+Loading a TMX map means parsing the XML, decoding the layers, slicing the
+tileset images and checking every tile for transparent pixels.  This module
+saves the result of all that work next to the map, in a ".pytmxcache" folder,
+and uses it the next time the map is loaded.
+
+The cache is used only when the files it was built from are unchanged.  The
+TMX, any external TSX tilesets, and the tileset images are checked.  If the
+mtime or size of a file has changed, the file is hashed and compared with the
+hash from when the cache was built, so touching a file will not force a
+rebuild.
+
+A cache file holds a small header (version and dependencies), the pickled
+TiledMap without images, and the pixels of every tile as strings with a flag
+if the tile has no transparent pixels.  If the map was loaded with
+use_numpy, the layers are saved as .npy files and memory-mapped when loaded.
+
+The pixels are stored before they are converted, so the same cache can be
+used with any of the options for load_pygame, including atlas.
+"""
+
+from tmxloader import load_tmx, iter_tiles_pygame, pygame_convert, \
+                      convert_options, TileAtlas
+import cPickle as pickle
+import hashlib, os, warnings
+
+
+CACHE_VERSION = 2
+CACHE_DIR = ".pytmxcache"
+ATLAS_HEIGHT = 4096     # blits can't reach pixels below 32767
+
+
+
+def cache_path(filename, use_numpy=False, cache_dir=None):
+    """
+    return the path of the cache file for a map
+
+    the cache is in a folder next to the map, unless cache_dir is given.  in
+    cache_dir, the name has a hash of the folder of the map, so maps with
+    the same name in different folders don't share a cache.
+    """
+
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    if use_numpy:
+        basename += ".np"
+
+    if cache_dir is None:
+        return os.path.join(dirname, CACHE_DIR, basename + ".cache")
+
+    folder = hashlib.sha1(dirname).hexdigest()[:8]
+    return os.path.join(cache_dir, "{0}-{1}.cache".format(basename, folder))
+
+
+def layer_path(path, index):
+    """
+    return the path of the .npy file for a layer
+    """
+
+    return "{0}.layer{1}.npy".format(path, index)
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(65536), ""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def dependencies(tmxdata):
+    """
+    return a list of the files that were used to load the map
+    """
+    from xml.etree import ElementTree
+
+    filename = os.path.abspath(tmxdata.filename)
+    dirname = os.path.dirname(filename)
+    files = [filename]
+
+    # external tilesets are not remembered by the TiledMap
+    for node in ElementTree.parse(filename).getroot().findall('tileset'):
+        source = node.get('source', None)
+        if source:
+            files.append(os.path.abspath(os.path.join(dirname, source)))
+
+    for t in tmxdata.tilesets:
+        files.append(os.path.abspath(os.path.join(dirname, t.source)))
+
+    deps = []
+    for path in files:
+        st = os.stat(path)
+        deps.append((path, st.st_mtime, st.st_size, file_hash(path)))
+
+    return deps
+
+
+def is_fresh(deps):
+    """
+    return True if none of the files have changed
+    """
+
+    for path, mtime, size, digest in deps:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+
+        if st.st_mtime == mtime and st.st_size == size:
+            continue
+
+        # the file was touched or changed.  only the hash will tell.
+        if st.st_size != size or file_hash(path) != digest:
+            return False
+
+    return True
+
+
+def build_records(tmxdata):
+    """
+    return a list of the pixels of every tile that is used in the map
+
+    each record is a tuple of gid, size, pixel format, pixel string, the
+    colorkey and surface alpha of the tile, the colorkey of the tileset and a
+    flag that is True if the tile has no transparent pixels.
+    """
+    from pygame import mask, SRCALPHA
+    import pygame
+
+    records = []
+    for gid, tile, colorkey in iter_tiles_pygame(tmxdata):
+        w, h = tile.get_size()
+        opaque = mask.from_surface(tile).count() == w * h
+
+        # keep the alpha channel only if the tileset image has one, so that
+        # the tile will be converted the same way when it is loaded.
+        if tile.get_flags() & SRCALPHA:
+            fmt = "RGBA"
+        else:
+            fmt = "RGB"
+
+        pixels = pygame.image.tostring(tile, fmt)
+        tilekey = tile.get_colorkey()
+        if tilekey is not None:
+            tilekey = tuple(tilekey)
+        if colorkey is not None:
+            colorkey = tuple(colorkey)
+
+        # flipped and rotated tiles may have a surface alpha, too
+        alpha = tile.get_alpha()
+
+        records.append((gid, (w, h), fmt, pixels, tilekey, alpha, colorkey,
+                        opaque))
+
+    return records
+
+
+def read_cache(path):
+    """
+    return the TiledMap and tile records from a cache file, or None if the
+    cache is missing or out of date
+    """
+
+    try:
+        fh = open(path, "rb")
+    except IOError:
+        return None
+
+    with fh:
+        unpickler = pickle.Unpickler(fh)
+        header = unpickler.load()
+        if header.get("version") != CACHE_VERSION:
+            return None
+
+        if not is_fresh(header["deps"]):
+            return None
+
+        tmxdata = unpickler.load()
+        records = unpickler.load()
+
+    if tmxdata.use_numpy:
+        import numpy
+
+        # copy on write, so the map can still be changed after it is loaded
+        for i, layer in enumerate(tmxdata.tilelayers):
+            layer.data = numpy.load(layer_path(path, i), mmap_mode="c")
+
+    return tmxdata, records
+
+
+def write_cache(path, tmxdata, records):
+    """
+    save the TiledMap and tile records to a cache file
+    """
+
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    header = {"version": CACHE_VERSION, "deps": dependencies(tmxdata)}
+
+    # images cannot be pickled.  numpy layers are saved on their own so that
+    # they can be memory-mapped.
+    images = tmxdata.images
+    layers = [ layer.data for layer in tmxdata.tilelayers ]
+    tmxdata.images = []
+
+    try:
+        if tmxdata.use_numpy:
+            import numpy
+
+            for i, layer in enumerate(tmxdata.tilelayers):
+                numpy.save(layer_path(path, i), layer.data)
+                layer.data = None
+
+        # write to a temporary file first so a half-written cache never
+        # gets used
+        temp = path + ".tmp"
+        with open(temp, "wb") as fh:
+            pickle.dump(header, fh, 2)
+            pickle.dump(tmxdata, fh, 2)
+            pickle.dump(records, fh, 2)
+
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp, path)
+
+    finally:
+        tmxdata.images = images
+        for layer, data in zip(tmxdata.tilelayers, layers):
+            layer.data = data
+
+
+def load_cached(filename, *args, **kwargs):
+    """
+    load a map for pygame, using the cache if it is fresh
+
+    accepts the same arguments as load_pygame.  if the cache cannot be
+    written, the map is still loaded.
+    """
+
+    tmxdata, records = read_cached(filename, *args, **kwargs)
+    return convert_cached(tmxdata, records, *args, **kwargs)
+
+
+def read_cached(filename, *args, **kwargs):
+    """
+    return the TiledMap and tile records of a map, from the cache if it is
+    fresh.  if not, the map is loaded and the cache is written.
+
+    the display is not used, so this can be run in another thread.
+    """
+
+    path = cache_path(filename, kwargs.get("use_numpy", False),
+                      kwargs.get("cache_dir", None))
+
+    try:
+        cached = read_cache(path)
+    except Exception:
+        # a damaged or incompatible cache is the same as no cache
+        cached = None
+
+    if cached is None:
+        tmxdata = load_tmx(filename, *args, **kwargs)
+        records = build_records(tmxdata)
+        try:
+            write_cache(path, tmxdata, records)
+        except (IOError, OSError), e:
+            msg = "Cannot write map cache {0}: {1}"
+            warnings.warn(msg.format(path, e), RuntimeWarning)
+    else:
+        tmxdata, records = cached
+        tmxdata.filename = filename
+
+    return tmxdata, records
+
+
+def convert_cached(tmxdata, records, *args, **kwargs):
+    """
+    make the images of the map from the tile records and return the map
+    """
+    import pygame
+
+    if kwargs.get("atlas", False):
+        return convert_cached_atlas(tmxdata, records, *args, **kwargs)
+
+    pixelalpha, force_colorkey = convert_options(kwargs)
+
+    tmxdata.images = [0] * tmxdata.maxgid
+    fromstring = pygame.image.fromstring
+    for gid, size, fmt, pixels, tilekey, alpha, colorkey, opaque in records:
+        tile = fromstring(pixels, size, fmt)
+        if tilekey is not None:
+            tile.set_colorkey(tilekey)
+        if alpha != tile.get_alpha():
+            tile.set_alpha(alpha)
+        if colorkey is not None:
+            colorkey = pygame.Color(*colorkey)
+        tmxdata.images[gid] = pygame_convert(tile, colorkey, force_colorkey,
+                                             pixelalpha, opaque)
+
+    return tmxdata
+
+
+def convert_cached_atlas(tmxdata, records, *args, **kwargs):
+    """
+    make the images of the map from the tile records as a TileAtlas
+
+    tiles that would be converted the same way are put one above the other in
+    surfaces up to ATLAS_HEIGHT tall, which are made from their pixels with
+    one call and converted once.  flipped and rotated tiles are in the
+    records already, so they are in the atlas, too.
+    """
+    import pygame
+
+    pixelalpha, force_colorkey = convert_options(kwargs)
+
+    groups = {}
+    for record in records:
+        gid, size, fmt, pixels, tilekey, alpha, colorkey, opaque = record
+        key = (size, fmt, tilekey, alpha, colorkey, opaque)
+        groups.setdefault(key, []).append((gid, pixels))
+
+    images = TileAtlas(tmxdata.maxgid, force_colorkey, pixelalpha)
+
+    for (size, fmt, tilekey, alpha, colorkey, opaque), tiles in \
+        sorted(groups.items()):
+
+        w, h = size
+        if colorkey is not None:
+            colorkey = pygame.Color(*colorkey)
+
+        count = max(1, ATLAS_HEIGHT / h)
+        for first in xrange(0, len(tiles), count):
+            chunk = tiles[first:first + count]
+            strip = pygame.image.fromstring("".join(p for g, p in chunk),
+                                            (w, h * len(chunk)), fmt)
+            if tilekey is not None:
+                strip.set_colorkey(tilekey)
+            if alpha != strip.get_alpha():
+                strip.set_alpha(alpha)
+
+            # subsurfaces of a RLE surface have to be decoded to be blitted
+            sheet = pygame_convert(strip, colorkey, force_colorkey,
+                                   pixelalpha, opaque, rle=False)
+            images.sheets.append(sheet)
+
+            for i, (gid, pixels) in enumerate(chunk):
+                rect = pygame.Rect(0, i * h, w, h)
+                images[gid] = sheet.subsurface(rect)
+                images.areas[gid] = (sheet, rect)
+
+    tmxdata.images = images
+    return tmxdata
@@ -114,6 +114,30 @@ Basic usage sample:
 The loader will correctly convert() or convert_alpha() each tile image, so you
 don't have to worry about that after you load the map.
 
+Large maps will load much faster if numpy is installed and "use_numpy" is set.
+The layer data will be stored in 2d numpy arrays, but can be used the same way:
+
+    >>> tmxdata = tmxloader.load_pygame("map.tmx", use_numpy=True)
+    >>> gid = tmxdata.tilelayers[0].data[y][x]
+
+load_pygame keeps a compiled copy of each map in a ".pytmxcache" folder next
+to the map.  It is used when the TMX, TSX and tileset images have not changed,
+so the XML, layer data and tileset images do not have to be processed again.
+To keep the cache in another folder, such as one the user can write to, or
+to disable it:
+
+    >>> tmxdata = tmxloader.load_pygame("map.tmx", cache_dir="/tmp/maps")
+    >>> tmxdata = tmxloader.load_pygame("map.tmx", cache=False)
+
+For maps with many tiles, the images can be loaded into an atlas.  The tiles
+that are used by the map are copied to a few surfaces, which are converted
+once, and the tiles are subsurfaces of them.  With the compiled cache, the
+surfaces are made straight from the cached pixels.
+
+    >>> tmxdata = tmxloader.load_pygame("map.tmx", atlas=True)
+    >>> surface, area = tmxdata.getTileArea(x, y, layer)
+    >>> screen.blit(surface, position, area)
+
 
 When you want to draw tiles, you simply call "getTileImage":
 
@@ -181,28 +205,37 @@ def load_tmx(filename, *args, **kwargs):
     # for .14 compatibility
     from pytmx import TiledMap
 
-    tiledmap = TiledMap(filename)
+    tiledmap = TiledMap(filename, kwargs.get("use_numpy", False))
     return tiledmap
 
 
 
-def pygame_convert(original, colorkey, force_colorkey, pixelalpha):
+def pygame_convert(original, colorkey, force_colorkey, pixelalpha,
+                   opaque=None, rle=True):
     """
     this method does several tests on a surface to determine the optimal
     flags and pixel format for each tile.
 
     this is done for the best rendering speeds and removes the need to
     convert() the images on your own
+
+    if it is already known if the tile has no transparent pixels, pass it as
+    opaque and the (slow) check will be skipped.
     """
     from pygame import Surface, mask, RLEACCEL
 
+    if not rle:
+        RLEACCEL = 0
+
     tile_size = original.get_size()
 
-    # count the number of pixels in the tile that are not transparent
-    px = mask.from_surface(original).count()
+    if opaque is None:
+        # count the number of pixels in the tile that are not transparent
+        px = mask.from_surface(original).count()
+        opaque = px == tile_size[0] * tile_size[1]
 
     # there are no transparent pixels in the image
-    if px == tile_size[0] * tile_size[1]:
+    if opaque:
         tile = original.convert()
 
     # there are transparent pixels, and set to force a colorkey
@@ -255,38 +288,24 @@ def load_images_pygame(tmxdata, mapping, *args, **kwargs):
     already done for you.
 
     """
-    from itertools import product
-    from pygame import Surface
-    import pygame, os
-
 
-    def handle_transformation(tile, flags):
-        if flags:
-            fx = flags & TRANS_FLIPX == TRANS_FLIPX
-            fy = flags & TRANS_FLIPY == TRANS_FLIPY
-            r  = flags & TRANS_ROT == TRANS_ROT
+    pixelalpha, force_colorkey = convert_options(kwargs)
 
-            if r:
-                # not sure why the flip is required...but it is.
-                newtile = pygame.transform.rotate(tile, 270)
-                newtile = pygame.transform.flip(newtile, 1, 0)
-
-                if fx or fy:
-                    newtile = pygame.transform.flip(newtile, fx, fy)
+    tmxdata.images = [0] * tmxdata.maxgid
 
-            elif fx or fy:
-                newtile = pygame.transform.flip(tile, fx, fy)
+    for gid, tile, colorkey in iter_tiles_pygame(tmxdata):
+        tile = pygame_convert(tile, colorkey, force_colorkey, pixelalpha)
+        tmxdata.images[gid] = tile
 
-            # preserve any flags that may have been lost after the transformation
-            return newtile.convert(tile)
-
-        else:
-            return tile
 
+def convert_options(kwargs):
+    """
+    return the pixelalpha and force_colorkey options from the keywords
+    """
+    import pygame
 
     pixelalpha     = kwargs.get("pixelalpha", False)
     force_colorkey = kwargs.get("force_colorkey", False)
-    force_bitdepth = kwargs.get("depth", False)
 
     if force_colorkey:
         try:
@@ -295,53 +314,332 @@ def load_images_pygame(tmxdata, mapping, *args, **kwargs):
             msg = "Cannot understand color: {0}"
             raise Exception, msg.format(force_colorkey)
 
-    tmxdata.images = [0] * tmxdata.maxgid
+    return pixelalpha, force_colorkey
+
+
+def handle_transformation(tile, flags):
+    import pygame
+
+    if flags:
+        fx = flags & TRANS_FLIPX == TRANS_FLIPX
+        fy = flags & TRANS_FLIPY == TRANS_FLIPY
+        r  = flags & TRANS_ROT == TRANS_ROT
+
+        if r:
+            # not sure why the flip is required...but it is.
+            newtile = pygame.transform.rotate(tile, 270)
+            newtile = pygame.transform.flip(newtile, 1, 0)
+
+            if fx or fy:
+                newtile = pygame.transform.flip(newtile, fx, fy)
+
+        elif fx or fy:
+            newtile = pygame.transform.flip(tile, fx, fy)
+
+        # preserve any flags that may have been lost after the transformation
+        return newtile.convert(tile)
+
+    else:
+        return tile
+
+
+def iter_tilesets_pygame(tmxdata):
+    """
+    load the tileset images
+
+    yields a tuple of the tileset, the unconverted image, the colorkey of the
+    tileset and an iterator of the real gid and the rect of each tile in the
+    image that is used in the map.
+    """
+    import pygame, os
 
     for firstgid, t in sorted((t.firstgid, t) for t in tmxdata.tilesets):
         path = os.path.join(os.path.dirname(tmxdata.filename), t.source)
 
         image = pygame.image.load(path)
 
-        w, h = image.get_size()
-        tile_size = (t.tilewidth, t.tileheight)
-        real_gid = t.firstgid - 1
-
         colorkey = None
         if t.trans:
             colorkey = pygame.Color("#{0}".format(t.trans)) 
 
-        # i dont agree with margins and spacing, but i'll support it anyway
-        # such is life.  okay.jpg
-        tilewidth = t.tilewidth + t.spacing
-        tileheight = t.tileheight + t.spacing
+        yield t, image, colorkey, tileset_rects(tmxdata, t, image.get_size())
+
 
-        # some tileset images may be slightly larger than the tile area
-        # ie: may include a banner, copyright, ect.  this compensates for that
-        width = ((int((w-t.margin*2) + t.spacing) / tilewidth) * tilewidth) - t.spacing
-        height = ((int((h-t.margin*2) + t.spacing) / tileheight) * tileheight) - t.spacing
+def tileset_rects(tmxdata, t, (w, h)):
+    from itertools import product
 
-        # using product avoids the overhead of nested loops
-        p = product(xrange(t.margin, height+t.margin, tileheight),
-                    xrange(t.margin, width+t.margin, tilewidth))
+    tile_size = (t.tilewidth, t.tileheight)
+    real_gid = t.firstgid - 1
 
-        for (y, x) in p:
-            real_gid += 1
-            gids = tmxdata.mapGID(real_gid)
-            if gids == []: continue
+    # i dont agree with margins and spacing, but i'll support it anyway
+    # such is life.  okay.jpg
+    tilewidth = t.tilewidth + t.spacing
+    tileheight = t.tileheight + t.spacing
 
-            original = image.subsurface(((x,y), tile_size))
+    # some tileset images may be slightly larger than the tile area
+    # ie: may include a banner, copyright, ect.  this compensates for that
+    width = ((int((w-t.margin*2) + t.spacing) / tilewidth) * tilewidth) - t.spacing
+    height = ((int((h-t.margin*2) + t.spacing) / tileheight) * tileheight) - t.spacing
 
-            for gid, flags in gids:
-                tile = handle_transformation(original, flags)
-                tile = pygame_convert(tile, colorkey, force_colorkey, pixelalpha)
-                tmxdata.images[gid] = tile
+    # using product avoids the overhead of nested loops
+    p = product(xrange(t.margin, height+t.margin, tileheight),
+                xrange(t.margin, width+t.margin, tilewidth))
 
+    for (y, x) in p:
+        real_gid += 1
+        if tmxdata.mapGID(real_gid) == []: continue
+        yield real_gid, ((x, y), tile_size)
 
-def load_pygame(filename, *args, **kwargs):
-    tmxdata = load_tmx(filename, *args, **kwargs)
-    load_images_pygame(tmxdata, None, *args, **kwargs)
 
-    return tmxdata
+def iter_tiles_pygame(tmxdata):
+    """
+    slice the tileset images into tiles
+
+    yields a tuple of the gid, the unconverted tile surface, and the colorkey
+    of the tileset for every tile that is used in the map.
+    """
+
+    for t, image, colorkey, rects in iter_tilesets_pygame(tmxdata):
+        for real_gid, rect in rects:
+            original = image.subsurface(rect)
+            for gid, flags in tmxdata.mapGID(real_gid):
+                yield gid, handle_transformation(original, flags), colorkey
+
+
+class TileAtlas(list):
+    """
+    list of tile images that share the pixels of a few large surfaces
+
+    the tiles of each tileset that are used are copied to one surface, and
+    the images are subsurfaces of it.  tiles that are flipped or rotated
+    cannot share the pixels, so they are made the first time that they are
+    used, then kept.
+
+    the tiles will look the same as the tiles from load_images_pygame.
+
+    can be used like the normal list of images:
+    >>> image = tmxdata.images[gid]
+
+    or, to blit from the tileset image directly:
+    >>> surface.blit(*tmxdata.images.area(gid))
+    """
+
+    def __init__(self, size, force_colorkey=False, pixelalpha=False):
+        list.__init__(self, [0] * size)
+        self.force_colorkey = force_colorkey
+        self.pixelalpha = pixelalpha
+        self.sheets = []            # converted tileset images
+        self.areas = [None] * size  # gid: (sheet, rect) for untransformed
+        self.pending = {}           # gid: (subsurface, flags, colorkey)
 
 
+    def __getitem__(self, gid):
+        image = list.__getitem__(self, gid)
+        if image is None:
+            image = self.makeVariant(gid)
+        return image
 
+
+    def __iter__(self):
+        return (self[i] for i in xrange(len(self)))
+
+
+    def area(self, gid):
+        """
+        return a tuple of the surface and area to blit the tile
+
+        for untransformed tiles, the surface is the atlas of the tileset.
+        returns None if there is no image for the gid.
+        """
+
+        area = self.areas[gid]
+        if area is None:
+            image = self[gid]
+            if image:
+                area = (image, image.get_rect())
+        return area
+
+
+    def makeVariant(self, gid):
+        original, flags, colorkey = self.pending.pop(gid)
+        image = handle_transformation(original, flags)
+        image = pygame_convert(image, colorkey, self.force_colorkey,
+                               self.pixelalpha)
+        self[gid] = image
+        return image
+
+
+def pack_tiles(image, rects, columns=16):
+    """
+    copy tiles from a tileset image into a new, smaller image.  the rects
+    must all be the same size.
+
+    returns the new image and a list of the positions of the tiles in it.
+    the tiles are copied exactly, including the alpha channel.
+    """
+    from pygame import Surface, SRCALPHA, BLEND_RGBA_MAX
+
+    tw, th = rects[0][1]
+    columns = min(columns, len(rects))
+    rows = (len(rects) + columns - 1) / columns
+    size = (columns * tw, rows * th)
+
+    if image.get_flags() & SRCALPHA:
+        # a normal blit would blend the alpha, so use the max of each
+        # channel with the empty (0,0,0,0) image to copy it.  the pixel
+        # format must be the same, or the tiles will blend differently.
+        packed = Surface(size, SRCALPHA, image.get_bitsize(),
+                         image.get_masks())
+        special_flags = BLEND_RGBA_MAX
+    else:
+        packed = Surface(size, 0, image)
+        if packed.get_bitsize() == 8:
+            packed.set_palette(image.get_palette())
+        special_flags = 0
+
+        # pixels that match the colorkey are not copied
+        colorkey = image.get_colorkey()
+        if colorkey:
+            packed.fill(colorkey)
+            packed.set_colorkey(colorkey)
+
+    positions = []
+    for i, rect in enumerate(rects):
+        pos = ((i % columns) * tw, (i / columns) * th)
+        packed.blit(image, pos, rect, special_flags)
+        positions.append(pos)
+
+    return packed, positions
+
+
+def tile_runs(positions, tilewidth):
+    """
+    yield the x, y and width of each row of tiles that are next to each other
+    """
+
+    run = None
+    for x, y in sorted(positions, key=lambda (x, y): (y, x)):
+        if run and run[1] == y and run[0] + run[2] == x:
+            run[2] += tilewidth
+        else:
+            if run: yield run
+            run = [x, y, tilewidth]
+    if run: yield run
+
+
+def load_atlas_pygame(tmxdata, mapping, *args, **kwargs):
+    """
+    load the tile images as subsurfaces of one surface for each tileset.
+
+    only the tiles that are used in the map are copied to the atlas.  there
+    are far fewer surfaces than with load_images_pygame, and each tileset is
+    converted once instead of every tile.  accepts the same options.
+    tmxdata.images will be a TileAtlas.
+    """
+    from pygame import mask, SRCALPHA, Rect
+
+    pixelalpha, force_colorkey = convert_options(kwargs)
+
+    images = TileAtlas(tmxdata.maxgid, force_colorkey, pixelalpha)
+
+    for t, image, colorkey, rects in iter_tilesets_pygame(tmxdata):
+        rects = list(rects)
+        tile_size = (t.tilewidth, t.tileheight)
+
+        for real_gid, rect in rects:
+            for gid, flags in tmxdata.mapGID(real_gid):
+                if flags:
+                    # made from the original image, like load_images_pygame.
+                    # the image is kept until every variant has been made.
+                    original = image.subsurface(rect)
+                    images.pending[gid] = (original, flags, colorkey)
+                    list.__setitem__(images, gid, None)
+
+        # flipped and rotated tiles are not kept in the atlas
+        rects = [ (real_gid, rect) for real_gid, rect in rects
+                  if any(not flags for gid, flags in tmxdata.mapGID(real_gid)) ]
+        if not rects:
+            continue
+
+        # copy the tiles to a smaller image if less than half of the
+        # tileset is used.  otherwise, the copy would just waste time.
+        w, h = image.get_size()
+        if len(rects) * t.tilewidth * t.tileheight * 2 < w * h:
+            packed, positions = pack_tiles(image, [ r for g, r in rects ])
+        else:
+            packed, positions = image, [ r[0] for g, r in rects ]
+
+        # subsurfaces of a RLE surface have to be decoded to be blitted
+        sheet = pygame_convert(packed, colorkey, force_colorkey, pixelalpha,
+                               rle=False)
+        images.sheets.append(sheet)
+
+        # load_images_pygame drops the alpha channel of tiles that have no
+        # transparent pixels.  copy those tiles over the sheet without alpha,
+        # so they look the same either way.
+        if packed.get_flags() & SRCALPHA:
+            packed_mask = mask.from_surface(packed)
+            full = mask.Mask(tile_size)
+            full.fill()
+            area = t.tilewidth * t.tileheight
+            opaque = [ pos for pos in positions
+                       if packed_mask.overlap_area(full, pos) == area ]
+
+            # tiles next to each other are copied in one blit
+            packed.set_alpha(None)
+            for x, y, w in tile_runs(opaque, t.tilewidth):
+                sheet.blit(packed, (x, y), ((x, y), (w, t.tileheight)))
+            packed.set_alpha(255)
+
+        for (real_gid, rect), pos in zip(rects, positions):
+            rect = Rect(pos, tile_size)
+            view = sheet.subsurface(rect)
+            for gid, flags in tmxdata.mapGID(real_gid):
+                if not flags:
+                    images[gid] = view
+                    images.areas[gid] = (sheet, rect)
+
+    tmxdata.images = images
+
+
+def read_pygame(filename, *args, **kwargs):
+    """
+    do the part of load_pygame that does not need the display: parse the map,
+    decode the layers and, if the cache is used, read or build the tiles.
+
+    this can be run in another thread.  returns a value that must be passed
+    to convert_pygame, with the same arguments, in the main thread.
+    """
+
+    if not kwargs.get("cache", True):
+        return load_tmx(filename, *args, **kwargs), None
+
+    # use the compiled map cache, unless told not to
+    from tmxcache import read_cached
+    return read_cached(filename, *args, **kwargs)
+
+
+def convert_pygame(loaded, *args, **kwargs):
+    """
+    load the images of a map that was read with read_pygame and return the
+    TiledMap
+    """
+
+    tmxdata, records = loaded
+
+    if records is not None:
+        from tmxcache import convert_cached
+        convert_cached(tmxdata, records, *args, **kwargs)
+
+    elif kwargs.get("atlas", False):
+        load_atlas_pygame(tmxdata, None, *args, **kwargs)
+
+    else:
+        load_images_pygame(tmxdata, None, *args, **kwargs)
+
+    return tmxdata
+
+
+def load_pygame(filename, *args, **kwargs):
+    loaded = read_pygame(filename, *args, **kwargs)
+    return convert_pygame(loaded, *args, **kwargs)
@@ -1,11 +1,19 @@
 from lib2d.game import Game
-from lib2d import gfx, context
+from lib2d import gfx, context, profiler, headless
 import pygame
 
 
 
 profile = 1
 
+# record the time of every frame, and write them to metrics.csv and
+# metrics.json when the game quits.  F3 shows them while playing.
+metrics = 0
+
+# save the commands given to each state to this file, to be played again by
+# utilities/replaybench.py
+record = None
+
 
 class TestGame(Game):
     def start(self):
@@ -13,11 +21,18 @@ class TestGame(Game):
         gfx.set_screen((1024, 600), 3, "scale")
         self.sd = context.ContextDriver(self, [], 60)
         self.sd.reload_screen()
+        if record:
+            self.sd.recorder = headless.Recording()
         self.sd.start(TitleScreen(self.sd))
         self.sd.run()
+        if record:
+            self.sd.recorder.save(record)
 
 
 if __name__ == "__main__":
+    if metrics:
+        profiler.enable()
+
     if profile:
         import cProfile
         import pstats
@@ -38,4 +53,9 @@ if __name__ == "__main__":
     else:
         TestGame().start()
 
+    if profiler.current:
+        print profiler.current.report()
+        profiler.current.dumpCSV("metrics.csv")
+        profiler.current.dumpJSON("metrics.json")
+
     pygame.quit()
@@ -0,0 +1,167 @@
+"""
+benchmark for the tile atlas
+
+loads the tile images of maps with a surface for every tile, and as an
+atlas, from the tileset images and from the compiled cache.  prints the time
+to load the images, the size of the tile pixels, the number of surfaces, and
+the growth of the resident memory of the process.  each load is done in a
+new process so the memory numbers do not interfere with each other.
+
+the maps in resources/maps only use a few tiles, so a map that uses 4096
+tiles is also made in a temporary folder.  run from the root of the project:
+
+    python utilities/atlasbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import timeit, glob, subprocess, tempfile, shutil, random, gc
+
+
+options = {"force_colorkey": (128,128,0)}
+big_size = 64       # width and height of the large map and tileset in tiles
+
+
+def resident():
+    # in kilobytes.  only works on linux.
+    try:
+        with open("/proc/self/statm") as fh:
+            pages = int(fh.read().split()[1])
+    except IOError:
+        return 0
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024
+
+
+def pixel_bytes(tmxdata):
+    """
+    return the number of bytes used for the tile pixels
+    """
+
+    seen = set()
+    total = 0
+    for image in list.__iter__(tmxdata.images):
+        if not image: continue
+        while image.get_parent():
+            image = image.get_parent()
+        if id(image) in seen: continue
+        seen.add(id(image))
+        w, h = image.get_size()
+        total += w * h * image.get_bytesize()
+    return total
+
+
+def surface_count(tmxdata):
+    """
+    return the number of surfaces that hold pixels
+    """
+
+    parents = set()
+    for image in list.__iter__(tmxdata.images):
+        if not image: continue
+        while image.get_parent():
+            image = image.get_parent()
+        parents.add(id(image))
+    return len(parents)
+
+
+def make_big_map(path):
+    """
+    make a map that uses every tile of a large random tileset.  one in eight
+    tiles is flipped.
+    """
+    import pygame
+
+    random.seed(0)
+    image = pygame.Surface((big_size * 16, big_size * 16), pygame.SRCALPHA)
+    for y in xrange(big_size):
+        for x in xrange(big_size):
+            color = [ random.randint(0, 255) for i in xrange(3) ]
+            color.append(255 if x % 4 else 0)
+            image.fill(color, (x * 16, y * 16, 16, 8))
+            image.fill(color[:3] + [255], (x * 16, y * 16 + 8, 16, 8))
+    pygame.image.save(image, os.path.join(path, "big.png"))
+
+    gids = []
+    for i in xrange(big_size * big_size):
+        gids.append(str(i + 1 | (1<<31 if i % 8 == 0 else 0)))
+
+    tmx = """<?xml version="1.0" encoding="UTF-8"?>
+<map version="1.0" orientation="orthogonal" width="{0}" height="{0}" tilewidth="16" tileheight="16">
+ <tileset firstgid="1" name="big" tilewidth="16" tileheight="16">
+  <image source="big.png" width="{1}" height="{1}"/>
+ </tileset>
+ <layer name="big" width="{0}" height="{0}">
+  <data encoding="csv">{2}</data>
+ </layer>
+</map>
+"""
+    filename = os.path.join(path, "big.tmx")
+    with open(filename, "w") as fh:
+        fh.write(tmx.format(big_size, big_size * 16, ",".join(gids)))
+
+    return filename
+
+
+def load(filename, mode):
+    """
+    load the map in this process and print the results
+    """
+    from pytmx import tmxloader, tmxcache
+
+    # only the images are timed.  parsing the map is the same either way.
+    if mode.endswith("cache"):
+        tmxcache.read_cached(filename)
+        tmxdata, records = tmxcache.read_cached(filename)
+        atlas = mode.startswith("atlas")
+        loader = lambda tmxdata, mapping, **kwargs: \
+                 tmxcache.convert_cached(tmxdata, records, atlas=atlas,
+                                         **kwargs)
+    else:
+        tmxdata = tmxloader.load_tmx(filename)
+        if mode == "atlas":
+            loader = tmxloader.load_atlas_pygame
+        else:
+            loader = tmxloader.load_images_pygame
+    gc.collect()
+
+    before = resident()
+    t = timeit.default_timer()
+    loader(tmxdata, None, **options)
+
+    # make the flipped tiles, too
+    used = [ tmxdata.images[gid] for gid in xrange(tmxdata.maxgid) ]
+    t = timeit.default_timer() - t
+    gc.collect()
+    after = resident()
+
+    print "{0:<14} {1:<11} images: {2:>8.1f} ms  pixels: {3:>6} kb  surfaces: {4:>5}  rss: {5:>+6} kb".format(
+          os.path.basename(filename), mode, t * 1000.0,
+          pixel_bytes(tmxdata) / 1024, surface_count(tmxdata), after - before)
+
+
+def run(filename):
+    for mode in ("tiles", "atlas", "tiles cache", "atlas cache"):
+        subprocess.call([sys.executable, __file__, filename, mode])
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    pygame.init()
+    pygame.display.set_mode((320, 240), 0, 32)
+
+    if len(sys.argv) == 3:
+        load(sys.argv[1], sys.argv[2])
+
+    else:
+        path = os.path.join(os.path.dirname(__file__), "..", "resources", "maps")
+        for filename in sorted(glob.glob(os.path.join(path, "*.tmx"))):
+            run(filename)
+
+        temp = tempfile.mkdtemp()
+        try:
+            run(make_big_map(temp))
+        finally:
+            shutil.rmtree(temp)
@@ -0,0 +1,93 @@
+"""
+benchmark for the cache of flipped and rotated avatar frames
+
+makes 200 avatars that play the hero walk animation.  every avatar has its
+own Animation and Image, like the ones made in lib/world.py.  half of them
+are flipped and 20 of them are rotating.  each frame, every avatar is
+updated and its image is read twice, like LevelCamera.draw does.
+
+the old way flipped and rotated the frame every time that the image was
+read.  run from the root of the project:
+
+    python utilities/avatarbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import timeit
+
+
+frames = 200
+count = 200
+rotating = 20
+
+
+def make_avatars():
+    from lib2d.avatar import Avatar
+    from lib2d.animation import Animation
+    from lib2d.image import Image
+
+    avatars = []
+    for i in xrange(count):
+        avatar = Avatar([Animation('walk', Image('hero-walk.png'),
+                                   range(10), 1, 70)])
+        avatar.loadAll()
+        avatar.flip = i % 2
+        avatar.timer = i * 7
+        avatars.append(avatar)
+
+    return avatars
+
+
+def old_image(avatar):
+    """
+    return the image of the avatar the way the image property used to
+    """
+    from pygame.transform import flip, rotate
+
+    image = avatar.curAnimation.getImage(avatar.curFrame, 0)
+    if avatar.angle:
+        image = rotate(image, avatar.angle)
+    if avatar.flip:
+        image = flip(image, 1, 0)
+    return image
+
+
+def run_frames(avatars, get_image):
+    for frame in xrange(frames):
+        for i, avatar in enumerate(avatars):
+            avatar.update(16)
+            if i < rotating:
+                avatar.angle = (avatar.angle - 2.0) % 360
+            get_image(avatar).get_size()
+            get_image(avatar)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    pygame.init()
+    pygame.display.set_mode((320, 240), 0, 32)
+
+    from lib2d import res
+    res._resPath = os.path.join(os.path.dirname(__file__), "..", "resources")
+
+    from lib2d import animation
+
+    avatars = make_avatars()
+    old = timeit.Timer(lambda: run_frames(avatars, old_image)).timeit(1)
+
+    avatars = make_avatars()
+    new = timeit.Timer(lambda: run_frames(avatars, lambda a: a.image))
+    cold = new.timeit(1)
+    warm = new.timeit(1)
+
+    print "{0} avatars, {1} frames".format(count, frames)
+    print "old:           {0:>7.3f} ms per frame".format(old / frames * 1000)
+    print "cached, cold:  {0:>7.3f} ms per frame".format(cold / frames * 1000)
+    print "cached, warm:  {0:>7.3f} ms per frame".format(warm / frames * 1000)
+    print "frame sets: {0}  transformed frames: {1}".format(
+          len(animation.frameSets),
+          sum(len(f.transformed) for f in animation.frameSets.values()))
@@ -0,0 +1,149 @@
+"""
+benchmark for the chunked tilemap renderer
+
+makes a large map with three layers in a temporary folder and scrolls a
+1920x1080 view over it, back and forth, with the buffered renderer and the
+chunked renderer.  each frame, the queue is flushed right after the view is
+moved, so the time of a frame is the full cost of scrolling the buffer.  the
+time to blit the buffer to the screen is the same for both and is left out.
+the first pass of the chunked renderer has to make the chunks; the second
+pass uses the cache.  run from the root of the project:
+
+    python utilities/chunkbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib2d"))
+
+from timeit import default_timer
+import tempfile, shutil, random, math
+
+
+size = (1920, 1080)
+map_size = (320, 160)       # in tiles
+speed = 8                   # pixels per frame
+
+
+def make_map(path):
+    """
+    make a map with a ground layer and two sparse layers on top of it
+    """
+    import pygame
+
+    random.seed(0)
+    image = pygame.Surface((256, 256))
+    image.fill((255, 0, 255))
+    for y in xrange(16):
+        for x in xrange(16):
+            color = [ random.randint(0, 254) for i in xrange(3) ]
+            image.fill(color, (x * 16 + 2, y * 16 + 2, 12, 12))
+    pygame.image.save(image, os.path.join(path, "chunk.png"))
+
+    w, h = map_size
+    layers = []
+    for density in (1.0, .3, .1):
+        gids = []
+        for i in xrange(w * h):
+            if random.random() < density:
+                gids.append(str(random.randint(1, 256)))
+            else:
+                gids.append("0")
+        layers.append(""" <layer name="layer" width="{0}" height="{1}">
+  <data encoding="csv">{2}</data>
+ </layer>""".format(w, h, ",".join(gids)))
+
+    tmx = """<?xml version="1.0" encoding="UTF-8"?>
+<map version="1.0" orientation="orthogonal" width="{0}" height="{1}" tilewidth="16" tileheight="16">
+ <tileset firstgid="1" name="chunk" tilewidth="16" tileheight="16">
+  <image source="chunk.png" trans="ff00ff" width="256" height="256"/>
+ </tileset>
+{2}
+</map>
+"""
+    filename = os.path.join(path, "chunk.tmx")
+    with open(filename, "w") as fh:
+        fh.write(tmx.format(w, h, "\n".join(layers)))
+
+    return filename
+
+
+def path(tmx):
+    """
+    return the camera positions for a trip across the map and back
+    """
+
+    mw = tmx.width * tmx.tilewidth
+    mh = tmx.height * tmx.tileheight
+    hw, hh = size[0] / 2, size[1] / 2
+
+    points = []
+    x, y = hw, hh
+    while x < mw - hw:
+        points.append((x, y + (mh - size[1]) / 2 * math.sin(x / 200.0) ** 2))
+        x += speed
+
+    return points + points[::-1]
+
+
+def stats(times):
+    mean = sum(times) / len(times)
+    var = sum((t - mean) ** 2 for t in times) / len(times)
+    return mean * 1000.0, math.sqrt(var) * 1000.0, max(times) * 1000.0
+
+
+def run(tmx, renderer, points, name):
+    import pygame
+
+    surface = pygame.Surface(size, 0, pygame.display.get_surface())
+    rect = surface.get_rect()
+
+    start = default_timer()
+    renderer.draw(surface, rect, [])
+    first = default_timer() - start
+
+    # start at the same place as the path, so the first frame is not a
+    # teleport
+    renderer.center(points[0])
+    renderer.flushQueue()
+
+    for p in xrange(2):
+        times = []
+        for point in points:
+            start = default_timer()
+            renderer.center(point)
+            renderer.flushQueue()
+            times.append(default_timer() - start)
+
+        print "{0:<22} pass {1}  first: {2:>7.2f} ms  frame: {3:>6.3f} ms" \
+              "  sd {4:>6.3f}  max {5:>7.3f}".format(
+              name, p + 1, first * 1000.0, *stats(times))
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    pygame.init()
+    pygame.display.set_mode((320, 240), 0, 32)
+
+    from pytmx import tmxloader
+    from tilemap import BufferedTilemapRenderer, ChunkedTilemapRenderer
+
+    temp = tempfile.mkdtemp()
+    try:
+        tmx = tmxloader.load_pygame(make_map(temp), cache=False)
+    finally:
+        shutil.rmtree(temp)
+
+    points = path(tmx)
+
+    renderer = BufferedTilemapRenderer(tmx, size)
+    run(tmx, renderer, points, "buffered")
+
+    for chunk in (4, 8, 16):
+        renderer = ChunkedTilemapRenderer(tmx, size, chunkSize=(chunk, chunk),
+                                          chunkMemory=64 * 1024 * 1024)
+        run(tmx, renderer, points, "chunked {0}x{0}".format(chunk))
+        print "{0:<22} chunks: {1}  memory: {2} kb".format("",
+              len(renderer.chunks), renderer.chunkBytes / 1024)
@@ -0,0 +1,109 @@
+"""
+benchmark for the dirty rectangle mode of lib2d.gfx
+
+starts the first level at 1024x600 with a scale of 3, like the game does,
+and times drawing and updating the display for a few hundred frames while
+the hero stands still, and while the hero walks and the view scrolls.  the
+title menu is timed too.  each test is run with gfx.dirty_rects off, when
+the whole screen is scaled and flipped every frame, and on, when only the
+parts of the screen that changed are scaled and updated.  every frame is
+compared with the whole screen scaled, to make sure that it is the same.
+run from the root of the project:
+
+    python utilities/dirtybench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+
+
+frames = 300
+
+
+def idle(state, frame):
+    pass
+
+
+def walk(state, frame):
+    x, y = state.hero_body.position
+    if (frame / 100) % 2:
+        state.hero_body.position = (x - 2, y)
+    else:
+        state.hero_body.position = (x + 2, y)
+
+
+def run(driver, name, state, move):
+    import pygame
+    from lib2d import gfx
+
+    for dirty_rects in (False, True):
+        gfx.dirty_rects = dirty_rects
+        draw = 0.0
+        update = 0.0
+        pixels = 0
+        same = True
+        for frame in xrange(frames):
+            start = default_timer()
+            dirty = state.draw(gfx.screen)
+            draw += default_timer() - start
+
+            start = default_timer()
+            gfx.update_display(dirty)
+            update += default_timer() - start
+
+            regions = gfx.dirty_regions(dirty)
+            if regions is None:
+                pixels += gfx.screen.get_width() * gfx.screen.get_height()
+            else:
+                pixels += sum(r.width * r.height for r in regions)
+
+            # the display should look like the whole screen was scaled
+            full = pygame.transform.scale(gfx.screen,
+                                          gfx.scaled_surface.get_size())
+            same &= pygame.image.tostring(full, "RGB") == \
+                    pygame.image.tostring(gfx.scaled_surface, "RGB")
+
+            move(state, frame)
+            state.update(16)
+
+        print "{0:<6} dirty rects: {1:<5}  draw: {2:>6.3f} ms  update: " \
+              "{3:>6.3f} ms  pixels updated: {4:>5.1f}%  same: {5}".format(
+              name, str(dirty_rects), draw / frames * 1000.0,
+              update / frames * 1000.0,
+              pixels * 100.0 / frames / (gfx.screen.get_width() *
+                                         gfx.screen.get_height()), same)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+
+    import pygame
+    from lib2d.game import Game
+    from lib2d import gfx, context
+    from lib.titlescreen import TitleScreen
+    from lib.levelstate import LevelState
+    from lib import world
+
+    game = Game()
+
+    # the dummy video driver uses 8 bits unless asked, and the menu needs 32
+    pygame.display.set_mode((1024, 600), 0, 32)
+    gfx.set_screen((1024, 600), 3, "scale")
+    driver = context.ContextDriver(game, [], 60)
+
+    # show the menu instead of loading a new game
+    title = TitleScreen(driver)
+    driver.start(title)
+    title.loader.stop()
+    title.loader = None
+    title.reactivate()
+    run(driver, "title", title, idle)
+
+    level = LevelState(driver, world.build().getChildByGUID(5001))
+    driver.start(level)
+    run(driver, "idle", level, idle)
+    run(driver, "walk", level, walk)
@@ -0,0 +1,72 @@
+"""
+benchmark for finding paths through clusters on large maps
+
+makes grids with random walls, like pathbench, and finds paths between many
+random open tiles, like things that each find a new path every second.  the
+flat search is pathfinding.grid, and the clusters are pathfinding.hpa, with
+the first few steps made into tiles.  the caches are not used, so each path
+is searched.  changing a tile updates only the clusters around it.  run
+from the root of the project:
+
+    python utilities/hpabench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+import random
+
+from pathbench import makeGrid, percentile, timed
+
+
+grids = [ (256, 100), (512, 100) ]     # size, number of paths
+edits = 50
+
+
+def latencies(finder, pairs):
+    times = []
+    for start, goal in pairs:
+        finder.invalidate()
+        times.append(timed(finder.findPath, start, goal)[0])
+    return [ percentile(times, p) for p in (50, 95, 99) ]
+
+
+if __name__ == "__main__":
+    from lib2d.pathfinding.grid import GridPathfinder, WALL
+    from lib2d.pathfinding.hpa import ClusterPathfinder
+
+    rnd = random.Random(25)
+
+    print "{0:>9}  {1:>9}  {2:>28}  {3:>28}  {4:>9}".format(
+          "grid", "build ms", "flat ms (p50 / p95 / p99)",
+          "hpa ms (p50 / p95 / p99)", "edit ms")
+
+    for size, count in grids:
+        costs = makeGrid(size, rnd, 0)
+        rows = costs.tolist()
+        flat = GridPathfinder(costs)
+        build, hpa = timed(ClusterPathfinder, GridPathfinder(costs))
+
+        pairs = []
+        while len(pairs) < count:
+            start = (rnd.randrange(size), rnd.randrange(size))
+            goal = (rnd.randrange(size), rnd.randrange(size))
+            if rows[start[1]][start[0]] != WALL and \
+               rows[goal[1]][goal[0]] != WALL:
+                pairs.append((start, goal))
+
+        old = latencies(flat, pairs)
+        new = latencies(hpa, pairs)
+
+        edit = 0.0
+        for i in xrange(edits):
+            x, y = rnd.randrange(size), rnd.randrange(size)
+            cost = WALL if rows[y][x] != WALL else 1.0
+            edit += timed(hpa.setCost, (x, y), cost)[0]
+            rows[y][x] = cost
+
+        print "{0:>9}  {1:>9.1f}  {2:>8.1f} / {3:>7.1f} / {4:>7.1f}  " \
+              "{5:>8.2f} / {6:>7.2f} / {7:>7.2f}  {8:>9.2f}".format(
+              "{0}x{0}".format(size), build, old[0], old[1], old[2],
+              new[0], new[1], new[2], edit / edits)
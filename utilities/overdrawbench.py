@@ -0,0 +1,168 @@
+"""
+benchmark for drawing tiles over sprites in BufferedTilemapRenderer.draw
+
+makes a map with a ground layer and three foreground layers in a temporary
+folder.  half of the tiles in the tileset are empty.  then draws a frame
+with 50 to 500 sprites on the ground layer, with draw(), and with the way
+draw() used to work: every tile on every layer above a sprite was drawn
+with getTileImage(), once for every sprite that it covers, and the cells
+under a sprite were found with a quadtree.  the frames are compared to make
+sure that they are the same.  run from the root of the project:
+
+    python utilities/overdrawbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib2d"))
+
+import timeit, tempfile, shutil, random
+
+
+tests = 50
+size = (640, 480)
+map_size = (64, 48)         # in tiles
+sprites = (50, 100, 200, 500)
+
+
+def make_map(path):
+    """
+    make a map with a ground layer and three sparse foreground layers
+    """
+    import pygame
+
+    random.seed(0)
+    image = pygame.Surface((256, 256))
+    image.fill((255, 0, 255))
+    for y in xrange(16):
+        for x in xrange(0, 16, 2):
+            color = [ random.randint(0, 254) for i in xrange(3) ]
+            image.fill(color, (x * 16 + 4, y * 16 + 4, 8, 8))
+    pygame.image.save(image, os.path.join(path, "over.png"))
+
+    w, h = map_size
+    layers = []
+    for density in (1.0, .3, .2, .1):
+        gids = []
+        for i in xrange(w * h):
+            if random.random() < density:
+                gids.append(str(random.randint(1, 256)))
+            else:
+                gids.append("0")
+        layers.append(""" <layer name="layer" width="{0}" height="{1}">
+  <data encoding="csv">{2}</data>
+ </layer>""".format(w, h, ",".join(gids)))
+
+    tmx = """<?xml version="1.0" encoding="UTF-8"?>
+<map version="1.0" orientation="orthogonal" width="{0}" height="{1}" tilewidth="16" tileheight="16">
+ <tileset firstgid="1" name="over" tilewidth="16" tileheight="16">
+  <image source="over.png" trans="ff00ff" width="256" height="256"/>
+ </tileset>
+{2}
+</map>
+"""
+    filename = os.path.join(path, "over.tmx")
+    with open(filename, "w") as fh:
+        fh.write(tmx.format(w, h, "\n".join(layers)))
+
+    return filename
+
+
+def make_quadtree(renderer):
+    """
+    return a quadtree of the cells of the buffer, like draw() used to have
+    """
+    import pygame, quadtree
+
+    tw = renderer.tmx.tilewidth
+    th = renderer.tmx.tileheight
+    rects = [ pygame.Rect((x * tw, y * th), (tw, th))
+              for x in xrange(renderer.view.width + 2)
+              for y in xrange(renderer.view.height + 2) ]
+    return quadtree.FastQuadTree(rects, 4)
+
+
+def old_draw(renderer, tree, surface, rect, surfaces):
+    """
+    draw a frame the way draw() used to, without the queue and clipping
+    """
+
+    surblit = surface.blit
+    left, top = renderer.view.topleft
+    ox = renderer.xoffset - rect.left
+    oy = renderer.yoffset - rect.top
+    getTile = renderer.getTileImage
+    tw = renderer.tmx.tilewidth
+    th = renderer.tmx.tileheight
+
+    surblit(renderer.buffer, (-ox, -oy))
+    dirty = [ (surblit(a[0], a[1]), a[2]) for a in surfaces ]
+
+    hits = []
+    for dirtyRect, layer in dirty:
+        dirtyRect = dirtyRect.move(ox, oy)
+        layers = xrange(layer+1, len(renderer.tmx.visibleTileLayers))
+        for r in tree.query(dirtyRect, hits):
+            x, y = r.topleft
+            for l in layers:
+                tile = getTile((x/tw + left, y/th + top, l))
+                if tile:
+                    surblit(tile, (x-ox, y-oy))
+        del hits[:]
+
+
+def make_sprites(count):
+    import pygame
+
+    image = pygame.Surface((16, 24))
+    image.fill((255, 255, 255))
+
+    return [ (image, pygame.Rect((random.randint(0, size[0] - 16),
+                                  random.randint(0, size[1] - 24)), (16, 24)),
+              0) for i in xrange(count) ]
+
+
+def run(renderer, tree, count):
+    import pygame
+
+    surfaces = make_sprites(count)
+    old = pygame.Surface(size, 0, pygame.display.get_surface())
+    new = pygame.Surface(size, 0, pygame.display.get_surface())
+    rect = new.get_rect()
+
+    old_time = timeit.Timer(lambda: old_draw(renderer, tree, old, rect,
+                                             surfaces))
+    old_time = old_time.timeit(tests) / tests * 1000.0
+    new_time = timeit.Timer(lambda: renderer.draw(new, rect, surfaces))
+    new_time = new_time.timeit(tests) / tests * 1000.0
+
+    same = pygame.image.tostring(old, "RGB") == pygame.image.tostring(new, "RGB")
+
+    print "{0:>4} sprites   old: {1:>7.3f} ms  new: {2:>7.3f} ms  same: {3}" \
+          .format(count, old_time, new_time, same)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    pygame.init()
+    pygame.display.set_mode((320, 240), 0, 32)
+
+    from pytmx import tmxloader
+    from tilemap import BufferedTilemapRenderer
+
+    temp = tempfile.mkdtemp()
+    try:
+        tmx = tmxloader.load_pygame(make_map(temp), cache=False)
+    finally:
+        shutil.rmtree(temp)
+
+    renderer = BufferedTilemapRenderer(tmx, size)
+    renderer.center((size[0] / 2 + 100, size[1] / 2 + 50))
+    renderer.draw(pygame.Surface(size, 0, pygame.display.get_surface()),
+                  pygame.Rect((0, 0), size))
+
+    tree = make_quadtree(renderer)
+    for count in sprites:
+        run(renderer, tree, count)
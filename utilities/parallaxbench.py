@@ -0,0 +1,135 @@
+"""
+benchmark for drawing the parallax background of the first level
+
+draws the parallax layer behind the map of the first level for a few
+hundred frames, at 1920x1080, at 640x360, which is the screen of a 1080p
+display scaled by 3, and at 341x200, which is the game's 1024x600 window
+scaled by 3.  the camera stands still, then walks along the level.  the old
+way drew the parallax map with a second BufferedTilemapRenderer, over all of
+the screen, every frame.  the parallax renderer draws the layer where the map
+is clear, or all of it with one blit when that is most of the screen, and
+reports how long each layer took.  each way walks the level on its own.  the
+time to draw the map over it is shown too; it is the same both ways.  the
+walk is done again with a sky layer added behind the parallax layer; the sky
+is never drawn, since the parallax layer is solid.  run from the root of the project:
+
+    python utilities/parallaxbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+
+
+frames = 200
+sizes = ((1920, 1080), (640, 360), (341, 200))
+
+
+def make_sky():
+    import pygame
+    from lib2d.parallax import ParallaxLayer
+
+    image = pygame.Surface((64, 256))
+    for y in xrange(256):
+        image.fill((0, y / 4, y / 2), (0, y, 64, 1))
+    return ParallaxLayer(image, (.1, .1), name="sky")
+
+
+def run(driver, level, size, walk, sky=False):
+    import pygame
+    from lib.levelstate import LevelState
+    from lib2d.tilemap import BufferedTilemapRenderer
+    from lib2d import gfx, res
+
+    gfx.set_screen(size)
+    state = LevelState(driver, level)
+    driver.start(state)
+    camera = state.camera
+    surface = gfx.screen
+    rect = state.ui.rect
+
+    tmx = res.loadMap(res.mapPath('parallax0.tmx'), force_colorkey=(128,128,0))
+    old = BufferedTilemapRenderer(tmx, camera.extent.size)
+
+    mapRender = camera.maprender
+    parallax = camera.parallaxrender
+    if sky:
+        parallax.layers.insert(0, make_sky())
+    for layer in parallax.layers:
+        layer.stats.update(drawn=0, skipped=0, culled=0, time=0.0)
+
+    # the map finds which of its cells are clear the first time it is asked,
+    # like the old renderer fills its buffer when it is made
+    mapRender.transparentRects(rect)
+
+    body = state.hero_body
+
+    def walkLevel(draw):
+        x, y = 200, 300
+        draw_time = map_time = 0.0
+        for frame in xrange(frames):
+            if walk:
+                x += 4
+            body.position = (x, y)
+            camera.center(body.position)
+
+            start = default_timer()
+            draw()
+            draw_time += default_timer() - start
+
+            start = default_timer()
+            mapRender.draw(surface, rect, [])
+            mapRender.update(16)
+            map_time += default_timer() - start
+
+        return draw_time, map_time
+
+    def drawOld():
+        cx, cy = camera.extent.center
+        old.center((cx / 2.0, cy / 2.0))
+        old.update(16)
+        old.draw(surface, rect, [])
+
+    def drawNew():
+        holes = mapRender.transparentRects(rect)
+        parallax.draw(surface, rect, holes)
+
+    # each way walks on its own, so the images of one don't push the other's
+    # out of the cache
+    old_time, map_time = walkLevel(drawOld)
+    new_time, map_time = walkLevel(drawNew)
+
+    print "{0}x{1} {2:<10}  old parallax: {3:>6.3f} ms  new parallax: " \
+          "{4:>6.3f} ms  map: {5:>6.3f} ms".format(size[0], size[1],
+          ("idle", "walk")[walk] + (" + sky" if sky else ""), old_time / frames * 1000.0,
+          new_time / frames * 1000.0, map_time / frames * 1000.0)
+
+    for name, drawn, skipped, culled, average in parallax.timings():
+        print "    layer {0:<10} drawn: {1:>4}  skipped: {2:>4}  hidden: " \
+              "{3:>4}  {4:>6.3f} ms per draw".format(name, drawn, skipped,
+              culled, average)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+
+    import pygame
+    from lib2d.game import Game
+    from lib2d import context
+    from lib import world
+
+    game = Game()
+
+    # the dummy video driver uses 8 bits unless asked
+    pygame.display.set_mode((320, 240), 0, 32)
+
+    driver = context.ContextDriver(game, [], 60)
+    level = world.build().getChildByGUID(5001)
+
+    for size in sizes:
+        run(driver, level, size, False)
+        run(driver, level, size, True)
+        run(driver, level, size, True, True)
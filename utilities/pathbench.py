@@ -0,0 +1,97 @@
+"""
+benchmark for finding paths on grids of tiles
+
+makes 256x256 and 1024x1024 grids with random walls, like the control layer
+of a map, and then again with some expensive tiles, and finds paths between
+random open tiles.  the old way is pathfinding.astar.search, which makes a
+Node for each tile through a function, can only move in 4 directions and
+doesn't know about costs.  the new way is pathfinding.grid, searched once
+and then again from the cache.  run from the root of the project:
+
+    python utilities/pathbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+import random
+
+
+walls = .25
+expensive = .1
+grids = [ (256, 40), (1024, 8) ]       # size, number of paths
+
+
+def makeGrid(size, rnd, expensive):
+    from lib2d.pathfinding.grid import WALL
+    import numpy
+
+    costs = numpy.ones((size, size))
+    noise = numpy.array([ rnd.random() for i in xrange(size * size) ])
+    noise.shape = (size, size)
+    costs[noise < walls] = WALL
+    costs[(noise >= walls) & (noise < walls + expensive)] = 3.0
+    return costs
+
+
+def old_search(costs, start, goal):
+    from lib2d.pathfinding.astar import Node, search
+    from lib2d.pathfinding.grid import WALL
+
+    size = len(costs)
+    def factory((x, y)):
+        if 0 <= x < size and 0 <= y < size and costs[y][x] != WALL:
+            return Node((x, y))
+
+    return search(start, goal, factory)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(0, int(len(values) * p / 100.0 + .5) - 1)]
+
+
+def timed(func, *args):
+    start = default_timer()
+    result = func(*args)
+    return (default_timer() - start) * 1000.0, result
+
+
+if __name__ == "__main__":
+    from lib2d.pathfinding.grid import GridPathfinder, WALL
+
+    rnd = random.Random(15)
+
+    print "{0:>9}  {1:>9}  {2:>10}  {3:>22}  {4:>22}  {5:>9}".format(
+          "grid", "costs", "setup ms", "old ms (p50 / p95)",
+          "new ms (p50 / p95)", "cached ms")
+
+    for (size, count), cost in [ (grid, cost) for cost in (0, expensive)
+                                 for grid in grids ]:
+        costs = makeGrid(size, rnd, cost)
+        rows = costs.tolist()
+        setup, finder = timed(GridPathfinder, costs)
+
+        pairs = []
+        while len(pairs) < count:
+            start = (rnd.randrange(size), rnd.randrange(size))
+            goal = (rnd.randrange(size), rnd.randrange(size))
+            if rows[start[1]][start[0]] != WALL and \
+               rows[goal[1]][goal[0]] != WALL:
+                pairs.append((start, goal))
+
+        old = [ timed(old_search, rows, start, goal)[0]
+                for start, goal in pairs ]
+        new = [ timed(finder.findPath, start, goal)[0]
+                for start, goal in pairs ]
+        cached = [ timed(finder.findPath, start, goal)[0]
+                   for start, goal in pairs ]
+
+        print "{0:>9}  {1:>9}  {2:>10.1f}  {3:>10.1f} / {4:>9.1f}  " \
+              "{5:>10.1f} / {6:>9.1f}  {7:>9.4f}".format(
+              "{0}x{0}".format(size), "walls" if not cost else "expensive",
+              setup,
+              percentile(old, 50), percentile(old, 95),
+              percentile(new, 50), percentile(new, 95),
+              percentile(cached, 50))
@@ -0,0 +1,75 @@
+"""
+benchmark for the PhysicsGroup broadphase
+
+prints the average time of one step for groups of 10, 100, 1000 and 5000
+bodies.  run from the root of the project:
+
+    python utilities/physicsbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import timeit, random
+
+
+steps = 20
+sizes = [10, 100, 1000, 5000]
+
+# the brute force broadphase is quadratic.  don't wait all day for it.
+brute_limit = 1000
+
+
+def build(number, broadphase):
+    from lib2d.physics import physicsbody, AdventurePhysicsGroup
+    from lib2d import bbox
+
+    random.seed(0)
+
+    # bodies are placed on a grid so that they do not start overlapping.
+    # keep the density of the bodies the same, no matter how many there are
+    side = int(number ** .5) + 1
+    width = side * 8 + 16
+    bodies = []
+    for i in xrange(number):
+        x = (i % side) * 8 + 8 + random.randint(0, 3)
+        y = (i / side) * 8 + 8 + random.randint(0, 3)
+        z = random.randint(0, 32)
+        vel = (random.triangular(-.5, .5), random.triangular(-.5, .5), 0)
+        body = physicsbody.Body3((x, y, z, 2, 2, 4), (0,0,0), vel, 0)
+        bodies.append(body)
+
+    geometry = []
+    geometry.append(bbox.BBox((0,0,0,2,width,0)))
+    geometry.append(bbox.BBox((0,0,0,width,2,0)))
+    geometry.append(bbox.BBox((0,width,0,width,2,0)))
+    geometry.append(bbox.BBox((width,0,0,2,width,0)))
+
+    return AdventurePhysicsGroup(1, 0.006, -9.8, bodies, geometry,
+                                 broadphase=broadphase)
+
+
+def step_test(group, tests=steps):
+    for i in xrange(tests):
+        group.update(6)
+
+
+def run(name, factory, limit=None):
+    for number in sizes:
+        if limit and number > limit:
+            print "{0:<12} {1:>6} bodies:   skipped".format(name, number)
+            continue
+
+        group = build(number, factory())
+        t = timeit.Timer(lambda: step_test(group)).timeit(1)
+        ms = t / steps * 1000.0
+        print "{0:<12} {1:>6} bodies: {2:>9.3f} ms/step".format(name, number, ms)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    from lib2d.physics import broadphase
+
+    run("spatialhash", broadphase.SpatialHash)
+    run("bruteforce", broadphase.BruteForce, brute_limit)
@@ -0,0 +1,110 @@
+"""
+benchmark for loading the first level in the background
+
+starts a new game from the title screen, the way the game does, and times
+each frame until the level is running.  the old way built the world and
+started the level in one frame, so the screen froze until everything was
+loaded.  with the preloader, the world is built and the files are read by
+threads while the title screen draws a progress bar.  reported are the time
+from new game to the running level, the time spent in all of the frames, the
+frame that starts the level, and the longest frame before it.  run from the
+root of the project:
+
+    python utilities/preloadbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+
+
+tests = 5
+
+
+def reset():
+    from lib2d import res
+
+    res.imageCache.clear()
+    res.soundCache.clear()
+    res._loadedMaps.clear()
+
+
+def old_start(driver):
+    """
+    start a new game like TitleScreen.new_game used to
+    """
+    from lib.levelstate import LevelState
+    from lib import world
+
+    start = default_timer()
+    game = world.build()
+    level = game.getChildByGUID(5001)
+    driver.start(LevelState(driver, level))
+    return [default_timer() - start]
+
+
+def new_start(driver):
+    """
+    start a new game from the title screen, at 60 frames a second like the
+    ContextDriver.  the time waiting for the next frame is not counted.
+    """
+    from lib.titlescreen import TitleScreen
+    from lib.levelstate import LevelState
+    import pygame
+
+    clock = pygame.time.Clock()
+    frames = []
+    start = default_timer()
+    driver.start(TitleScreen(driver))
+    frames.append(default_timer() - start)
+
+    while not isinstance(driver.getCurrentState(), LevelState):
+        clock.tick(60)
+        start = default_timer()
+        state = driver.getCurrentState()
+        state.draw(driver.get_screen())
+        state.update(16)
+        frames.append(default_timer() - start)
+
+    return frames
+
+
+def run(driver, name, func):
+    wall = []
+    total = []
+    last = []
+    longest = []
+    for i in xrange(tests):
+        reset()
+        driver._stack.clear()
+        start = default_timer()
+        frames = func(driver)
+        wall.append(default_timer() - start)
+        total.append(sum(frames))
+        last.append(frames[-1])
+        longest.append(max(frames[:-1] or [0]))
+
+    print "{0:<8} wall: {1:>6.1f} ms  frames: {2:>6.1f} ms  frame that starts " \
+          "the level: {3:>6.1f} ms  longest frame before it: {4:>6.1f} ms" \
+          .format(name, sum(wall) / tests * 1000.0, sum(total) / tests * 1000.0,
+          sum(last) / tests * 1000.0, max(longest) * 1000.0)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+
+    from lib2d.game import Game
+    from lib2d import gfx, context
+
+    game = Game()
+    gfx.set_screen((1024, 600), 3, "scale")
+    driver = context.ContextDriver(game, [], 60)
+
+    # build the compiled map cache, like the first time the game is played
+    new_start(driver)
+
+    run(driver, "old", old_start)
+    run(driver, "preload", new_start)
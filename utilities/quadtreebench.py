@@ -0,0 +1,113 @@
+"""
+benchmark for the DynamicQuadTree
+
+moves some of the items each frame, then runs some queries.  the
+DynamicQuadTree updates the moved items, while the FastQuadTree has to be
+built again from scratch.  prints the average time of one frame for each
+amount of churn, when the items jump anywhere on the map and when they walk a
+few pixels, like sprites do.  run from the root of the project:
+
+    python utilities/quadtreebench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import timeit, random
+
+
+frames = 20
+items = 2000
+queries = 100
+size = 2048
+churn = [.01, .05, .10, .25, .50, 1.0]
+steps = [None, 4]      # how far items move, None for anywhere
+
+
+def random_rect():
+    return (random.randint(0, size - 32), random.randint(0, size - 32),
+            random.randint(8, 32), random.randint(8, 32))
+
+
+def walk(rect, step):
+    l, t, w, h = rect
+    l = min(max(0, l + random.randint(-step, step)), size - w)
+    t = min(max(0, t + random.randint(-step, step)), size - h)
+    return l, t, w, h
+
+
+def make_frames(rects, rate, step):
+    """
+    return a list of (moves, queries) for each frame
+    """
+
+    random.seed(0)
+    rects = list(rects)
+    moved = int(items * rate)
+    plan = []
+    for f in xrange(frames):
+        moves = []
+        for i in xrange(moved):
+            i = random.randrange(items)
+            if step is None:
+                rects[i] = random_rect()
+            else:
+                rects[i] = walk(rects[i], step)
+            moves.append((i, rects[i]))
+        plan.append((moves, [ random_rect() for i in xrange(queries) ]))
+    return plan
+
+
+def dynamic_test(rects, plan):
+    from lib2d.quadtree import DynamicQuadTree
+
+    tree = DynamicQuadTree((0, 0, size, size))
+    for i, rect in enumerate(rects):
+        tree.insert(i, rect)
+
+    def test():
+        for moves, tests in plan:
+            for i, rect in moves:
+                tree.update(i, rect)
+            for rect in tests:
+                tree.hit(rect)
+
+    return test
+
+
+def rebuild_test(rects, plan):
+    from lib2d.quadtree import FastQuadTree
+    from pygame import Rect
+
+    rects = [ Rect(r) for r in rects ]
+    plan = [ (moves, [ Rect(r) for r in tests ]) for moves, tests in plan ]
+
+    def test():
+        for moves, tests in plan:
+            for i, rect in moves:
+                rects[i] = Rect(rect)
+            tree = FastQuadTree(rects, 4, Rect(0, 0, size, size))
+            for rect in tests:
+                tree.hit(rect)
+
+    return test
+
+
+def run(name, factory, step):
+    for rate in churn:
+        random.seed(1)
+        rects = [ random_rect() for i in xrange(items) ]
+        test = factory(rects, make_frames(rects, rate, step))
+        t = timeit.Timer(test).timeit(1)
+        ms = t / frames * 1000.0
+        motion = "jump" if step is None else "walk"
+        print "{0:<8} {1:<4} {2:>4.0%} churn: {3:>9.3f} ms/frame".format(
+              name, motion, rate, ms)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    for step in steps:
+        run("dynamic", dynamic_test, step)
+        run("rebuild", rebuild_test, step)
@@ -0,0 +1,132 @@
+"""
+benchmark for finding game objects by guid and name
+
+makes trees of game objects like a world with many areas, then builds them
+the way buildarea does, looking up a guid each time something is added, and
+saves them.  the old way searched the whole tree for each lookup, so building
+a world took time that grew with the square of the number of objects.  run
+from the root of the project:
+
+    python utilities/registrybench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+import tempfile
+
+
+areas = 20
+lookups = 1000
+
+
+def old_getChildren(self):
+    """
+    GameObject.getChildren, the way it used to be
+    """
+    children = []
+    openList = [self]
+    while openList:
+        parent = openList.pop()
+        children = parent._children[:]
+        while children:
+            child = children.pop()
+            openList.append(child)
+            yield child
+
+
+def old_getChildByGUID(self, guid):
+    guid = int(guid)
+    if self.guid == guid: return self
+    for child in old_getChildren(self):
+        if child.guid == guid: return child
+    raise Exception, "GUID ({}) not found.".format(guid)
+
+
+def old_getChildByName(self, name):
+    for child in old_getChildren(self):
+        if child.name == name: return child
+    raise Exception, "Object by name ({}) not found.".format(name)
+
+
+def build(count, find):
+    """
+    add count objects to a new world, and look up the thing that each one is
+    a copy of, like buildarea does for the things in a map
+    """
+    from lib2d.objects import GameObject
+
+    root = GameObject()
+    root.setGUID(0)
+    root.name = "universe"
+
+    parents = []
+    for i in xrange(areas):
+        area = GameObject()
+        area.setName("area{}".format(i))
+        area.setGUID(100000 + i)
+        root.add(area)
+        parents.append(area)
+
+    for i in xrange(count):
+        thing = GameObject()
+        thing.setName("thing{}".format(i))
+        thing.setGUID(i + 1)
+        if i >= 10:
+            find(root, 1 + i % 10)
+        parents[i % areas].add(thing)
+
+    return root
+
+
+def time_lookups(root, count, byGUID, byName):
+    start = default_timer()
+    for i in xrange(lookups):
+        byGUID(root, count - i % 50)
+    guid = default_timer() - start
+
+    start = default_timer()
+    for i in xrange(lookups):
+        byName(root, "thing{}".format(count - 1 - i % 50))
+    name = default_timer() - start
+
+    return guid / lookups * 1000.0, name / lookups * 1000.0
+
+
+def time_save(root):
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    start = default_timer()
+    root.save(path)
+    elapsed = default_timer() - start
+    os.remove(path + "-data.save")
+    os.remove(path)
+    return elapsed * 1000.0
+
+
+if __name__ == "__main__":
+    from lib2d.objects import GameObject
+
+    print "{0:>7}  {1:>22}  {2:>22}  {3:>22}  {4:>9}".format(
+          "objects", "build ms (old / new)", "guid ms (old / new)",
+          "name ms (old / new)", "save ms")
+
+    for count in (500, 1000, 2000, 4000, 8000):
+        start = default_timer()
+        old = build(count, old_getChildByGUID)
+        oldBuild = (default_timer() - start) * 1000.0
+
+        start = default_timer()
+        new = build(count, GameObject.getChildByGUID)
+        newBuild = (default_timer() - start) * 1000.0
+
+        oldGUID, oldName = time_lookups(old, count, old_getChildByGUID,
+                                        old_getChildByName)
+        newGUID, newName = time_lookups(new, count, GameObject.getChildByGUID,
+                                        GameObject.getChildByName)
+
+        print "{0:>7}  {1:>10.1f} / {2:>9.1f}  {3:>10.4f} / {4:>9.4f}  " \
+              "{5:>10.4f} / {6:>9.4f}  {7:>9.1f}".format(
+              count, oldBuild, newBuild, oldGUID, newGUID, oldName, newName,
+              time_save(new))
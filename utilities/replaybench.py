@@ -0,0 +1,122 @@
+"""
+benchmark that plays the first level without a window
+
+builds the world and starts the first level (level2.tmx) like a new game,
+then gives the hero's controller a list of commands and runs the level as
+fast as it can.  the level is played twice without drawing and once drawing
+every fifth tick, like the game does at 60 frames a second.  reported are
+the ticks each second, the time of each part of a tick, and a checksum of
+the bodies at the end.  if the checksums are different, something in the
+game does not play the same way each time.
+
+by default, the hero walks right, jumps, walks back and crouches.  a game
+that was recorded by setting "record" in run.py can be played instead.
+run from the root of the project:
+
+    python utilities/replaybench.py [ticks] [recording]
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+
+
+ticks = 3000
+
+
+def script():
+    """
+    return the commands of a short walk, the way the ContextDriver would
+    give them: each key as it is pressed or let go, and the keys that are
+    held, every 20 ms
+    """
+    from lib2d.playerinput import KeyboardPlayerInput
+    from lib2d.buttons import P1_LEFT, P1_RIGHT, P1_DOWN, P1_ACTION2, \
+                              BUTTONDOWN, BUTTONUP, BUTTONHELD
+
+    keys = [ (30, P1_RIGHT, BUTTONDOWN),
+             (400, P1_ACTION2, BUTTONDOWN),
+             (460, P1_ACTION2, BUTTONUP),
+             (900, P1_RIGHT, BUTTONUP),
+             (1000, P1_LEFT, BUTTONDOWN),
+             (1300, P1_ACTION2, BUTTONDOWN),
+             (1330, P1_ACTION2, BUTTONUP),
+             (1900, P1_LEFT, BUTTONUP),
+             (2100, P1_DOWN, BUTTONDOWN),
+             (2400, P1_DOWN, BUTTONUP) ]
+
+    batches = []
+    held = []
+    for tick in xrange(0, ticks, 6):
+        cmdlist = []
+        while keys and keys[0][0] <= tick:
+            t, key, state = keys.pop(0)
+            cmdlist.append((KeyboardPlayerInput, key, state))
+            if state == BUTTONDOWN:
+                held.append(key)
+            else:
+                held.remove(key)
+
+        if cmdlist:
+            batches.append((tick, cmdlist))
+        if held:
+            batches.append((tick, [ (KeyboardPlayerInput, key, BUTTONHELD)
+                                    for key in held ]))
+
+    return batches
+
+
+def run(driver, name, batches, drawEvery=0):
+    from lib2d import profiler, headless
+    from lib2d.headless import Replay
+    from lib.levelstate import LevelState
+    from lib import world
+
+    driver._stack.clear()
+    game = world.build()
+    level = game.getChildByGUID(5001)
+    driver.start(LevelState(driver, level))
+
+    frames = profiler.enable(ticks + 1)
+    start = default_timer()
+    ran = driver.simulate(ticks, drawEvery, Replay(batches))
+    elapsed = default_timer() - start
+    profiler.disable()
+
+    print "{0:<10} ticks: {1}  {2:>7.0f} ticks/s  checksum: {3}".format(
+          name, ran, ran / elapsed, headless.checksum(level))
+    for line in frames.report().split("\n"):
+        print "    " + line
+    print
+
+    return headless.checksum(level)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+
+    from lib2d import headless
+    headless.init()
+
+    from lib2d.game import Game
+    from lib2d import gfx, context
+
+    if len(sys.argv) > 1:
+        ticks = int(sys.argv[1])
+
+    if len(sys.argv) > 2:
+        recording = headless.Recording.load(sys.argv[2])
+        batches = recording.segment("LevelState")
+    else:
+        batches = script()
+
+    game = Game()
+    gfx.set_screen((1024, 600), 3, "scale")
+    driver = context.ContextDriver(game, [], 60)
+
+    sums = [ run(driver, "simulate", batches),
+             run(driver, "again", batches),
+             run(driver, "drawing", batches, 5) ]
+
+    print "deterministic:", len(set(sums)) == 1
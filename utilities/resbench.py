@@ -0,0 +1,73 @@
+"""
+benchmark for the shared image cache in lib2d.res
+
+builds the world, like the title screen does for a new game, and times
+loading the animations of everything in it.  then unloads and loads them
+again a few times, like saving the game or changing levels does.  the old
+way decoded the file every time an image was loaded.  run from the root of the project:
+
+    python utilities/resbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+
+
+transitions = 5
+
+
+def animations(uni):
+    from lib2d.animation import Animation
+
+    return [ i for i in uni.getChildren() if isinstance(i, Animation) ]
+
+
+def run(name):
+    from lib2d import res
+    from lib import world
+
+    res.imageCache.clear()
+    res.imageCache.hits = res.imageCache.misses = 0
+
+    anims = animations(world.build())
+    start = default_timer()
+    [ i.load() for i in anims ]
+    startup = default_timer() - start
+
+    start = default_timer()
+    for t in xrange(transitions):
+        [ i.unload() for i in anims ]
+        [ i.load() for i in anims ]
+    transition = (default_timer() - start) / transitions
+
+    stats = res.imageCacheStats()
+    print "{0:<8} startup: {1:>7.2f} ms  transition: {2:>7.2f} ms" \
+          "  hits: {3:>4}  misses: {4:>4}  resident: {5} kb".format(
+          name, startup * 1000.0, transition * 1000.0, stats["hits"],
+          stats["misses"], stats["bytes"] / 1024)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    pygame.init()
+    pygame.display.set_mode((320, 240), 0, 32)
+
+    from lib2d import res
+    res.setResourcePath(os.path.join(os.path.dirname(__file__), "..",
+                                     "resources"))
+
+    # decode the file every time, like loadImage used to
+    get = res.imageCache.get
+    def uncached(key, make, size, acquire=False):
+        res.imageCache.misses += 1
+        return make()
+
+    res.imageCache.get = uncached
+    run("old")
+
+    res.imageCache.get = get
+    run("cached")
@@ -0,0 +1,132 @@
+"""
+benchmark for saving and loading games
+
+builds the world, adds many more objects to it like a world with many areas,
+then plays the first level for a second and saves it.  the old way checked
+every attribute of every object, then pickled the whole tree each time it
+was saved.  the journal writes a baseline once and then only the objects
+that changed.  reading one object, and reading the game without its areas
+and then the first level, is compared to reading the whole game.  run from
+the root of the project:
+
+    python utilities/savebench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+import tempfile
+import shutil
+
+
+areas = 20
+ticks = 300
+
+
+def old_save(root, name):
+    """
+    GameObject.save, the way it used to be
+    """
+    import cPickle as pickle
+    import pygame, types
+
+    unsupported = [pygame.Surface, types.MethodType]
+
+    def serialize(obj, pickler, callback):
+        obj.childrenGUID = [ c.guid for c in obj._children ]
+        pickler.dump(obj)
+        callback(obj, pickler)
+        for child in obj._children:
+            serialize(child, pickler, callback)
+
+    for child in root.getChildren():
+        for k, v in child.__dict__.items():
+            if type(v) in unsupported:
+                raise ValueError
+
+    toc = {}
+    def handleWrite(obj, pickler):
+        toc[obj.guid] = fh.tell()
+
+    with open(name + "-data.temp", "w") as fh:
+        pickler = pickle.Pickler(fh, -1)
+        serialize(root, pickler, handleWrite)
+
+    os.rename(name + "-data.temp", name + "-data.save")
+
+
+def grow(root, count):
+    """
+    add count objects with a little state to new areas in the world
+    """
+    from lib2d.objects import GameObject
+    from lib2d.area import AbstractArea
+
+    parents = []
+    for i in xrange(areas):
+        area = AbstractArea()
+        area.setName("area{}".format(i))
+        root.add(area)
+        parents.append(area)
+
+    for i in xrange(count):
+        thing = GameObject()
+        thing.setName("thing{}".format(i))
+        thing.position = (i, i * 2, 0)
+        thing.flags = { "seen": False, "opened": i % 3 == 0 }
+        parents[i % areas].add(thing)
+
+
+def timed(func, *args):
+    start = default_timer()
+    result = func(*args)
+    return (default_timer() - start) * 1000.0, result
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+
+    from lib2d import headless
+    headless.init()
+
+    from lib2d.game import Game
+    from lib2d.journal import Journal
+    from lib2d import gfx, context
+    from lib.levelstate import LevelState
+    from lib import world
+
+    gfx.set_screen((1024, 600), 3, "scale")
+    driver = context.ContextDriver(Game(), [], 60)
+    folder = tempfile.mkdtemp()
+
+    print "{0:>7}  {1:>9}  {2:>9}  {3:>9}  {4:>8}  {5:>9}  {6:>9}  " \
+          "{7:>9}".format("objects", "old ms", "base ms", "delta ms",
+                          "written", "load ms", "one ms", "lazy ms")
+
+    for count in (1000, 4000, 16000):
+        game = world.build()
+        grow(game, count)
+        level = game.getChildByGUID(5001)
+        name = os.path.join(folder, "save{}".format(count))
+
+        base, journal = timed(game.save, name)
+        old, result = timed(old_save, game, name + "-old")
+
+        # play the level and pick up a key
+        driver._stack.clear()
+        driver.start(LevelState(driver, level))
+        driver.simulate(ticks)
+        game.getChildByGUID(1).add(game.getChildByGUID(513))
+
+        delta, written = timed(journal.save, game)
+        load, result = timed(Journal(name).load)
+        one, result = timed(Journal(name).load, 513)
+        lazy, result = timed(lambda: Journal(name).load(lazy=True)
+                             .getChildByGUID(5001).materialize())
+
+        print "{0:>7}  {1:>9.1f}  {2:>9.1f}  {3:>9.2f}  {4:>8}  {5:>9.1f}  " \
+              "{6:>9.2f}  {7:>9.2f}".format(len(journal.index), old, base,
+                                            delta, written, load, one, lazy)
+
+    shutil.rmtree(folder)
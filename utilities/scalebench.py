@@ -0,0 +1,102 @@
+"""
+benchmark for the ways that lib2d.gfx can scale the screen
+
+draws frames on a 1024x600 display scaled by 2, 3 and 4, and times each
+frame.  every frame the screen is filled and a few hundred tiles are drawn,
+like a level, then the whole screen is scaled onto the display.  the ways
+of scaling are:
+
+    scale       pygame.transform.scale
+    replicate   each pixel is copied into a block with numpy (fast_scale)
+    scale2x     pygame.transform.scale2x, only at 2x
+
+and each is run in the main thread, and in a thread while the next frame
+is drawn (threaded).  wall is the time of a frame, cpu is the processor
+time of the frame in all threads.  the thread can only save time if there
+is more than one processor.  the last frame is compared with the screen
+scaled the same way in the main thread.  run from the root of the project:
+
+    python utilities/scalebench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+import time, random, multiprocessing
+
+
+frames = 300
+size = (1024, 600)
+tiles = 300
+
+
+def draw_frame(surface, tile, points):
+    surface.fill((40, 40, 60))
+    for point in points:
+        surface.blit(tile, point)
+
+
+def run(factor, transform, fast_scale, threaded):
+    import pygame
+    from lib2d import gfx
+
+    gfx.fast_scale = fast_scale
+    gfx.threaded = threaded
+    gfx.set_screen(size, factor, transform)
+
+    random.seed(0)
+    tile = pygame.Surface((16, 16))
+    tile.fill((200, 120, 40))
+    tile.fill((90, 160, 210), (4, 4, 8, 8))
+    w, h = gfx.screen.get_size()
+    points = [ (random.randint(-8, w), random.randint(-8, h))
+               for i in xrange(tiles) ]
+
+    wall = default_timer()
+    cpu = time.clock()
+    for frame in xrange(frames):
+        draw_frame(gfx.screen, tile, points)
+        gfx.update_display(None)
+
+    if gfx.thread:
+        gfx.thread.wait()
+
+    wall = (default_timer() - wall) / frames * 1000.0
+    cpu = (time.clock() - cpu) / frames * 1000.0
+
+    if transform == "scale2x":
+        expected = pygame.transform.scale2x(gfx.screen)
+    else:
+        expected = pygame.transform.scale(gfx.screen,
+                                          gfx.scaled_surface.get_size())
+    same = pygame.image.tostring(expected, "RGB") == \
+           pygame.image.tostring(gfx.scaled_surface, "RGB")
+
+    name = gfx.present.__name__[len("present_"):]
+    if threaded:
+        name += ", threaded"
+    print "{0}x  {1:<20} wall: {2:>6.3f} ms  cpu: {3:>6.3f} ms  same: {4}" \
+          .format(factor, name, wall, cpu, same)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    pygame.init()
+
+    # the dummy video driver uses 8 bits unless asked
+    pygame.display.set_mode(size, 0, 32)
+
+    from lib2d import gfx
+
+    print "{0} processors".format(multiprocessing.cpu_count())
+    for factor in (2, 3, 4):
+        for threaded in (0, 1):
+            run(factor, "scale", False, threaded)
+            run(factor, "scale", True, threaded)
+            if factor == 2:
+                run(factor, "scale2x", False, threaded)
+
+    gfx.set_screen(size)
@@ -0,0 +1,120 @@
+"""
+benchmark for the tile streaming in BufferedTilemapRenderer
+
+scrolls the camera over a map with slow pans, fast pans and a few teleports.
+the game updates 4 times for every draw, and so does this.  the time spent in
+center() and draw() is reported for the frames that pan and the frames that
+teleport, since that is the time between moving the camera and seeing the
+result.  the time spent in update() is reported on its own; it is limited by
+the budget.  a budget of 0 draws every tile in draw().  run from the root of
+the project:
+
+    python utilities/scrollbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib2d"))
+
+from timeit import default_timer
+import math, random
+
+
+frames = 2000
+updates = 4
+size = (320, 240)
+budgets = (0, 1000, 3000, 10000)
+
+
+def path(tmx, seed=1):
+    """
+    return a list of camera positions and if the camera teleported there
+    """
+
+    rnd = random.Random(seed)
+    mw = tmx.width * tmx.tilewidth
+    mh = tmx.height * tmx.tileheight
+    hw, hh = size[0] / 2, size[1] / 2
+
+    x, y = hw, hh
+    speed = 1
+    points = []
+    for frame in xrange(frames):
+        if frame % 100 == 0:
+            speed = rnd.choice((1, 2, 4, 8))
+            angle = rnd.random() * math.pi * 2
+            dx, dy = math.cos(angle) * speed, math.sin(angle) * speed
+
+        teleport = rnd.random() < .01
+        if teleport:
+            x, y = rnd.randint(hw, mw - hw), rnd.randint(hh, mh - hh)
+
+        x += dx
+        y += dy
+        if not hw <= x <= mw - hw:
+            dx = -dx
+            x = min(max(x, hw), mw - hw)
+        if not hh <= y <= mh - hh:
+            dy = -dy
+            y = min(max(y, hh), mh - hh)
+
+        points.append(((x, y), teleport))
+
+    return points
+
+
+def stats(times):
+    mean = sum(times) / len(times)
+    var = sum((t - mean) ** 2 for t in times) / len(times)
+    return mean * 1000.0, math.sqrt(var) * 1000.0, max(times) * 1000.0
+
+
+def run(tmx, points, budget):
+    import pygame
+    from tilemap import BufferedTilemapRenderer
+
+    renderer = BufferedTilemapRenderer(tmx, size, timeBudget=budget)
+    surface = pygame.Surface(size, 0, pygame.display.get_surface())
+    rect = surface.get_rect()
+
+    pans = []
+    teleports = []
+    updating = []
+    for point, teleport in points:
+        start = default_timer()
+        for i in xrange(updates):
+            renderer.update(16)
+        before = default_timer()
+        renderer.center(point)
+        renderer.draw(surface, rect, [])
+        end = default_timer()
+        updating.append(before - start)
+        if teleport:
+            teleports.append(end - before)
+        else:
+            pans.append(end - before)
+
+    # the first frame draws the whole buffer
+    pans.pop(0)
+
+    print "budget {0:>6} us   pan: {1:>6.3f} ms  sd {2:>6.3f}  max {3:>6.3f}" \
+          "   teleport: {4:>6.3f} ms  max {6:>6.3f}   update: {7:>6.3f} ms" \
+          .format(budget, *(stats(pans) + stats(teleports) + stats(updating)))
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    pygame.init()
+    pygame.display.set_mode(size, 0, 32)
+
+    from pytmx import tmxloader
+
+    filename = os.path.join(os.path.dirname(__file__), "..", "resources",
+                            "maps", "level1.tmx")
+    tmx = tmxloader.load_pygame(filename, force_colorkey=(128,128,0))
+    points = path(tmx)
+
+    for budget in budgets:
+        run(tmx, points, budget)
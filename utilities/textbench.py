@@ -0,0 +1,122 @@
+"""
+benchmark for drawing text with lib2d.text
+
+draws a long dialog page into a box every frame, like a dialog or a help
+screen that is drawn again while it is open, and moves the selection of the
+title screen menu up and down.  the old way measured each line one character
+at a time, then rendered each line every time that it was drawn, and made
+the outlined menu items again on each move.  run from the root of the
+project:
+
+    python utilities/textbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timeit import default_timer
+
+
+frames = 100
+
+page = ("The robot hovers over the ground with two small thrusters.  Press "
+        "the arrow keys to walk, W to jump, and W again to jump in the air.\n"
+        "Crouch with the down key; while running, crouch to roll under low "
+        "walls.  Keys open the doors of the same color, and some doors need "
+        "more than one key.  Your progress is saved at the terminals.\n") * 2
+
+
+def old_drawText(surface, text, color, rect, font, aa=False, bkg=None):
+    """
+    lib2d.draw.drawText, the way it used to be
+    """
+    from pygame import Rect
+
+    rect = Rect(rect)
+    y = rect.top
+    lineSpacing = -2
+    fontHeight = font.size("Tg")[1]
+
+    if fontHeight < 16:
+        aa=0
+        bkg=None
+
+    while text:
+        i = 1
+
+        if y + fontHeight > rect.bottom:
+            break
+
+        while font.size(text[:i])[0] < rect.width and i < len(text):
+            if text[i] == "\n":
+                text = text[:i] + text[i+1:]
+                break
+            i += 1
+        else:
+            if i < len(text):
+                i = text.rfind(" ", 0, i) + 1
+
+        if surface:
+            if bkg:
+                image = font.render(text[:i], 1, color, bkg)
+                image.set_colorkey(bkg)
+            else:
+                image = font.render(text[:i], aa, color)
+
+            surface.blit(image, (rect.left, y))
+
+        y += fontHeight + lineSpacing
+        text = text[i:]
+
+    return text
+
+
+def time_page(surface, draw, font, aa, bkg):
+    start = default_timer()
+    for i in xrange(frames):
+        draw(surface, page, (0, 0, 0), (10, 10, 460, 300), font, aa, bkg)
+    return (default_timer() - start) / frames * 1000.0
+
+
+def time_menu(factory):
+    from lib2d.ui.menu import Menu
+
+    menu = Menu(20, -5, 'vertical', 100,
+                [('New Game', None), ('Continue', None),
+                 ('Introduction', None), ('Quit', None)],
+                font='northwoodhigh.ttf', font_size=20, item_factory=factory)
+
+    up = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_UP)
+    down = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_DOWN)
+
+    start = default_timer()
+    for i in xrange(frames):
+        menu.handle_event(down if i % 6 < 3 else up)
+    return (default_timer() - start) / frames * 1000.0
+
+
+if __name__ == "__main__":
+    from lib2d import headless
+    headless.init((480, 320))
+
+    import pygame
+    from lib2d import res, text, banner
+
+    res.setResourcePath(os.path.join(os.path.dirname(__file__), "..",
+                                     "resources"))
+
+    surface = pygame.display.get_surface()
+    for name, size, aa, bkg in [ ("volter.ttf", 9, False, None),
+                                 ("dpcomic.ttf", 16, True, (109, 109, 109)),
+                                 ("dpcomic.ttf", 20, True, None) ]:
+        font = text.getFont(name, size)
+        old = time_page(surface, old_drawText, font, aa, bkg)
+        new = time_page(surface, text.drawText, font, aa, bkg)
+        lines = len(text.layout(page, 460, font))
+        print "page, {0} {1:>2}: {2:>2} lines  old: {3:>7.3f} ms  " \
+              "new: {4:>7.3f} ms".format(name, size, lines, old, new)
+
+    old = lambda label, font, size, color: \
+          banner.outlinedText(label, font, size, color, True, None)
+    print "menu move:          old: {0:>7.3f} ms  new: {1:>7.3f} ms".format(
+          time_menu(old), time_menu(text.outlinedText))
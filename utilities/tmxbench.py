@@ -0,0 +1,65 @@
+"""
+benchmark for the compiled map cache
+
+loads each map in resources/maps without the cache, then with a cold cache
+(it is built), then with a warm cache.  run from the root of the project:
+
+    python utilities/tmxbench.py
+"""
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import timeit, glob, shutil
+
+
+tests = 5
+options = {"force_colorkey": (128,128,0)}
+
+
+def clear_cache(filename):
+    from pytmx import tmxcache
+
+    path = os.path.dirname(tmxcache.cache_path(filename))
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def load_test(filename, **kwargs):
+    from pytmx import tmxloader
+
+    kwargs.update(options)
+    return lambda: tmxloader.load_pygame(filename, **kwargs)
+
+
+def run(filename, use_numpy=False):
+    name = os.path.basename(filename)
+    if use_numpy: name += " (numpy)"
+
+    test = load_test(filename, cache=False, use_numpy=use_numpy)
+    nocache = timeit.Timer(test).timeit(tests) / tests * 1000.0
+
+    clear_cache(filename)
+    test = load_test(filename, use_numpy=use_numpy)
+    cold = timeit.Timer(test).timeit(1) * 1000.0
+    warm = timeit.Timer(test).timeit(tests) / tests * 1000.0
+
+    print "{0:<24} no cache: {1:>8.1f} ms  cold: {2:>8.1f} ms  warm: {3:>8.1f} ms".format(
+          name, nocache, cold, warm)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    import pygame
+    pygame.init()
+    pygame.display.set_mode((320, 240))
+
+    path = os.path.join(os.path.dirname(__file__), "..", "resources", "maps")
+    for filename in sorted(glob.glob(os.path.join(path, "*.tmx"))):
+        run(filename)
+        try:
+            import numpy
+        except ImportError:
+            continue
+        run(filename, True)